@@ -1,12 +1,40 @@
 from django.contrib import admin
 from django.db import transaction
-from django.db.models import Count, Max, Prefetch
+from django.tasks import TaskResultStatus
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.formats import localize
 from django.utils.html import format_html
 
+from .busqueda import buscar_reparaciones
 from .forms import FacturaFinalForm
-from .models import FacturaFinal, Presupuesto, Reparacion
+from .imagenes import CAMPOS_IMAGEN, liberar_variantes
+from .models import (
+    FacturaFinal,
+    Presupuesto,
+    Reparacion,
+    TareaEncolada,
+    TransicionEstado,
+    actualizar_resumen_presupuestos,
+    tocar_reparaciones,
+)
+from .replica import lectura_en_replica
+from .resumenes import (
+    claves_de_facturas,
+    claves_de_presupuestos,
+    claves_de_reparaciones,
+    recalcular_resumenes,
+)
+from .tablero import invalidar_tableros
+from .tareas import generar_variantes_reparacion
+from .transiciones import cambiar_estado, registrar_transicion
+
+
+class ListadoEnReplicaMixin:
+    """El changelist lee de la réplica si hay una; formularios y acciones, del primario."""
+
+    def changelist_view(self, request, extra_context=None):
+        return lectura_en_replica(super().changelist_view)(request, extra_context)
 
 
 class PresupuestoInline(admin.TabularInline):
@@ -51,7 +79,7 @@ class PresupuestoInline(admin.TabularInline):
     abrir_link.short_description = "Abrir"
 
 @admin.register(Reparacion)
-class ReparacionAdmin(admin.ModelAdmin):
+class ReparacionAdmin(ListadoEnReplicaMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "usuario",
@@ -71,31 +99,33 @@ class ReparacionAdmin(admin.ModelAdmin):
         "created_at",
     )
     list_filter = ('estado', 'tipo_equipo', 'usuario')
-    search_fields = ('usuario__username', 'telefono', 'ubicacion', 'tipo_equipo')
-    ordering = ('-id',)
+    # La búsqueda real la hace get_search_results con el índice de texto.
+    search_fields = ('usuario__username', 'telefono', 'ubicacion', 'tipo_equipo', 'descripcion')
+    ordering = ('-created_at', '-id')
+    show_full_result_count = False
     readonly_fields = ('usuario', 'tiene_video')  # El usuario que creó la reparación no se puede modificar desde el admin
     raw_id_fields = ("usuario",)
     inlines = (PresupuestoInline,)
 
     def get_queryset(self, request):
         queryset = super().get_queryset(request)
-        presupuestos_prefetch = Prefetch(
-            "presupuestos",
-            queryset=Presupuesto.objects.order_by("-fecha_creacion"),
-            to_attr="presupuestos_ordenados",
-        )
-        return queryset.annotate(
-            presupuestos_count=Count("presupuestos", distinct=True),
-            ultimo_presupuesto_fecha=Max("presupuestos__fecha_creacion"),
-        ).prefetch_related(presupuestos_prefetch)
+        return queryset.select_related("usuario", "ultimo_presupuesto", "factura_final")
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term.strip():
+            return queryset, False
+        return buscar_reparaciones(queryset, search_term), False
 
     @admin.display(description="Presupuestos", ordering="presupuestos_count")
     def presupuestos_count(self, obj):
         return obj.presupuestos_count
 
-    @admin.display(description="Último presupuesto", ordering="ultimo_presupuesto_fecha")
+    @admin.display(
+        description="Último presupuesto", ordering="ultimo_presupuesto__fecha_creacion"
+    )
     def ultimo_presupuesto_fecha(self, obj):
-        return obj.ultimo_presupuesto_fecha or "—"
+        ultimo = self._get_ultimo_presupuesto(obj)
+        return ultimo.fecha_creacion if ultimo else "—"
 
     @admin.display(description="Estado último presupuesto")
     def ultimo_presupuesto_estado(self, obj):
@@ -111,10 +141,7 @@ class ReparacionAdmin(admin.ModelAdmin):
         return format_html('<a href="{}">Abrir</a>', url)
 
     def _get_ultimo_presupuesto(self, obj):
-        presupuestos = getattr(obj, "presupuestos_ordenados", None)
-        if presupuestos:
-            return presupuestos[0]
-        return None
+        return obj.ultimo_presupuesto
 
     @admin.display(description="Presupuesto")
     def presupuesto_resumen(self, obj):
@@ -161,39 +188,43 @@ class ReparacionAdmin(admin.ModelAdmin):
 
 
     # Definición de acciones
+    def _marcar(self, request, queryset, estado, accion):
+        cambiar_estado(queryset, estado, usuario=request.user, origen=f"admin:{accion}")
+
     def marcar_recibida(self, request, queryset):
-        queryset.update(estado='recibida')
+        self._marcar(request, queryset, 'recibida', 'marcar_recibida')
     marcar_recibida.short_description = "Marcar como: Recibimos tu solicitud"
 
     def marcar_pendiente_presupuesto(self, request, queryset):
-        queryset.update(estado='pendiente_presupuesto')
+        self._marcar(request, queryset, 'pendiente_presupuesto', 'marcar_pendiente_presupuesto')
     marcar_pendiente_presupuesto.short_description = "Marcar como: Estamos presupuestando el pedido"
 
     def marcar_pendiente_pago(self, request, queryset):
-        queryset.update(estado='pendiente_pago')
+        self._marcar(request, queryset, 'pendiente_pago', 'marcar_pendiente_pago')
     marcar_pendiente_pago.short_description = "Marcar como: A espera de aprobación y pago de seña"
 
     def marcar_en_proceso(self, request, queryset):
-        queryset.update(estado='en_proceso')
+        self._marcar(request, queryset, 'en_proceso', 'marcar_en_proceso')
     marcar_en_proceso.short_description = "Marcar como: En proceso de reparación"
 
     def marcar_listo_para_entregar(self, request, queryset):
-        queryset.update(estado='listo_para_entregar')
+        self._marcar(request, queryset, 'listo_para_entregar', 'marcar_listo_para_entregar')
     marcar_listo_para_entregar.short_description = "Marcar como: Listo para entregar"
 
     def marcar_entregado(self, request, queryset):
-        queryset.update(estado='entregado')
+        self._marcar(request, queryset, 'entregado', 'marcar_entregado')
     marcar_entregado.short_description = "Marcar como: Recibido por el cliente"
 
     def marcar_finalizado(self, request, queryset):
-        queryset.update(estado='finalizado')
+        self._marcar(request, queryset, 'finalizado', 'marcar_finalizado')
     marcar_finalizado.short_description = "Marcar como: Recibimos el pago final"
 
     def imagen_link(self, obj):
         if obj.imagen:
             return format_html(
-                '<a href="{}" target="_blank">📷 Ver imagen</a>',
-                obj.imagen.url
+                '<a href="{}" target="_blank">{}</a>',
+                obj.imagen.url,
+                "📷 Ver miniatura" if "imagen" in obj.retencion_media else "📷 Ver imagen",
             )
         return "—"
 
@@ -206,6 +237,8 @@ class ReparacionAdmin(admin.ModelAdmin):
                 '<a href="{}" target="_blank">🎬 Ver video</a>',
                 obj.video.url
             )
+        if "video" in obj.retencion_media:
+            return "Eliminado por retención"
         return "—"
 
     video_link.short_description = "Video"
@@ -213,11 +246,46 @@ class ReparacionAdmin(admin.ModelAdmin):
     def save_model(self, request, obj, form, change):
         if obj.usuario and not obj.nombre_cliente:
             obj.nombre_cliente = obj.usuario.username
+        # Cambiar equipo o ubicación mueve presupuestos y factura de celda en
+        # el resumen mensual.
+        mueve_resumen = change and {"tipo_equipo", "ubicacion"} & set(form.changed_data)
+        claves = claves_de_reparaciones([obj.pk]) if mueve_resumen else set()
         super().save_model(request, obj, form, change)
+        fotos = [campo for campo in CAMPOS_IMAGEN if not change or campo in form.changed_data]
+        if fotos:
+            # Las variantes de la foto anterior se van ya; las nuevas las
+            # genera la cola (hasta entonces la tarjeta muestra el original).
+            liberar_variantes(obj, fotos)
+            # Una foto nueva vuelve a estar completa para la retención.
+            for campo in fotos:
+                obj.retencion_media.pop(campo, None)
+            obj.save(update_fields=["variantes", "retencion_media", "updated_at"])
+            generar_variantes_reparacion.enqueue(obj.pk, fotos)
+        if mueve_resumen:
+            recalcular_resumenes(claves | claves_de_reparaciones([obj.pk]))
+        if not change or "estado" in form.changed_data:
+            registrar_transicion(
+                obj,
+                form.initial.get("estado", "") if change else "",
+                usuario=request.user,
+                origen="admin:save_model",
+            )
+
+    def delete_model(self, request, obj):
+        with transaction.atomic():
+            claves = claves_de_reparaciones([obj.pk])
+            super().delete_model(request, obj)
+            recalcular_resumenes(claves)
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            claves = claves_de_reparaciones(queryset.values_list("pk", flat=True))
+            super().delete_queryset(request, queryset)
+            recalcular_resumenes(claves)
 
 
 @admin.register(FacturaFinal)
-class FacturaFinalAdmin(admin.ModelAdmin):
+class FacturaFinalAdmin(ListadoEnReplicaMixin, admin.ModelAdmin):
     form = FacturaFinalForm
     list_display = ("id", "reparacion", "moneda", "monto_total", "created_at")
     search_fields = ("reparacion__usuario__username", "reparacion__telefono")
@@ -228,9 +296,18 @@ class FacturaFinalAdmin(admin.ModelAdmin):
             obj.usuario = request.user
         super().save_model(request, obj, form, change)
 
+    def delete_queryset(self, request, queryset):
+        # queryset.delete() no pasa por FacturaFinal.delete().
+        with transaction.atomic():
+            claves = claves_de_facturas(queryset)
+            reparacion_ids = list(queryset.values_list("reparacion_id", flat=True))
+            super().delete_queryset(request, queryset)
+            tocar_reparaciones(reparacion_ids)
+            recalcular_resumenes(claves)
+
 
 @admin.register(Presupuesto)
-class PresupuestoAdmin(admin.ModelAdmin):
+class PresupuestoAdmin(ListadoEnReplicaMixin, admin.ModelAdmin):
     list_display = (
         "id",
         "reparacion",
@@ -273,16 +350,29 @@ class PresupuestoAdmin(admin.ModelAdmin):
             return False
         return super().has_delete_permission(request, obj)
 
+    def delete_queryset(self, request, queryset):
+        # queryset.delete() no pasa por Presupuesto.delete().
+        with transaction.atomic():
+            reparacion_ids = set(queryset.values_list("reparacion_id", flat=True))
+            claves = claves_de_presupuestos(queryset)
+            super().delete_queryset(request, queryset)
+            actualizar_resumen_presupuestos(reparacion_ids)
+            recalcular_resumenes(claves)
+
     def save_model(self, request, obj, form, change):
         super().save_model(request, obj, form, change)
         if obj.estado == "enviado":
-            Reparacion.objects.filter(pk=obj.reparacion_id).update(
-                estado="pendiente_pago"
+            cambiar_estado(
+                Reparacion.objects.filter(pk=obj.reparacion_id),
+                "pendiente_pago",
+                usuario=request.user,
+                origen="admin:presupuesto_enviado",
             )
 
     @admin.action(description="Marcar como: Enviado (Reparación a pendiente de pago)")
     def marcar_enviado(self, request, queryset):
         self._actualizar_estado(
+            request,
             queryset,
             estado_presupuesto="enviado",
             estado_reparacion="pendiente_pago",
@@ -291,6 +381,7 @@ class PresupuestoAdmin(admin.ModelAdmin):
     @admin.action(description="Marcar como: Aprobado (Reparación a en proceso)")
     def marcar_aprobado(self, request, queryset):
         self._actualizar_estado(
+            request,
             queryset,
             estado_presupuesto="aprobado",
             estado_reparacion="en_proceso",
@@ -299,17 +390,28 @@ class PresupuestoAdmin(admin.ModelAdmin):
     @admin.action(description="Marcar como: Rechazado")
     def marcar_rechazado(self, request, queryset):
         self._actualizar_estado(
+            request,
             queryset,
             estado_presupuesto="rechazado",
             estado_reparacion=None,
         )
 
-    def _actualizar_estado(self, queryset, estado_presupuesto, estado_reparacion):
+    def _actualizar_estado(self, request, queryset, estado_presupuesto, estado_reparacion):
         with transaction.atomic():
-            queryset.update(estado=estado_presupuesto)
+            # Los ids antes del update: si el listado está filtrado por
+            # estado, después `queryset` ya no trae estas filas.
+            ids = list(queryset.values_list("pk", flat=True))
+            presupuestos = Presupuesto.objects.filter(pk__in=ids)
+            presupuestos.update(estado=estado_presupuesto, updated_at=timezone.now())
+            tocar_reparaciones(presupuestos.values_list("reparacion_id", flat=True))
+            invalidar_tableros(presupuestos.values_list("reparacion__usuario_id", flat=True))
+            recalcular_resumenes(claves_de_presupuestos(presupuestos))
             if estado_reparacion:
-                Reparacion.objects.filter(presupuestos__in=queryset).distinct().update(
-                    estado=estado_reparacion
+                cambiar_estado(
+                    Reparacion.objects.filter(presupuestos__in=presupuestos),
+                    estado_reparacion,
+                    usuario=request.user,
+                    origen=f"admin:presupuesto_{estado_presupuesto}",
                 )
 
     def archivo_link(self, obj):
@@ -321,3 +423,46 @@ class PresupuestoAdmin(admin.ModelAdmin):
         return "—"
 
     archivo_link.short_description = "Archivo"
+
+
+@admin.register(TransicionEstado)
+class TransicionEstadoAdmin(ListadoEnReplicaMixin, admin.ModelAdmin):
+    list_display = ("id", "reparacion", "estado_anterior", "estado_nuevo", "fecha", "usuario", "origen")
+    list_filter = ("estado_nuevo", "origen")
+    raw_id_fields = ("reparacion", "usuario")
+    ordering = ("-fecha", "-id")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(TareaEncolada)
+class TareaEncoladaAdmin(admin.ModelAdmin):
+    list_display = ("id", "tarea", "cola", "estado", "intentos", "encolada_en", "finalizada_en")
+    list_filter = ("estado", "cola", "tarea")
+    ordering = ("-encolada_en",)
+    show_full_result_count = False
+    actions = ["reintentar"]
+
+    @admin.display(description="Intentos")
+    def intentos(self, obj):
+        return len(obj.worker_ids)
+
+    @admin.action(description="Volver a encolar")
+    def reintentar(self, request, queryset):
+        cantidad = queryset.filter(estado=TaskResultStatus.FAILED).update(
+            estado=TaskResultStatus.READY, ejecutar_desde=None, finalizada_en=None, worker_ids=[]
+        )
+        self.message_user(request, f"{cantidad} tareas encoladas de nuevo.")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
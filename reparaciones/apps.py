@@ -1,5 +1,14 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class ReparacionesConfig(AppConfig):
     name = 'reparaciones'
+
+    def ready(self):
+        from . import dedup, tablero
+        from .busqueda import asegurar_triggers_fts
+
+        post_migrate.connect(asegurar_triggers_fts, sender=self)
+        tablero.conectar_senales()
+        dedup.conectar_senales()
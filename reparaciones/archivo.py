@@ -0,0 +1,127 @@
+from django.db import transaction
+from django.db.models import OuterRef, Prefetch, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import (
+    FacturaFinal,
+    FacturaFinalArchivada,
+    Presupuesto,
+    PresupuestoArchivado,
+    Reparacion,
+    ReparacionArchivada,
+    TransicionEstado,
+)
+
+# Las reparaciones finalizadas hace meses casi no se leen pero engordan las
+# tablas (e índices) que usan todas las vistas. Acá se mueven a las tablas
+# *Archivada/*Archivado, conservando ids, y se borran de las "calientes".
+# El resumen mensual no se toca: ya cuenta esas filas y sigue contándolas
+# porque resumenes.py también agrega las tablas de archivo.
+
+
+def reparaciones_a_archivar(antes_de):
+    """
+    Reparaciones finalizadas antes de `antes_de`. La fecha de finalización sale
+    de la última transición a "finalizado"; si no hay (reparaciones anteriores
+    al registro de transiciones) se usa la fecha de alta.
+    """
+    ultima_finalizacion = (
+        TransicionEstado.objects.filter(reparacion=OuterRef("pk"), estado_nuevo="finalizado")
+        .order_by("-fecha", "-id")
+        .values("fecha")[:1]
+    )
+    return (
+        Reparacion.objects.filter(estado="finalizado")
+        .annotate(finalizado_en=Coalesce(Subquery(ultima_finalizacion), "created_at"))
+        .filter(finalizado_en__lt=antes_de)
+    )
+
+
+def _copiar(origen, modelo, **extra):
+    campos = {campo.attname for campo in modelo._meta.concrete_fields}
+    datos = {
+        campo.attname: getattr(origen, campo.attname)
+        for campo in origen._meta.concrete_fields
+        if campo.attname in campos
+    }
+    datos.update(extra)
+    return modelo(**datos)
+
+
+def _historiales(reparacion_ids):
+    historiales = {}
+    transiciones = (
+        TransicionEstado.objects.filter(reparacion__in=reparacion_ids)
+        .order_by("reparacion_id", "fecha", "id")
+        .values("reparacion_id", "estado_anterior", "estado_nuevo", "fecha", "usuario_id", "origen")
+    )
+    for transicion in transiciones:
+        reparacion_id = transicion.pop("reparacion_id")
+        transicion["fecha"] = transicion["fecha"].isoformat()
+        historiales.setdefault(reparacion_id, []).append(transicion)
+    return historiales
+
+
+def archivar_lote(ids, antes_de):
+    """
+    Mueve al archivo las reparaciones de `ids` que sigan cumpliendo el criterio
+    (alguien pudo reabrirlas entre la selección y el lote), con sus
+    presupuestos, factura final e historial de estados. Devuelve la cantidad.
+    """
+    with transaction.atomic():
+        reparaciones = list(
+            reparaciones_a_archivar(antes_de).filter(pk__in=ids).select_for_update()
+        )
+        if not reparaciones:
+            return 0
+        pks = [reparacion.pk for reparacion in reparaciones]
+        historiales = _historiales(pks)
+
+        ReparacionArchivada.objects.bulk_create(
+            _copiar(
+                reparacion,
+                ReparacionArchivada,
+                finalizado_en=reparacion.finalizado_en,
+                historial=historiales.get(reparacion.pk, []),
+            )
+            for reparacion in reparaciones
+        )
+        PresupuestoArchivado.objects.bulk_create(
+            _copiar(presupuesto, PresupuestoArchivado)
+            for presupuesto in Presupuesto.objects.filter(reparacion__in=pks)
+        )
+        FacturaFinalArchivada.objects.bulk_create(
+            _copiar(factura, FacturaFinalArchivada)
+            for factura in FacturaFinal.objects.filter(reparacion__in=pks)
+        )
+        # Borrado por queryset: no pasa por Presupuesto.delete() ni
+        # FacturaFinal.delete(), así que el resumen mensual queda como está.
+        Reparacion.objects.filter(pk__in=pks).delete()
+    return len(pks)
+
+
+def archivar_reparaciones(antes_de, lote=500):
+    """Archiva en lotes (una transacción por lote) y va devolviendo el total."""
+    ultimo_id = 0
+    total = 0
+    while True:
+        ids = list(
+            reparaciones_a_archivar(antes_de)
+            .filter(pk__gt=ultimo_id)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:lote]
+        )
+        if not ids:
+            return
+        total += archivar_lote(ids, antes_de)
+        ultimo_id = ids[-1]
+        yield total
+
+
+def reparaciones_archivadas(queryset=None):
+    """Queryset de lectura con lo que necesitan los listados (2 consultas)."""
+    if queryset is None:
+        queryset = ReparacionArchivada.objects.all()
+    return queryset.select_related("usuario", "factura_final").prefetch_related(
+        Prefetch("presupuestos", queryset=PresupuestoArchivado.objects.all())
+    )
@@ -0,0 +1,197 @@
+import re
+
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import SEPARADORES_TELEFONO
+
+# Tabla FTS5 (SQLite) y columna tsvector (Postgres) creadas en la migración
+# 0021_busqueda_reparaciones; la 0031 sumó telefono_digitos al FTS5. Las
+# mantiene la base: triggers en SQLite y columnas generadas en Postgres.
+TABLA_FTS = "reparaciones_reparacion_fts"
+COLUMNA_TSVECTOR = "busqueda"
+CONFIG_TSVECTOR = "spanish"
+
+COLUMNAS_EDITABLES = ("nombre_cliente", "telefono", "ubicacion", "tipo_equipo", "descripcion")
+# telefono_digitos es una columna generada: no se la puede nombrar en UPDATE OF.
+COLUMNAS_FTS = (*COLUMNAS_EDITABLES, "telefono_digitos")
+
+_columnas = ", ".join(COLUMNAS_FTS)
+_editables = ", ".join(COLUMNAS_EDITABLES)
+_nuevos = ", ".join(f"new.{c}" for c in COLUMNAS_FTS)
+_viejos = ", ".join(f"old.{c}" for c in COLUMNAS_FTS)
+
+SQLITE_TRIGGERS = [
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ai AFTER INSERT ON reparaciones_reparacion BEGIN
+        INSERT INTO {TABLA_FTS}(rowid, {_columnas}) VALUES (new.id, {_nuevos});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_ad AFTER DELETE ON reparaciones_reparacion BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {_columnas})
+        VALUES ('delete', old.id, {_viejos});
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {TABLA_FTS}_au AFTER UPDATE OF {_editables}
+    ON reparaciones_reparacion BEGIN
+        INSERT INTO {TABLA_FTS}({TABLA_FTS}, rowid, {_columnas})
+        VALUES ('delete', old.id, {_viejos});
+        INSERT INTO {TABLA_FTS}(rowid, {_columnas}) VALUES (new.id, {_nuevos});
+    END
+    """,
+]
+
+# Con el tokenizer trigram, FTS5 no encuentra fragmentos de menos de 3 letras.
+MIN_FRAGMENTO = 3
+
+# Un número escrito con o sin separadores: "11 4567-8901", "(0294) 15-123".
+_NUMERO = re.compile(r"[+(]?\d[\d{}]*".format(re.escape(SEPARADORES_TELEFONO)))
+
+
+def _terminos(texto):
+    return [t for t in re.split(r"\s+", texto.strip()) if t]
+
+
+def _solo_digitos(texto):
+    return re.sub(r"\D", "", texto)
+
+
+def _separar_numeros(texto):
+    """
+    (términos de texto, números). Cada número de al menos MIN_FRAGMENTO
+    dígitos es un par (dígitos, como se escribió): lo primero se busca en
+    telefono_digitos y lo segundo en el resto de los campos. Los más cortos
+    siguen siendo texto ("Juan 2" no es un teléfono).
+    """
+    numeros = []
+
+    def extraer(coincidencia):
+        escrito = coincidencia.group().strip()
+        digitos = _solo_digitos(escrito)
+        if len(digitos) < MIN_FRAGMENTO:
+            return coincidencia.group()
+        numeros.append((digitos, escrito))
+        return " "
+
+    return _terminos(_NUMERO.sub(extraer, texto)), numeros
+
+
+def buscar_reparaciones(queryset, texto):
+    """
+    Filtra `queryset` por texto libre sobre cliente, teléfono, ubicación,
+    tipo de equipo y descripción, y anota `relevancia` para ordenar. Cada
+    número del texto coincide con un fragmento del teléfono (sin importar
+    los separadores) o con el mismo número en cualquier otro campo.
+
+    Usa el índice de búsqueda de cada motor (tsvector + pg_trgm en Postgres,
+    FTS5 en SQLite) y cae a icontains si no hay índice disponible.
+    """
+    terminos, numeros = _separar_numeros(texto)
+    if not terminos and not numeros:
+        return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+    vendor = connections[queryset.db].vendor
+    if vendor == "postgresql":
+        return _buscar_postgres(queryset, terminos, numeros)
+    if vendor == "sqlite":
+        fragmentos = [t for t in terminos if len(t) >= MIN_FRAGMENTO]
+        if fragmentos or numeros:
+            return _buscar_sqlite(queryset, fragmentos, numeros)
+    return _buscar_icontains(queryset, terminos, numeros)
+
+
+def _buscar_postgres(queryset, terminos, numeros):
+    tabla = queryset.model._meta.db_table
+    tsquery = f"websearch_to_tsquery('{CONFIG_TSVECTOR}', %s)"
+
+    def en_tsvector(texto):
+        return Q(
+            pk__in=RawSQL(
+                f'SELECT "id" FROM "{tabla}" WHERE "{COLUMNA_TSVECTOR}" @@ {tsquery}',
+                [texto],
+            )
+        )
+
+    coincide = Q()
+    relevancia = []
+    params = []
+    if terminos:
+        texto = " ".join(terminos)
+        coincide &= en_tsvector(texto)
+        relevancia.append(f'ts_rank_cd("{tabla}"."{COLUMNA_TSVECTOR}", {tsquery})')
+        params.append(texto)
+    for digitos, escrito in numeros:
+        # LIKE '%...%' sobre telefono_digitos usa el índice GIN gin_trgm_ops.
+        coincide &= Q(telefono_digitos__contains=digitos) | en_tsvector(escrito)
+        relevancia.append(f'CASE WHEN "{tabla}"."telefono_digitos" LIKE %s THEN 1 ELSE 0 END')
+        params.append(f"%{digitos}%")
+
+    return queryset.filter(coincide).annotate(
+        relevancia=RawSQL(" + ".join(relevancia), params, output_field=FloatField())
+    )
+
+
+def _literal_fts(fragmento):
+    # Entre comillas: FTS5 lo trata como substring literal.
+    return '"{}"'.format(fragmento.replace('"', '""'))
+
+
+def _buscar_sqlite(queryset, fragmentos, numeros):
+    tabla = queryset.model._meta.db_table
+    # Los dígitos solos coinciden con telefono_digitos, que también está en
+    # el índice; el número como se escribió, con cualquier otra columna.
+    expresiones = [_literal_fts(f) for f in fragmentos]
+    for digitos, escrito in numeros:
+        if escrito == digitos:
+            expresiones.append(_literal_fts(digitos))
+        else:
+            expresiones.append(f"({_literal_fts(digitos)} OR {_literal_fts(escrito)})")
+    match = " AND ".join(expresiones)
+    coincide = RawSQL(f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [match])
+    # bm25() es negativo: cuanto más chico, más relevante.
+    relevancia = RawSQL(
+        f"(SELECT -bm25({TABLA_FTS}) FROM {TABLA_FTS} "
+        f'WHERE {TABLA_FTS} MATCH %s AND rowid = "{tabla}"."id")',
+        [match],
+        output_field=FloatField(),
+    )
+    return queryset.filter(pk__in=coincide).annotate(relevancia=relevancia)
+
+
+def _en_campos(termino):
+    return (
+        Q(usuario__username__icontains=termino)
+        | Q(nombre_cliente__icontains=termino)
+        | Q(telefono__icontains=termino)
+        | Q(ubicacion__icontains=termino)
+        | Q(tipo_equipo__icontains=termino)
+        | Q(descripcion__icontains=termino)
+    )
+
+
+def _buscar_icontains(queryset, terminos, numeros):
+    for termino in terminos:
+        queryset = queryset.filter(_en_campos(termino))
+    for digitos, escrito in numeros:
+        queryset = queryset.filter(Q(telefono_digitos__contains=digitos) | _en_campos(escrito))
+    return queryset.annotate(relevancia=Value(0.0, output_field=FloatField()))
+
+
+def asegurar_triggers_fts(sender, using, **kwargs):
+    """
+    post_migrate: en SQLite, las migraciones que reconstruyen la tabla de
+    reparaciones descartan sus triggers; se vuelven a crear si faltan.
+    """
+    from django.db import connections
+
+    conexion = connections[using]
+    if conexion.vendor != "sqlite":
+        return
+    if TABLA_FTS not in conexion.introspection.table_names():
+        return
+    with conexion.cursor() as cursor:
+        for sql in SQLITE_TRIGGERS:
+            cursor.execute(sql)
@@ -0,0 +1,189 @@
+import logging
+from datetime import timedelta
+from traceback import format_exception
+
+from django.db import transaction
+from django.db.models import Q
+from django.tasks import TaskContext, TaskResult, TaskResultStatus
+from django.tasks.backends.base import BaseTaskBackend
+from django.tasks.base import TaskError
+from django.tasks.exceptions import TaskResultDoesNotExist
+from django.tasks.signals import task_enqueued, task_finished, task_started
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+from django.utils.json import normalize_json
+from django.utils.module_loading import import_string
+
+from .models import TareaEncolada
+
+logger = logging.getLogger(__name__)
+
+# Backend de django.tasks sobre la base: enqueue() inserta una fila en
+# TareaEncolada (dentro de la transacción en curso, si la hay: una tarea
+# encolada en una transacción que se revierte no existe) y el worker de
+# `manage.py procesar_tareas` las toma con SELECT ... FOR UPDATE SKIP LOCKED,
+# así varios workers no ejecutan la misma.
+
+
+def _error(excepcion):
+    tipo = type(excepcion)
+    return {
+        "exception_class_path": f"{tipo.__module__}.{tipo.__qualname__}",
+        "traceback": "".join(format_exception(excepcion)),
+    }
+
+
+class BaseDeDatosBackend(BaseTaskBackend):
+    """
+    OPTIONS:
+      INTENTOS: ejecuciones como máximo antes de quedar FAILED (5).
+      ESPERA_SEGUNDOS: espera antes del primer reintento; se duplica en cada
+        uno (30).
+      TIEMPO_MAXIMO_SEGUNDOS: una tarea RUNNING hace más que esto se da por
+        abandonada (el worker murió) y se vuelve a tomar (600).
+    """
+
+    supports_defer = True
+    supports_priority = True
+    supports_get_result = True
+
+    def __init__(self, alias, params):
+        super().__init__(alias, params)
+        self.intentos = self.options.get("INTENTOS", 5)
+        self.espera = self.options.get("ESPERA_SEGUNDOS", 30)
+        self.tiempo_maximo = self.options.get("TIEMPO_MAXIMO_SEGUNDOS", 600)
+
+    def enqueue(self, task, args, kwargs):
+        self.validate_task(task)
+        fila = TareaEncolada.objects.create(
+            id=get_random_string(32),
+            tarea=task.module_path,
+            cola=task.queue_name,
+            prioridad=task.priority,
+            args=normalize_json(args),
+            kwargs=normalize_json(kwargs),
+            estado=TaskResultStatus.READY,
+            ejecutar_desde=task.run_after,
+            encolada_en=timezone.now(),
+        )
+        resultado = self._resultado(fila, task)
+        task_enqueued.send(type(self), task_result=resultado)
+        return resultado
+
+    def get_result(self, result_id):
+        fila = TareaEncolada.objects.filter(pk=result_id).first()
+        if fila is None:
+            raise TaskResultDoesNotExist(result_id)
+        return self._resultado(fila)
+
+    def _resultado(self, fila, task=None):
+        if task is None:
+            task = import_string(fila.tarea).using(
+                priority=fila.prioridad,
+                queue_name=fila.cola,
+                run_after=fila.ejecutar_desde,
+                backend=self.alias,
+            )
+        resultado = TaskResult(
+            task=task,
+            id=fila.id,
+            status=fila.estado,
+            enqueued_at=fila.encolada_en,
+            started_at=fila.iniciada_en,
+            finished_at=fila.finalizada_en,
+            last_attempted_at=fila.ultimo_intento_en,
+            args=fila.args,
+            kwargs=fila.kwargs,
+            backend=self.alias,
+            errors=[TaskError(**error) for error in fila.errores],
+            worker_ids=list(fila.worker_ids),
+        )
+        object.__setattr__(resultado, "_return_value", fila.resultado)
+        return resultado
+
+    # -----------------------------
+    # Worker
+    # -----------------------------
+    def tomar(self, colas, worker_id):
+        """Marca RUNNING la próxima tarea lista de `colas` y la devuelve (o None)."""
+        ahora = timezone.now()
+        listas = Q(estado=TaskResultStatus.READY) & (
+            Q(ejecutar_desde__isnull=True) | Q(ejecutar_desde__lte=ahora)
+        )
+        abandonadas = Q(
+            estado=TaskResultStatus.RUNNING,
+            ultimo_intento_en__lt=ahora - timedelta(seconds=self.tiempo_maximo),
+        )
+        while True:
+            with transaction.atomic():
+                fila = (
+                    TareaEncolada.objects.select_for_update(skip_locked=True)
+                    .filter(listas | abandonadas, cola__in=colas)
+                    .order_by("-prioridad", "encolada_en")
+                    .first()
+                )
+                if fila is None:
+                    return None
+                if fila.estado == TaskResultStatus.RUNNING and len(fila.worker_ids) >= self.intentos:
+                    fila.errores.append(
+                        {"exception_class_path": "", "traceback": "El worker no terminó la tarea."}
+                    )
+                    self._terminar(fila, TaskResultStatus.FAILED)
+                    continue
+                fila.estado = TaskResultStatus.RUNNING
+                fila.iniciada_en = fila.iniciada_en or ahora
+                fila.ultimo_intento_en = ahora
+                fila.worker_ids.append(worker_id)
+                fila.save(update_fields=["estado", "iniciada_en", "ultimo_intento_en", "worker_ids"])
+                return fila
+
+    def _terminar(self, fila, estado, resultado=None):
+        fila.estado = estado
+        fila.resultado = resultado
+        fila.finalizada_en = timezone.now()
+        fila.save(update_fields=["estado", "resultado", "finalizada_en", "errores"])
+
+    def ejecutar(self, fila):
+        """
+        Ejecuta una tarea tomada. Si falla y le quedan intentos vuelve a READY
+        con espera exponencial; si no, queda FAILED. Devuelve el TaskResult.
+        """
+        try:
+            resultado = self._resultado(fila)
+        except ImportError as e:
+            # La tarea ya no existe en el código: no tiene sentido reintentar.
+            fila.errores.append(_error(e))
+            self._terminar(fila, TaskResultStatus.FAILED)
+            return None
+
+        task_started.send(type(self), task_result=resultado)
+        tarea = resultado.task
+        try:
+            if tarea.takes_context:
+                valor = tarea.call(
+                    TaskContext(task_result=resultado), *resultado.args, **resultado.kwargs
+                )
+            else:
+                valor = tarea.call(*resultado.args, **resultado.kwargs)
+            valor = normalize_json(valor)
+        except KeyboardInterrupt:
+            raise
+        except BaseException as e:
+            logger.exception("Falló la tarea %s (%s)", fila.tarea, fila.pk)
+            fila.errores.append(_error(e))
+            intentos = len(fila.worker_ids)
+            if intentos < self.intentos:
+                fila.estado = TaskResultStatus.READY
+                fila.ejecutar_desde = timezone.now() + timedelta(
+                    seconds=self.espera * 2 ** (intentos - 1)
+                )
+                fila.save(update_fields=["estado", "ejecutar_desde", "errores"])
+            else:
+                self._terminar(fila, TaskResultStatus.FAILED)
+        else:
+            self._terminar(fila, TaskResultStatus.SUCCESSFUL, valor)
+
+        resultado = self._resultado(fila)
+        if resultado.is_finished:
+            task_finished.send(type(self), task_result=resultado)
+        return resultado
@@ -0,0 +1,59 @@
+import hashlib
+
+from django.contrib.messages import get_messages
+from django.middleware.csrf import get_token
+from django.views.decorators.http import condition
+
+# GET condicional para los listados: el validador es (cantidad de filas,
+# max(updated_at)), una sola consulta sobre índices. Si coincide con lo que
+# tiene el navegador se responde 304 sin armar el queryset, sin renderizar y
+# sin pedirle URLs al storage. Solo ETag, sin Last-Modified: la fecha sola
+# no ve borrados ni distingue usuarios, y daría 304 con datos viejos.
+
+
+def validador_del_request(request, validador, *args, **kwargs):
+    """El resultado de `validador` para este request, calculado una sola vez."""
+    if not hasattr(request, "_validador_condicional"):
+        request._validador_condicional = validador(request, *args, **kwargs)
+    return request._validador_condicional
+
+
+def _estado(request, validador, args, kwargs):
+    if not hasattr(request, "_estado_condicional"):
+        # Un mensaje pendiente (p. ej. después de un redirect) tiene que
+        # mostrarse aunque los datos no hayan cambiado.
+        if len(get_messages(request)):
+            request._estado_condicional = None
+        else:
+            request._estado_condicional = validador_del_request(
+                request, validador, *args, **kwargs
+            )
+    return request._estado_condicional
+
+
+def respuesta_condicional(validador):
+    """
+    `validador(request, *args, **kwargs)` devuelve (cantidad, ultima_modificacion),
+    o None para responder siempre completo (p. ej. a quien no es staff).
+    """
+
+    def etag(request, *args, **kwargs):
+        estado = _estado(request, validador, args, kwargs)
+        if estado is None:
+            return None
+        cantidad, ultima = estado
+        # El usuario y el secreto CSRF van en el ETag porque la página
+        # muestra el usuario y trae un token en cada formulario. get_token()
+        # fija el secreto; el token que devuelve cambia en cada llamada.
+        get_token(request)
+        base = "|".join(
+            [
+                str(request.user.pk),
+                str(cantidad),
+                ultima.isoformat() if ultima else "",
+                request.META["CSRF_COOKIE"],
+            ]
+        )
+        return hashlib.sha256(base.encode()).hexdigest()[:32]
+
+    return condition(etag_func=etag)
@@ -0,0 +1,280 @@
+import hashlib
+import os
+import posixpath
+import re
+from io import UnsupportedOperation
+from tempfile import SpooledTemporaryFile
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files import File
+from django.core.files.storage import Storage
+from django.db import models, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete, post_init, post_save, pre_save
+from django.utils.module_loading import import_string
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .models import (
+    BlobMedia,
+    FacturaFinal,
+    FacturaFinalArchivada,
+    NombreMedia,
+    Presupuesto,
+    PresupuestoArchivado,
+    Reparacion,
+    ReparacionArchivada,
+)
+
+# Storage que guarda cada contenido una sola vez. El nombre que queda en el
+# FileField sigue la ruta de upload_to con el digest como carpeta:
+#   reparaciones/presupuestos/<digest>/presupuesto.pdf  ->  blobs/ab/<digest>.pdf
+# así la descarga conserva el nombre original y el blob se deduce del
+# nombre sin consultar la base (el tablero pide decenas de .url por render).
+# Los nombres sin digest (archivos anteriores, subidas directas) pasan tal cual.
+
+LARGO_DIGEST = 32
+CARPETA_BLOBS = "blobs/"
+_LOGICO = re.compile(rf"^(?:.*/)?(?P<digest>[0-9a-f]{{{LARGO_DIGEST}}})/(?P<base>[^/]+)$")
+# Claves que el código escribe con nombre exacto y verifica después.
+EXCLUIDOS = ("subidas_parciales/", "/directas/")
+# Al borrar estas filas se liberan sus archivos, salvo que se hayan archivado.
+ARCHIVADOS = {
+    Reparacion: ReparacionArchivada,
+    Presupuesto: PresupuestoArchivado,
+    FacturaFinal: FacturaFinalArchivada,
+}
+
+
+def nombre_blob(nombre):
+    """Blob detrás de un nombre lógico, o None si el nombre no es deduplicado."""
+    coincidencia = _LOGICO.match(nombre)
+    if not coincidencia:
+        return None
+    digest = coincidencia["digest"]
+    extension = os.path.splitext(coincidencia["base"])[1].lower()
+    return f"{CARPETA_BLOBS}{digest[:2]}/{digest}{extension}"
+
+
+def storage_base(storage):
+    """El storage real detrás de AlmacenDeduplicado (o el mismo storage)."""
+    return getattr(storage, "base", storage)
+
+
+def ubicar(storage, nombre):
+    """(storage real, nombre real) de un archivo."""
+    base = storage_base(storage)
+    if base is storage:
+        return storage, nombre
+    return base, nombre_blob(nombre) or nombre
+
+
+def _digest(content):
+    """Digest del contenido y un archivo listo para subir, leyendo una sola pasada."""
+    sha = hashlib.sha256()
+    try:
+        content.seek(0)
+    except (AttributeError, UnsupportedOperation):
+        # Stream sin seek: se copia mientras se calcula el digest.
+        copia = SpooledTemporaryFile(max_size=10 * 1024 * 1024)
+        for bloque in content.chunks():
+            sha.update(bloque)
+            copia.write(bloque)
+        copia.seek(0)
+        return sha.hexdigest()[:LARGO_DIGEST], File(copia)
+    for bloque in content.chunks():
+        sha.update(bloque)
+    content.seek(0)
+    return sha.hexdigest()[:LARGO_DIGEST], content
+
+
+class AlmacenDeduplicado(Storage):
+    """
+    Envuelve el storage configurado (`backend` + `options`) y cuenta
+    referencias por blob en BlobMedia: borrar un archivo lógico solo borra el
+    blob cuando nadie más lo usa. Cada nombre lógico queda en NombreMedia.
+    """
+
+    cuenta_referencias = True
+
+    def __init__(self, backend, options=None):
+        self.base = import_string(backend)(**(options or {}))
+
+    def _excluido(self, name):
+        return any(parte in name for parte in EXCLUIDOS)
+
+    def save(self, name, content, max_length=None):
+        if name is not None and self._excluido(name):
+            return self.base.save(name, content, max_length=max_length)
+        return super().save(name, content, max_length=max_length)
+
+    def get_available_name(self, name, max_length=None):
+        # El nombre no compite con otros: _save le agrega el digest. Solo se
+        # recorta para que entre en el campo con la carpeta del digest.
+        if max_length:
+            carpeta, archivo = posixpath.split(name)
+            raiz, extension = os.path.splitext(archivo)
+            sobra = len(name) + LARGO_DIGEST + 1 - max_length
+            if sobra > 0:
+                if sobra >= len(raiz):
+                    raise SuspiciousFileOperation(f"No entra un nombre para {name!r}.")
+                name = posixpath.join(carpeta, raiz[:-sobra] + extension)
+        return name
+
+    def _save(self, name, content):
+        digest, datos = _digest(content)
+        carpeta, archivo = posixpath.split(name)
+        nombre = posixpath.join(carpeta, digest, archivo)
+        blob = nombre_blob(nombre)
+        with transaction.atomic():
+            registro, creado = BlobMedia.objects.select_for_update().get_or_create(
+                nombre=blob, defaults={"tamano": datos.size}
+            )
+            if creado or not self.base.exists(blob):
+                guardado = self.base.save(blob, datos)
+                if guardado != blob:
+                    # Otro proceso lo subió en el medio: es el mismo contenido.
+                    self.base.delete(guardado)
+            BlobMedia.objects.filter(pk=blob).update(referencias=F("referencias") + 1)
+            NombreMedia.objects.get_or_create(nombre=nombre, defaults={"blob": registro})
+        return nombre
+
+    def delete(self, name):
+        blob = nombre_blob(name)
+        if blob is None:
+            return self.base.delete(name)
+        with transaction.atomic():
+            registro = BlobMedia.objects.select_for_update().filter(pk=blob).first()
+            if registro is None:
+                return
+            if registro.referencias > 1:
+                BlobMedia.objects.filter(pk=blob).update(referencias=F("referencias") - 1)
+                return
+            registro.delete()
+            transaction.on_commit(lambda: self.base.delete(blob))
+
+    def _real(self, name):
+        return nombre_blob(name) or name
+
+    def _open(self, name, mode="rb"):
+        return self.base.open(self._real(name), mode)
+
+    def exists(self, name):
+        return self.base.exists(self._real(name))
+
+    def size(self, name):
+        return self.base.size(self._real(name))
+
+    def url(self, name, *args, **kwargs):
+        # En S3/R2 la URL firmada es el permiso y apunta al blob. La media
+        # local la entrega servir_media, que controla permisos por el nombre
+        # lógico y no sirve blobs/ directamente.
+        if isinstance(self.base, S3Boto3Storage):
+            return self.base.url(self._real(name), *args, **kwargs)
+        return self.base.url(name, *args, **kwargs)
+
+    def path(self, name):
+        return self.base.path(self._real(name))
+
+    def listdir(self, path):
+        return self.base.listdir(path)
+
+    def get_accessed_time(self, name):
+        return self.base.get_accessed_time(self._real(name))
+
+    def get_created_time(self, name):
+        return self.base.get_created_time(self._real(name))
+
+    def get_modified_time(self, name):
+        return self.base.get_modified_time(self._real(name))
+
+
+# -----------------------------
+# Liberar referencias al borrar filas o reemplazar archivos
+# -----------------------------
+def _nombres_de(instancia):
+    for campo in instancia._meta.fields:
+        if isinstance(campo, models.FileField):
+            archivo = getattr(instancia, campo.attname)
+            if archivo:
+                yield archivo.storage, archivo.name
+    for variantes in (getattr(instancia, "variantes", None) or {}).values():
+        for variante in variantes:
+            for formato in ("webp", "jpeg"):
+                yield instancia._meta.get_field("imagen").storage, variante[formato]
+
+
+def _liberar_archivos(sender, instance, **kwargs):
+    # Sin repetir: con la retención la foto puede ser su propia variante.
+    nombres = list(
+        dict.fromkeys(
+            (storage, nombre)
+            for storage, nombre in _nombres_de(instance)
+            if getattr(storage, "cuenta_referencias", False)
+        )
+    )
+    # Archivar no es borrar: la copia archivada conserva los mismos nombres.
+    if not nombres or ARCHIVADOS[sender].objects.filter(pk=instance.pk).exists():
+        return
+    for storage, nombre in nombres:
+        storage.delete(nombre)
+
+
+def _campos_contados(modelo):
+    return [
+        campo
+        for campo in modelo._meta.fields
+        if isinstance(campo, models.FileField)
+        and getattr(campo.storage, "cuenta_referencias", False)
+    ]
+
+
+def _recordar_archivos(sender, instance, **kwargs):
+    """post_init: los nombres de los FileField tal como están en la base."""
+    guardados = {}
+    for campo in _campos_contados(sender):
+        # Un campo diferido (only/defer) no se conoce: no se libera.
+        if campo.attname in instance.__dict__:
+            valor = instance.__dict__[campo.attname]
+            guardados[campo.attname] = getattr(valor, "name", valor)
+    instance._archivos_guardados = guardados
+
+
+def _anotar_reemplazados(sender, instance, raw=False, update_fields=None, **kwargs):
+    """
+    pre_save: anota los nombres anteriores de los FileField que cambian, salvo
+    los que la fila sigue usando (la foto que pasa a ser una de sus
+    variantes). Las variantes reemplazadas las libera imagenes.liberar_variantes.
+    """
+    instance._archivos_reemplazados = []
+    if raw or instance._state.adding:
+        return
+    guardados = getattr(instance, "_archivos_guardados", {})
+    en_uso = {nombre for _, nombre in _nombres_de(instance)}
+    for campo in _campos_contados(sender):
+        if update_fields is not None and campo.name not in update_fields:
+            continue
+        anterior = guardados.get(campo.attname)
+        if anterior and anterior not in en_uso:
+            instance._archivos_reemplazados.append((campo.storage, anterior))
+
+
+def _liberar_reemplazados(sender, instance, **kwargs):
+    """post_save: libera lo anotado cuando la transacción confirma."""
+    reemplazados = getattr(instance, "_archivos_reemplazados", [])
+    if reemplazados:
+
+        def liberar():
+            for storage, nombre in reemplazados:
+                storage.delete(nombre)
+
+        transaction.on_commit(liberar)
+    _recordar_archivos(sender, instance)
+
+
+def conectar_senales():
+    for modelo in ARCHIVADOS:
+        post_delete.connect(_liberar_archivos, sender=modelo)
+    for modelo in (*ARCHIVADOS, *ARCHIVADOS.values()):
+        post_init.connect(_recordar_archivos, sender=modelo)
+        pre_save.connect(_anotar_reemplazados, sender=modelo)
+        post_save.connect(_liberar_reemplazados, sender=modelo)
@@ -0,0 +1,69 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseRedirect
+from django.utils.http import content_disposition_header
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .dedup import ubicar
+from .rangos import respuesta_con_rangos
+
+# Entrega de archivos privados (presupuestos, facturas) después de chequear
+# permisos en la vista. Django no pasa los bytes:
+#   - en R2/S3 se redirige a una URL prefirmada corta con Content-Disposition;
+#   - en filesystem, con ENTREGA_ARCHIVOS="x-accel" o "x-sendfile", el envío
+#     lo hace nginx/Apache;
+#   - si no, lo transmite Django, respetando Range (ver reparaciones.rangos).
+
+
+def _url_prefirmada(storage, nombre, tipo, disposicion):
+    # Se firma con el cliente y no con storage.url(): con dominio propio
+    # storage.url() devuelve una URL pública sin firma y sin los parámetros.
+    return storage.connection.meta.client.generate_presigned_url(
+        "get_object",
+        Params={
+            "Bucket": storage.bucket_name,
+            "Key": storage._normalize_name(nombre),
+            "ResponseContentType": tipo,
+            "ResponseContentDisposition": disposicion,
+        },
+        ExpiresIn=settings.ENTREGA_URL_SEGUNDOS,
+    )
+
+
+def entregar(request, storage, nombre, *, adjunto):
+    """Respuesta que entrega el archivo `nombre` de `storage` inline o como adjunto."""
+    archivo = os.path.basename(nombre)
+    tipo = mimetypes.guess_type(archivo)[0] or "application/octet-stream"
+    disposicion = content_disposition_header(adjunto, archivo)
+    base, nombre_real = ubicar(storage, nombre)
+
+    if isinstance(base, S3Boto3Storage):
+        return HttpResponseRedirect(_url_prefirmada(base, nombre_real, tipo, disposicion))
+
+    modo = settings.ENTREGA_ARCHIVOS
+    if modo in ("x-accel", "x-sendfile"):
+        response = HttpResponse(content_type=tipo)
+        response["Content-Disposition"] = disposicion
+        if modo == "x-accel":
+            response["X-Accel-Redirect"] = settings.ENTREGA_X_ACCEL_PREFIJO + quote(nombre_real)
+        else:
+            response["X-Sendfile"] = base.path(nombre_real)
+        return response
+
+    try:
+        ruta = base.path(nombre_real)
+    except NotImplementedError:
+        response = FileResponse(storage.open(nombre, "rb"), as_attachment=adjunto, content_type=tipo)
+        response["Content-Disposition"] = disposicion
+        return response
+    if not os.path.isfile(ruta):
+        raise Http404("El archivo no existe.")
+    return respuesta_con_rangos(request, ruta, tipo, disposicion)
+
+
+def entregar_archivo(request, archivo, *, adjunto):
+    """entregar() para un FieldFile."""
+    return entregar(request, archivo.storage, archivo.name, adjunto=adjunto)
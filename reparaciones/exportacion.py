@@ -0,0 +1,162 @@
+import logging
+import os
+import zipfile
+from datetime import datetime, time, timedelta
+
+from botocore.exceptions import ClientError
+from django.utils import timezone
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .dedup import ubicar
+from .models import FacturaFinal, FacturaFinalArchivada
+
+logger = logging.getLogger(__name__)
+
+# ZIP armado mientras se envía: cada archivo se lee del storage por bloques y
+# se escribe como entrada sin compresión (fotos, videos y PDFs ya vienen
+# comprimidos). Ni el ZIP ni los archivos pasan completos por memoria o disco.
+
+BLOQUE = 1024 * 1024
+
+
+class _Salida:
+    """
+    Destino de ZipFile que solo acumula lo escrito hasta que se vacía. Al no
+    tener tell() ni seek(), zipfile escribe en modo stream (tamaños en el data
+    descriptor, después de cada entrada).
+    """
+
+    def __init__(self):
+        self.pendiente = []
+
+    def write(self, datos):
+        self.pendiente.append(bytes(datos))
+        return len(datos)
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b"".join(self.pendiente)
+        self.pendiente = []
+        return datos
+
+
+def _leer(storage, nombre):
+    base, nombre_real = ubicar(storage, nombre)
+    if isinstance(base, S3Boto3Storage):
+        # storage.open() baja el objeto entero a un temporal antes de leerlo.
+        cuerpo = base.connection.meta.client.get_object(
+            Bucket=base.bucket_name, Key=base._normalize_name(nombre_real)
+        )["Body"]
+        try:
+            yield from cuerpo.iter_chunks(BLOQUE)
+        finally:
+            cuerpo.close()
+        return
+    with base.open(nombre_real, "rb") as archivo:
+        yield from archivo.chunks(BLOQUE)
+
+
+def zip_en_stream(entradas):
+    """
+    Bytes de un ZIP con `entradas` (nombre en el zip, storage, nombre, fecha).
+    Los archivos que no están en el storage se listan en FALTANTES.txt.
+    """
+    salida = _Salida()
+    faltantes = []
+    with zipfile.ZipFile(salida, "w", compression=zipfile.ZIP_STORED) as zf:
+        for nombre_zip, storage, nombre, fecha in entradas:
+            trozos = _leer(storage, nombre)
+            # Se pide el primer bloque antes de escribir el encabezado: si el
+            # archivo no existe la entrada no queda a medias.
+            try:
+                primero = next(trozos, b"")
+            except (OSError, ClientError):
+                logger.warning("Exportación: falta %s", nombre)
+                faltantes.append(nombre)
+                continue
+            info = zipfile.ZipInfo(nombre_zip, timezone.localtime(fecha).timetuple()[:6])
+            with zf.open(info, "w", force_zip64=True) as destino:
+                destino.write(primero)
+                for trozo in trozos:
+                    yield salida.vaciar()
+                    destino.write(trozo)
+            yield salida.vaciar()
+        if faltantes:
+            zf.writestr("FALTANTES.txt", "\n".join(faltantes) + "\n")
+    yield salida.vaciar()
+
+
+# -----------------------------
+# Qué entra en cada exportación
+# -----------------------------
+def entradas_de_reparacion(reparacion):
+    """Fotos, video, presupuestos y factura de una reparación (activa o archivada)."""
+    carpeta = f"reparacion_{reparacion.pk}"
+    entradas = []
+    for campo in ("imagen", "imagen2", "video"):
+        archivo = getattr(reparacion, campo)
+        if archivo:
+            extension = os.path.splitext(archivo.name)[1].lower()
+            entradas.append(
+                (f"{carpeta}/{campo}{extension}", archivo.storage, archivo.name, reparacion.created_at)
+            )
+    for presupuesto in reparacion.presupuestos.order_by("fecha_creacion", "pk"):
+        archivo = presupuesto.archivo_presupuesto
+        if archivo:
+            entradas.append(
+                (
+                    f"{carpeta}/presupuestos/{presupuesto.pk}_{os.path.basename(archivo.name)}",
+                    archivo.storage,
+                    archivo.name,
+                    presupuesto.fecha_creacion,
+                )
+            )
+    factura = reparacion.factura_final_safe
+    if factura is not None and factura.archivo_factura:
+        archivo = factura.archivo_factura
+        entradas.append(
+            (
+                f"{carpeta}/factura_{os.path.basename(archivo.name)}",
+                archivo.storage,
+                archivo.name,
+                factura.created_at,
+            )
+        )
+    return entradas
+
+
+def rango_de_fechas(desde, hasta):
+    """Datetimes [desde 00:00, día siguiente a hasta 00:00) en la zona local."""
+    return (
+        timezone.make_aware(datetime.combine(desde, time.min)),
+        timezone.make_aware(datetime.combine(hasta + timedelta(days=1), time.min)),
+    )
+
+
+def entradas_de_facturas(desde, hasta):
+    """Facturas finales con archivo cargadas entre dos fechas (inclusive)."""
+    inicio, fin = rango_de_fechas(desde, hasta)
+    entradas = []
+    for modelo in (FacturaFinal, FacturaFinalArchivada):
+        facturas = (
+            modelo.objects.filter(created_at__gte=inicio, created_at__lt=fin)
+            .exclude(archivo_factura__isnull=True)
+            .exclude(archivo_factura="")
+            .only("reparacion", "archivo_factura", "created_at")
+            .order_by("created_at", "pk")
+        )
+        for factura in facturas.iterator():
+            archivo = factura.archivo_factura
+            fecha = timezone.localtime(factura.created_at)
+            entradas.append(
+                (
+                    f"facturas/{fecha:%Y-%m-%d}_reparacion_{factura.reparacion_id}_"
+                    f"{os.path.basename(archivo.name)}",
+                    archivo.storage,
+                    archivo.name,
+                    factura.created_at,
+                )
+            )
+    return entradas
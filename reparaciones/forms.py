@@ -1,7 +1,9 @@
 from django import forms
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm
 from .models import FacturaFinal, Presupuesto, Reparacion
+from .subidas import CAMPOS_SUBIDA, verificar_subida
 import os
 
 # =============================
@@ -65,6 +67,12 @@ class ReparacionForm(forms.ModelForm):
 
     MAX_VIDEO_MB = 150
 
+    # Subida directa al bucket: el navegador ya subió el archivo y manda la
+    # clave del objeto en lugar del archivo (ver reparaciones.subidas).
+    imagen_clave = forms.CharField(required=False, widget=forms.HiddenInput)
+    imagen2_clave = forms.CharField(required=False, widget=forms.HiddenInput)
+    video_clave = forms.CharField(required=False, widget=forms.HiddenInput)
+
     class Meta:
         model = Reparacion
         fields = [
@@ -77,10 +85,12 @@ class ReparacionForm(forms.ModelForm):
             "video",
         ]
 
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, usuario=None, **kwargs):
         super().__init__(*args, **kwargs)
+        self.usuario = usuario
 
-        self.fields["imagen"].required = True
+        # Con subida directa la imagen puede llegar como clave: se exige en clean().
+        self.fields["imagen"].required = not settings.SUBIDA_DIRECTA
         self.fields["video"].required = False
         self.fields["ubicacion"].initial = ""
         self.fields["ubicacion"].required = True
@@ -116,6 +126,24 @@ class ReparacionForm(forms.ModelForm):
 
         return video
 
+    def clean(self):
+        cleaned_data = super().clean()
+        for campo in CAMPOS_SUBIDA:
+            clave = cleaned_data.get(f"{campo}_clave")
+            if not clave:
+                continue
+            if not settings.SUBIDA_DIRECTA or self.usuario is None:
+                self.add_error(campo, "La subida directa no está habilitada.")
+                continue
+            try:
+                cleaned_data[campo] = verificar_subida(self.usuario, campo, clave)
+            except forms.ValidationError as error:
+                self.add_error(campo, error)
+
+        if not cleaned_data.get("imagen") and "imagen" not in self.errors:
+            self.add_error("imagen", self.fields["imagen"].error_messages["required"])
+        return cleaned_data
+
 
 class PresupuestoForm(forms.ModelForm):
 
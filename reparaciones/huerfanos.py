@@ -0,0 +1,212 @@
+import logging
+import os
+from datetime import datetime, timezone as dt_timezone
+from itertools import batched, chain
+
+from django.db import models
+from django.db.models import Q
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .dedup import CARPETA_BLOBS, storage_base
+from .imagenes import es_variante, originales_posibles
+from .models import (
+    BlobMedia,
+    FacturaFinal,
+    FacturaFinalArchivada,
+    NombreMedia,
+    Presupuesto,
+    PresupuestoArchivado,
+    Reparacion,
+    ReparacionArchivada,
+    SubidaReanudable,
+)
+
+logger = logging.getLogger(__name__)
+
+# Archivos del storage que ninguna fila referencia: los que quedan al borrar
+# una reparación o al reemplazar un archivo. Se recorre el storage por páginas
+# y cada página se compara contra la base con consultas `__in` sobre campos
+# indexados, así ni la memoria ni las consultas dependen del tamaño del bucket. Los archivos más nuevos que el período de
+# gracia no se tocan: pueden ser subidas cuya fila todavía no se guardó.
+
+# Campos que guardan el nombre exacto de un archivo del storage.
+REFERENCIAS = {
+    Reparacion: ("imagen", "imagen2", "video"),
+    ReparacionArchivada: ("imagen", "imagen2", "video"),
+    Presupuesto: ("archivo_presupuesto",),
+    PresupuestoArchivado: ("archivo_presupuesto",),
+    FacturaFinal: ("archivo_factura",),
+    FacturaFinalArchivada: ("archivo_factura",),
+    # Destino de una subida reanudable que se completó y espera el formulario.
+    SubidaReanudable: ("clave",),
+}
+# Las variantes de las fotos solo figuran en el JSON `variantes`: se buscan
+# las filas de su foto (ver imagenes.originales_posibles).
+LOTE_VARIANTES = 200
+# Con media deduplicada los archivos reales son blobs; un blob está en uso si
+# alguno de sus nombres lógicos (NombreMedia) está en uso.
+PREFIJO_BLOBS = CARPETA_BLOBS
+# DeleteObjects acepta hasta 1000 claves por pedido.
+LOTE_BORRADO_S3 = 1000
+
+
+def prefijos_media(storage):
+    """Carpetas de upload_to de los modelos (sin las anidadas en otra) y la de blobs."""
+    carpetas = sorted(
+        {
+            campo.upload_to
+            for modelo in REFERENCIAS
+            for campo in modelo._meta.fields
+            if isinstance(campo, models.FileField)
+        }
+    )
+    prefijos = []
+    for carpeta in carpetas:
+        if not any(carpeta.startswith(prefijo) for prefijo in prefijos):
+            prefijos.append(carpeta)
+    if storage_base(storage) is not storage:
+        prefijos.append(PREFIJO_BLOBS)
+    return prefijos
+
+
+# -----------------------------
+# Listado del storage
+# -----------------------------
+def _clave_s3(storage, nombre):
+    ubicacion = storage.location.strip("/")
+    return f"{ubicacion}/{nombre}" if ubicacion else nombre
+
+
+def _listar_s3(storage, prefijo, lote):
+    ubicacion = storage.location.strip("/")
+    paginas = storage.connection.meta.client.get_paginator("list_objects_v2").paginate(
+        Bucket=storage.bucket_name,
+        Prefix=_clave_s3(storage, prefijo),
+        PaginationConfig={"PageSize": lote},
+    )
+    for pagina in paginas:
+        for objeto in pagina.get("Contents", []):
+            nombre = objeto["Key"][len(ubicacion) + 1 :] if ubicacion else objeto["Key"]
+            yield nombre, objeto["LastModified"], objeto["Size"]
+
+
+def _listar_fs(storage, carpeta):
+    try:
+        entradas = os.scandir(carpeta)
+    except FileNotFoundError:
+        return
+    with entradas:
+        for entrada in entradas:
+            if entrada.is_dir(follow_symlinks=False):
+                yield from _listar_fs(storage, entrada.path)
+            elif entrada.is_file(follow_symlinks=False):
+                estado = entrada.stat()
+                nombre = os.path.relpath(entrada.path, storage.location).replace(os.sep, "/")
+                modificado = datetime.fromtimestamp(estado.st_mtime, tz=dt_timezone.utc)
+                yield nombre, modificado, estado.st_size
+
+
+def listar(storage, prefijo, lote):
+    """(nombre, modificado, tamaño) de cada archivo bajo `prefijo`, sin cargar el listado entero."""
+    if isinstance(storage, S3Boto3Storage):
+        return _listar_s3(storage, prefijo, lote)
+    return _listar_fs(storage, storage.path(prefijo))
+
+
+# -----------------------------
+# Comparación contra la base
+# -----------------------------
+def _nombres_de_variantes(variantes):
+    for lista in (variantes or {}).values():
+        for variante in lista:
+            yield from (variante.get("webp"), variante.get("jpeg"))
+
+
+def _variantes_en_uso(nombres):
+    """Las variantes de `nombres` que figuran en las filas de su foto."""
+    usados = set()
+    for grupo in batched(nombres, LOTE_VARIANTES):
+        originales = {original for nombre in grupo for original in originales_posibles(nombre)}
+        filtro = Q(imagen__in=originales) | Q(imagen2__in=originales)
+        for modelo in (Reparacion, ReparacionArchivada):
+            for datos in modelo.objects.filter(filtro).values_list("variantes", flat=True).iterator():
+                usados.update(_nombres_de_variantes(datos))
+    return usados & set(nombres)
+
+
+def _en_uso(nombres):
+    usados = set()
+    for modelo, campos in REFERENCIAS.items():
+        filtro = Q()
+        for campo in campos:
+            filtro |= Q(**{f"{campo}__in": nombres})
+        for fila in modelo.objects.filter(filtro).values_list(*campos).iterator():
+            usados.update(fila)
+    variantes = [nombre for nombre in nombres - usados if es_variante(nombre)]
+    return (usados | _variantes_en_uso(variantes)) & nombres
+
+
+def _blobs_en_uso(blobs):
+    """Los `blobs` con algún nombre lógico en uso."""
+    logicos = dict(
+        NombreMedia.objects.filter(blob__in=blobs).values_list("nombre", "blob").iterator()
+    )
+    return {logicos[nombre] for nombre in _en_uso(set(logicos))}
+
+
+def referenciados(nombres):
+    """
+    Los `nombres` que alguna fila usa. Se mira solo lo que guardan las filas,
+    no el contador de BlobMedia: un contador que quedó alto no mantiene vivo
+    un blob. Todo se busca por nombre exacto contra columnas indexadas.
+    """
+    nombres = set(nombres)
+    blobs = {nombre for nombre in nombres if nombre.startswith(PREFIJO_BLOBS)}
+    return _blobs_en_uso(blobs) | _en_uso(nombres - blobs)
+
+
+def borrar(storage, nombres):
+    """Borra `nombres` del storage real; en S3/R2, de a LOTE_BORRADO_S3 por pedido."""
+    if not isinstance(storage, S3Boto3Storage):
+        for nombre in nombres:
+            storage.delete(nombre)
+        return
+    cliente = storage.connection.meta.client
+    for grupo in batched(nombres, LOTE_BORRADO_S3):
+        respuesta = cliente.delete_objects(
+            Bucket=storage.bucket_name,
+            Delete={
+                "Objects": [{"Key": _clave_s3(storage, nombre)} for nombre in grupo],
+                "Quiet": True,
+            },
+        )
+        for error in respuesta.get("Errors", []):
+            logger.warning("No se pudo borrar %s: %s", error.get("Key"), error.get("Message"))
+
+
+def recolectar_huerfanos(storage, *, antes_de, lote=1000, simular=False, prefijos=None):
+    """
+    Recorre el storage de a `lote` archivos y borra los que ninguna fila
+    referencia y son anteriores a `antes_de`. Después de cada página devuelve
+    (revisados, huérfanos, bytes) acumulados. Con `simular` no borra nada.
+    """
+    base = storage_base(storage)
+    archivos = chain.from_iterable(
+        listar(base, prefijo, lote) for prefijo in (prefijos or prefijos_media(storage))
+    )
+    revisados = huerfanos = liberados = 0
+    for pagina in batched(archivos, lote):
+        revisados += len(pagina)
+        candidatos = {
+            nombre: tamano for nombre, modificado, tamano in pagina if modificado < antes_de
+        }
+        sobrantes = sorted(set(candidatos) - referenciados(candidatos))
+        if sobrantes and not simular:
+            borrar(base, sobrantes)
+            # El contador de un blob huérfano quedó desfasado: se descarta.
+            BlobMedia.objects.filter(
+                nombre__in=[nombre for nombre in sobrantes if nombre.startswith(PREFIJO_BLOBS)]
+            ).delete()
+        huerfanos += len(sobrantes)
+        liberados += sum(candidatos[nombre] for nombre in sobrantes)
+        yield revisados, huerfanos, liberados
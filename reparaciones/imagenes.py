@@ -0,0 +1,189 @@
+import logging
+import posixpath
+import re
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Versiones reducidas de las fotos que suben los clientes (a veces varios MB)
+# para mostrar en las tarjetas con srcset. Se guardan al lado del original y
+# sus nombres quedan en Reparacion.variantes:
+#   {"imagen": [{"ancho": 320, "webp": "...", "jpeg": "..."}, ...], "imagen2": [...]}
+# El nombre de una variante es el de la foto más el ancho
+# (reparaciones/foto.jpg__320w.webp), así de la variante se vuelve a la foto
+# sin buscar dentro del JSON (ver originales_posibles).
+
+ANCHOS = (320, 640, 1280)
+CAMPOS_IMAGEN = ("imagen", "imagen2")
+FORMATOS = {
+    "webp": {"format": "WEBP", "quality": 80, "method": 4},
+    "jpeg": {"format": "JPEG", "quality": 82, "optimize": True, "progressive": True},
+}
+# Sufijo de una variante, con el que agrega el storage si el nombre estaba ocupado.
+_VARIANTE = re.compile(r"__\d+w(?:_[A-Za-z0-9]+)?\.(?:webp|jpg)$")
+# Con media deduplicada la variante queda en la carpeta de su propio digest.
+_DIGEST = re.compile(r"[0-9a-f]{32}")
+# Las variantes anteriores no llevaban la extensión de la foto.
+EXTENSIONES_ANTERIORES = (".jpg", ".jpeg", ".png", ".webp", ".gif", ".heic")
+
+
+def _abrir(archivo):
+    with archivo.open("rb") as origen:
+        imagen = Image.open(origen)
+        # Las fotos de celular vienen "acostadas" con la rotación en el EXIF.
+        imagen = ImageOps.exif_transpose(imagen)
+        imagen.load()
+    if imagen.mode not in ("RGB", "RGBA"):
+        imagen = imagen.convert("RGBA" if "transparency" in imagen.info else "RGB")
+    return imagen
+
+
+def _codificar(imagen, formato):
+    if formato == "jpeg" and imagen.mode == "RGBA":
+        fondo = Image.new("RGB", imagen.size, "white")
+        fondo.paste(imagen, mask=imagen.getchannel("A"))
+        imagen = fondo
+    salida = BytesIO()
+    # Sin exif=/icc_profile=: Pillow no copia metadatos (GPS incluido).
+    imagen.save(salida, **FORMATOS[formato])
+    return salida.getvalue()
+
+
+def variantes_de_archivo(archivo, anchos=ANCHOS):
+    """
+    Genera y guarda las variantes de un FieldFile. Nunca agranda: si la foto
+    es más chica que todos los anchos, se genera una sola al tamaño original.
+    """
+    imagen = _abrir(archivo)
+    anchos = [ancho for ancho in anchos if ancho < imagen.width] or [imagen.width]
+    variantes = []
+    for ancho in anchos:
+        alto = round(imagen.height * ancho / imagen.width)
+        reducida = imagen.resize((ancho, alto), Image.Resampling.LANCZOS)
+        variante = {"ancho": ancho}
+        for formato in FORMATOS:
+            nombre = f"{archivo.name}__{ancho}w.{'jpg' if formato == 'jpeg' else formato}"
+            variante[formato] = archivo.storage.save(
+                nombre, ContentFile(_codificar(reducida, formato))
+            )
+        variantes.append(variante)
+    return variantes
+
+
+def es_variante(nombre):
+    return bool(_VARIANTE.search(nombre))
+
+
+def originales_posibles(nombre):
+    """Nombres que puede tener la foto de la que salió la variante `nombre`."""
+    coincidencia = _VARIANTE.search(nombre)
+    if not coincidencia:
+        return []
+    raiz = nombre[: coincidencia.start()]
+    carpeta, archivo = posixpath.split(raiz)
+    raices = [raiz]
+    padre, digest = posixpath.split(carpeta)
+    if _DIGEST.fullmatch(digest):
+        raices.append(posixpath.join(padre, archivo))
+    posibles = []
+    for raiz in raices:
+        if posixpath.splitext(raiz)[1]:
+            posibles.append(raiz)
+        else:
+            posibles.extend(
+                raiz + extension
+                for extension in (*EXTENSIONES_ANTERIORES, *map(str.upper, EXTENSIONES_ANTERIORES))
+            )
+    return posibles
+
+
+def liberar_variantes(reparacion, campos):
+    """
+    Saca de `reparacion.variantes` las de los campos dados y borra sus
+    archivos al confirmar la transacción, salvo los que sigan siendo una foto
+    (con la retención la foto puede ser su propia variante). Con media
+    deduplicada el borrado libera la referencia; hacerlo después de guardar
+    las nuevas evita soltar un blob que la variante nueva vuelve a usar.
+    """
+    variantes = dict(reparacion.variantes or {})
+    en_uso = {getattr(reparacion, campo).name for campo in CAMPOS_IMAGEN}
+    viejos = {
+        variante[formato]: reparacion._meta.get_field(campo).storage
+        for campo in campos
+        for variante in variantes.pop(campo, None) or []
+        for formato in FORMATOS
+        if variante[formato] not in en_uso
+    }
+    reparacion.variantes = variantes
+
+    def borrar():
+        for nombre, storage in viejos.items():
+            storage.delete(nombre)
+
+    if viejos:
+        transaction.on_commit(borrar)
+
+
+def generar_variantes(reparacion, campos=CAMPOS_IMAGEN):
+    """
+    Genera y sube las variantes de los campos de imagen dados, sin tocar la
+    fila: devuelve {campo: variantes} para pasar a guardar_variantes. Una
+    imagen que Pillow no puede leer se loguea y queda sin variantes (se
+    muestra el original).
+    """
+    nuevas = {}
+    for campo in campos:
+        archivo = getattr(reparacion, campo)
+        if not archivo:
+            continue
+        try:
+            nuevas[campo] = variantes_de_archivo(archivo)
+        except (UnidentifiedImageError, OSError):
+            logger.exception("No se pudieron generar variantes de %s", archivo.name)
+    return nuevas
+
+
+def guardar_variantes(reparacion, campos, nuevas):
+    """
+    Reemplaza en la fila las variantes de `campos` por `nuevas` (lo que
+    devolvió generar_variantes para `reparacion`). La fila se bloquea solo
+    para esto, no mientras Pillow trabaja: un campo cuya foto cambió en el
+    medio no se toca y sus variantes nuevas se borran (la foto nueva tiene
+    su propia tarea). Devuelve la fila guardada, o None si ya no existe.
+    """
+    modelo = type(reparacion)
+    with transaction.atomic():
+        actual = modelo.objects.select_for_update().filter(pk=reparacion.pk).first()
+        vigentes = [
+            campo
+            for campo in campos
+            if actual is not None and getattr(actual, campo).name == getattr(reparacion, campo).name
+        ]
+        descartadas = [
+            variante[formato]
+            for campo, variantes in nuevas.items()
+            if campo not in vigentes
+            for variante in variantes
+            for formato in FORMATOS
+        ]
+        if descartadas:
+            storage = reparacion._meta.get_field("imagen").storage
+
+            def borrar():
+                for nombre in descartadas:
+                    storage.delete(nombre)
+
+            transaction.on_commit(borrar)
+        if not vigentes:
+            return actual
+        liberar_variantes(actual, vigentes)
+        actual.variantes = {
+            **actual.variantes,
+            **{campo: nuevas[campo] for campo in vigentes if campo in nuevas},
+        }
+        actual.save(update_fields=["variantes", "updated_at"])
+    return actual
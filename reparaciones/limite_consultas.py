@@ -0,0 +1,54 @@
+import logging
+from contextlib import ExitStack
+from functools import wraps
+
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class LimiteConsultasExcedido(Exception):
+    pass
+
+
+class _Contador:
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.total += 1
+        return execute(sql, params, many, context)
+
+
+def limite_consultas(maximo):
+    """
+    Declara cuántas consultas SQL puede hacer una vista (incluido el render).
+
+    Si se excede, loguea un warning; con LIMITE_CONSULTAS_ESTRICTO=True lanza
+    LimiteConsultasExcedido, que es lo que usan los tests para detectar N+1.
+    """
+
+    def decorador(view_func):
+        @wraps(view_func)
+        def _wrapped(request, *args, **kwargs):
+            contador = _Contador()
+            with ExitStack() as stack:
+                for alias in connections:
+                    stack.enter_context(connections[alias].execute_wrapper(contador))
+                response = view_func(request, *args, **kwargs)
+
+            if contador.total > maximo:
+                mensaje = (
+                    f"{view_func.__name__} hizo {contador.total} consultas "
+                    f"(límite {maximo}) en {request.path}"
+                )
+                if getattr(settings, "LIMITE_CONSULTAS_ESTRICTO", False):
+                    raise LimiteConsultasExcedido(mensaje)
+                logger.warning(mensaje)
+            return response
+
+        _wrapped.limite_consultas = maximo
+        return _wrapped
+
+    return decorador
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+
+from reparaciones.retencion import aplicar_retencion
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Aplica las reglas de MEDIA_RETENCION a las reparaciones entregadas o "
+        "finalizadas: borra videos viejos y deja las fotos en miniatura. "
+        "Informa los bytes liberados por regla."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=200)
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Solo informa cuántas reparaciones y bytes tocaría cada regla.",
+        )
+
+    def handle(self, *args, **options):
+        resultados = {}
+        for accion, total, liberados in aplicar_retencion(
+            lote=options["lote"], simular=options["simular"]
+        ):
+            resultados[accion] = (total, liberados)
+            self.stdout.write(f"{accion}: {total} reparaciones procesadas...")
+
+        verbo = "se liberarían" if options["simular"] else "liberados"
+        for accion, (total, liberados) in resultados.items():
+            self.stdout.write(f"{accion}: {total} reparaciones, {liberados / MB:.1f}MB {verbo}.")
+        total_mb = sum(liberados for _, liberados in resultados.values()) / MB
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total_mb:.1f}MB {verbo}."))
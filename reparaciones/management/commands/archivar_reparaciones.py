@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reparaciones.archivo import archivar_reparaciones, reparaciones_a_archivar
+
+
+class Command(BaseCommand):
+    help = (
+        "Mueve al archivo las reparaciones finalizadas hace más de N meses, "
+        "con sus presupuestos y factura final, en lotes por id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--meses", type=int, default=settings.ARCHIVO_MESES)
+        parser.add_argument("--lote", type=int, default=500)
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Solo informa cuántas reparaciones se archivarían.",
+        )
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(days=30 * options["meses"])
+        if options["simular"]:
+            cantidad = reparaciones_a_archivar(antes_de).count()
+            self.stdout.write(f"Se archivarían {cantidad} reparaciones.")
+            return
+
+        total = 0
+        for total in archivar_reparaciones(antes_de, lote=options["lote"]):
+            self.stdout.write(f"{total} reparaciones archivadas...")
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} reparaciones."))
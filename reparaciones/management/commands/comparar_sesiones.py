@@ -0,0 +1,60 @@
+from django.contrib.auth.models import User
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+MOTORES = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Cuenta las consultas por request de inicio con cada motor de sesiones "
+        "(db, cached_db, signed_cookies). El usuario de prueba se revierte al terminar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                usuario = User.objects.create_user("comparar_sesiones")
+                for modo, motor in MOTORES.items():
+                    with override_settings(SESSION_ENGINE=motor):
+                        self._medir(modo, usuario, options["requests"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _medir(self, modo, usuario, cantidad):
+        cache.clear()
+        cliente = Client(SERVER_NAME="localhost")
+        cliente.force_login(usuario)
+        url = reverse("inicio")
+        # El primer request calienta la cache del tablero (y la de sesión).
+        cliente.get(url)
+
+        totales = sesion = 0
+        tabla = Session._meta.db_table
+        for _ in range(cantidad):
+            with CaptureQueriesContext(connection) as capturadas:
+                cliente.get(url)
+            totales += len(capturadas)
+            sesion += sum(tabla in consulta["sql"] for consulta in capturadas)
+
+        self.stdout.write(
+            f"{modo:<15} {totales / cantidad:.1f} consultas/request "
+            f"({sesion / cantidad:.1f} a {tabla})"
+        )
@@ -0,0 +1,215 @@
+import random
+import re
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from reparaciones import views
+from reparaciones.models import (
+    ESTADOS,
+    FacturaFinal,
+    Presupuesto,
+    Reparacion,
+    actualizar_resumen_presupuestos,
+)
+from reparaciones.paginacion import codificar_cursor
+
+TABLAS = ("reparaciones_reparacion", "reparaciones_presupuesto", "reparaciones_facturafinal")
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Carga un dataset grande y muestra el plan (EXPLAIN / EXPLAIN ANALYZE) de "
+        "cada consulta que ejecutan los listados y el admin de reparaciones."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reparaciones", type=int, default=50000)
+        parser.add_argument("--usuarios", type=int, default=500)
+        parser.add_argument(
+            "--conservar",
+            action="store_true",
+            help="No revertir el dataset cargado al terminar.",
+        )
+        parser.add_argument("--seed", type=int, default=1234)
+
+    def handle(self, *args, **options):
+        random.seed(options["seed"])
+        try:
+            with transaction.atomic():
+                staff, cliente = self._cargar_dataset(
+                    options["reparaciones"], options["usuarios"]
+                )
+                self._analizar_tablas()
+                escaneos = self._explicar_vistas(staff, cliente)
+                if not options["conservar"]:
+                    raise _Rollback
+        except _Rollback:
+            self.stdout.write("Dataset revertido.")
+
+        if escaneos:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{escaneos} consulta(s) con scan completo sobre tablas de reparaciones."
+                )
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS("Todas las consultas usan índices."))
+
+    # -----------------------------
+    # Dataset
+    # -----------------------------
+    def _cargar_dataset(self, total, cantidad_usuarios):
+        self.stdout.write(f"Cargando {total} reparaciones para {cantidad_usuarios} usuarios...")
+        staff = User.objects.create_superuser(
+            f"explain_staff_{random.randrange(10**9)}", password=None
+        )
+        usuarios = User.objects.bulk_create(
+            User(username=f"explain_{random.randrange(10**9)}_{i}")
+            for i in range(cantidad_usuarios)
+        )
+        estados = [clave for clave, _ in ESTADOS]
+        # La mayor parte del historial de un taller está finalizado.
+        pesos = [1, 1, 1, 2, 1, 1, 20]
+        ahora = timezone.now()
+        lote = 2000
+        for inicio in range(0, total, lote):
+            reparaciones = Reparacion.objects.bulk_create(
+                Reparacion(
+                    usuario=random.choice(usuarios),
+                    nombre_cliente="explain",
+                    telefono=f"2944{random.randrange(10**6):06d}",
+                    ubicacion="Centro",
+                    tipo_equipo=random.choice(["Surf", "Kite", "Foil", "SUP"]),
+                    descripcion="Dataset de prueba",
+                    imagen="reparaciones/explain.jpg",
+                    estado=random.choices(estados, pesos)[0],
+                )
+                for _ in range(min(lote, total - inicio))
+            )
+            # auto_now_add pisa created_at en bulk_create; bulk_update no.
+            for reparacion in reparaciones:
+                reparacion.created_at = ahora - timedelta(minutes=random.randrange(10**6))
+            Reparacion.objects.bulk_update(reparaciones, ["created_at"])
+
+            presupuestos = []
+            facturas = []
+            for reparacion in reparaciones:
+                for _ in range(random.randint(0, 3)):
+                    presupuestos.append(
+                        Presupuesto(
+                            reparacion=reparacion,
+                            archivo_presupuesto="reparaciones/presupuestos/explain.pdf",
+                            estado="aprobado",
+                            monto=Decimal(random.randrange(10000, 500000)),
+                        )
+                    )
+                if reparacion.estado == "finalizado":
+                    facturas.append(
+                        FacturaFinal(reparacion=reparacion, monto_total=Decimal("1000"))
+                    )
+            Presupuesto.objects.bulk_create(presupuestos)
+            actualizar_resumen_presupuestos(reparacion.pk for reparacion in reparaciones)
+            FacturaFinal.objects.bulk_create(facturas)
+
+        return staff, usuarios[0]
+
+    def _analizar_tablas(self):
+        # Sin estadísticas el planner no tiene con qué elegir un índice.
+        with connection.cursor() as cursor:
+            for tabla in TABLAS:
+                cursor.execute(f"ANALYZE {connection.ops.quote_name(tabla)}")
+
+    # -----------------------------
+    # Vistas
+    # -----------------------------
+    def _explicar_vistas(self, staff, cliente):
+        factory = RequestFactory()
+        reparacion_admin = admin.site._registry[Reparacion]
+        finalizada = (
+            Reparacion.objects.filter(estado="finalizado")
+            .order_by("-created_at", "-id")[500:501]
+            .first()
+        )
+        casos = [
+            ("inicio", cliente, views.inicio, "/", {}),
+            ("staff_reparaciones", staff, views.staff_reparaciones, "/", {}),
+            ("staff_finalizados", staff, views.staff_finalizados, "/", {}),
+            (
+                "staff_finalizados (página profunda)",
+                staff,
+                views.staff_finalizados,
+                "/",
+                {"despues": codificar_cursor(finalizada)} if finalizada else {},
+            ),
+            ("admin changelist", staff, reparacion_admin.changelist_view, "/admin/", {}),
+            (
+                "admin changelist ?estado=en_proceso",
+                staff,
+                reparacion_admin.changelist_view,
+                "/admin/",
+                {"estado__exact": "en_proceso"},
+            ),
+        ]
+        escaneos = 0
+        for nombre, usuario, vista, path, params in casos:
+            request = factory.get(path, params)
+            request.user = usuario
+            request._messages = CookieStorage(request)
+            with CaptureQueriesContext(connection) as capturadas:
+                response = vista(request)
+                if hasattr(response, "render"):
+                    response.render()
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n== {nombre} =="))
+            # Las consultas repetidas (N+1) se muestran una vez con su cantidad.
+            consultas = {}
+            for consulta in capturadas.captured_queries:
+                sql = consulta["sql"]
+                if not sql.lstrip().upper().startswith("SELECT"):
+                    continue
+                if not any(tabla in sql for tabla in TABLAS):
+                    continue
+                forma = re.sub(r"\b\d+\b", "?", sql)
+                consultas.setdefault(forma, [sql, 0])[1] += 1
+
+            for sql, cantidad in consultas.values():
+                plan = self._explicar(sql)
+                completo = self._es_scan_completo(plan)
+                escaneos += completo
+                repeticiones = f" (x{cantidad})" if cantidad > 1 else ""
+                self.stdout.write(sql[:200] + ("..." if len(sql) > 200 else "") + repeticiones)
+                estilo = self.style.WARNING if completo else self.style.SUCCESS
+                for linea in plan:
+                    self.stdout.write(estilo(f"    {linea}"))
+        return escaneos
+
+    def _explicar(self, sql):
+        analizar = connection.vendor == "postgresql"
+        prefijo = connection.ops.explain_query_prefix(**({"analyze": True} if analizar else {}))
+        with connection.cursor() as cursor:
+            cursor.execute(f"{prefijo} {sql}")
+            filas = cursor.fetchall()
+        # SQLite devuelve (id, parent, notused, detail); Postgres una columna por línea.
+        return [str(fila[-1]) for fila in filas]
+
+    def _es_scan_completo(self, plan):
+        for linea in plan:
+            if connection.vendor == "postgresql":
+                if "Seq Scan on reparaciones_" in linea:
+                    return True
+            elif linea.startswith("SCAN reparaciones_") and "USING" not in linea:
+                return True
+        return False
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from reparaciones.exportacion import entradas_de_facturas, entradas_de_reparacion, zip_en_stream
+from reparaciones.models import Reparacion, ReparacionArchivada
+
+
+class Command(BaseCommand):
+    help = (
+        "Escribe un ZIP con fotos, video, presupuestos y factura de una "
+        "reparación (--reparacion) o con las facturas finales de un período "
+        "(--desde/--hasta). El archivo se arma por bloques, sin cargarlo en memoria."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reparacion", type=int)
+        parser.add_argument("--desde", help="AAAA-MM-DD")
+        parser.add_argument("--hasta", help="AAAA-MM-DD")
+        parser.add_argument("--salida", required=True, help="Ruta del .zip a escribir.")
+
+    def handle(self, *args, **options):
+        if options["reparacion"] is not None:
+            reparacion = (
+                Reparacion.objects.filter(pk=options["reparacion"]).first()
+                or ReparacionArchivada.objects.filter(pk=options["reparacion"]).first()
+            )
+            if reparacion is None:
+                raise CommandError(f"No existe la reparación {options['reparacion']}.")
+            entradas = entradas_de_reparacion(reparacion)
+        else:
+            try:
+                desde = parse_date(options["desde"] or "")
+                hasta = parse_date(options["hasta"] or "")
+            except ValueError:
+                # Bien formada pero inexistente, como 2024-02-30.
+                desde = hasta = None
+            if desde is None or hasta is None or desde > hasta:
+                raise CommandError("Indicá --reparacion o un período válido con --desde y --hasta.")
+            entradas = entradas_de_facturas(desde, hasta)
+
+        total = 0
+        with open(options["salida"], "wb") as salida:
+            for datos in zip_en_stream(entradas):
+                salida.write(datos)
+                total += len(datos)
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Listo: {len(entradas)} archivos, {total / (1024 * 1024):.1f}MB en {options['salida']}."
+            )
+        )
@@ -0,0 +1,82 @@
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from reparaciones.imagenes import CAMPOS_IMAGEN, generar_variantes, guardar_variantes
+from reparaciones.models import Reparacion
+
+
+def _campos_pendientes(reparacion, todas):
+    return [
+        campo
+        for campo in CAMPOS_IMAGEN
+        if getattr(reparacion, campo) and (todas or campo not in (reparacion.variantes or {}))
+    ]
+
+
+def _procesar(pk, campos):
+    reparacion = Reparacion.objects.get(pk=pk)
+    # El save de guardar_variantes invalida el tablero del cliente.
+    guardar_variantes(reparacion, campos, generar_variantes(reparacion, campos))
+
+
+def _procesar_en_hilo(pk, campos):
+    # Cada thread tiene su propia conexión; se cierra al terminar la tarea.
+    try:
+        _procesar(pk, campos)
+    finally:
+        connection.close()
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera las variantes reducidas de las fotos de reparaciones que todavía "
+        "no las tienen, en paralelo. Las archivadas conservan las que tenían."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hilos", type=int, default=4)
+        parser.add_argument("--lote", type=int, default=200)
+        parser.add_argument(
+            "--todas",
+            action="store_true",
+            help="Regenerar también las que ya tienen variantes.",
+        )
+
+    def handle(self, *args, **options):
+        if options["hilos"] <= 1:
+            self._backfill(None, options)
+            return
+        with ThreadPoolExecutor(max_workers=options["hilos"]) as executor:
+            self._backfill(executor, options)
+
+    def _backfill(self, executor, options):
+        ultimo_id = 0
+        total = 0
+        while True:
+            reparaciones = list(
+                Reparacion.objects.filter(pk__gt=ultimo_id)
+                .order_by("pk")
+                .only("pk", *CAMPOS_IMAGEN, "variantes")[: options["lote"]]
+            )
+            if not reparaciones:
+                break
+            ultimo_id = reparaciones[-1].pk
+
+            pendientes = [
+                (reparacion.pk, campos)
+                for reparacion in reparaciones
+                if (campos := _campos_pendientes(reparacion, options["todas"]))
+            ]
+            if executor is None:
+                for pk, campos in pendientes:
+                    _procesar(pk, campos)
+            else:
+                tareas = [executor.submit(_procesar_en_hilo, *tarea) for tarea in pendientes]
+                for tarea in as_completed(tareas):
+                    tarea.result()
+            total += len(pendientes)
+            self.stdout.write(f"{total} reparaciones procesadas...")
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} reparaciones."))
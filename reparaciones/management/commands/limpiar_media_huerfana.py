@@ -0,0 +1,52 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reparaciones.huerfanos import recolectar_huerfanos
+
+MB = 1024 * 1024
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra del storage los archivos de media que ninguna fila referencia "
+        "(reparaciones borradas, facturas reemplazadas, subidas abandonadas). "
+        "Recorre el storage por páginas y no toca archivos más nuevos que "
+        "MEDIA_HUERFANOS_GRACIA_HORAS."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horas", type=int, default=settings.MEDIA_HUERFANOS_GRACIA_HORAS)
+        parser.add_argument("--lote", type=int, default=1000)
+        parser.add_argument(
+            "--prefijo",
+            action="append",
+            help="Recorrer solo este prefijo (se puede repetir). Por defecto, los de upload_to.",
+        )
+        parser.add_argument(
+            "--simular",
+            action="store_true",
+            help="Solo informa qué se borraría.",
+        )
+
+    def handle(self, *args, **options):
+        antes_de = timezone.now() - timedelta(hours=options["horas"])
+        revisados = huerfanos = liberados = 0
+        for revisados, huerfanos, liberados in recolectar_huerfanos(
+            default_storage,
+            antes_de=antes_de,
+            lote=options["lote"],
+            simular=options["simular"],
+            prefijos=options["prefijo"],
+        ):
+            self.stdout.write(f"{revisados} archivos revisados, {huerfanos} huérfanos...")
+
+        verbo = "se borrarían" if options["simular"] else "borrados"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Listo: {huerfanos} de {revisados} archivos {verbo} ({liberados / MB:.1f}MB)."
+            )
+        )
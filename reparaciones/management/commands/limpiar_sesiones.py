@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+MOTORES_CON_TABLA = (
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Borra las sesiones vencidas de django_session en lotes, para no "
+        "bloquear la tabla con un único DELETE grande como clearsessions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=5000)
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE not in MOTORES_CON_TABLA:
+            self.stdout.write(
+                f"{settings.SESSION_ENGINE} no guarda sesiones en la base: nada para limpiar."
+            )
+            return
+
+        ahora = timezone.now()
+        total = 0
+        while True:
+            claves = list(
+                Session.objects.filter(expire_date__lt=ahora).values_list(
+                    "session_key", flat=True
+                )[: options["lote"]]
+            )
+            if not claves:
+                break
+            total += Session.objects.filter(session_key__in=claves).delete()[0]
+            self.stdout.write(f"{total} sesiones borradas...")
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} sesiones vencidas."))
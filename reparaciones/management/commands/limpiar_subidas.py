@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from reparaciones.models import SubidaReanudable
+from reparaciones.subidas import descartar_reanudable
+
+
+class Command(BaseCommand):
+    help = (
+        "Descarta las subidas reanudables sin actividad hace más de "
+        "SUBIDA_REANUDABLE_HORAS: aborta el multipart en el bucket o borra "
+        "las partes locales. De las completadas solo se borra el registro."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--horas", type=int, default=settings.SUBIDA_REANUDABLE_HORAS)
+        parser.add_argument("--lote", type=int, default=200)
+
+    def handle(self, *args, **options):
+        limite = timezone.now() - timedelta(hours=options["horas"])
+        total = 0
+        while True:
+            subidas = list(
+                SubidaReanudable.objects.filter(updated_at__lt=limite).order_by("pk")[
+                    : options["lote"]
+                ]
+            )
+            if not subidas:
+                break
+            for subida in subidas:
+                descartar_reanudable(subida)
+            total += len(subidas)
+            self.stdout.write(f"{total} subidas descartadas...")
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} subidas vencidas."))
@@ -0,0 +1,87 @@
+import statistics
+import threading
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+
+from reparaciones.pool import estadisticas_pool
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide la latencia de una URL con N threads concurrentes, cada uno con "
+        "su conexión como un worker gthread. Correrlo con DJANGO_DB_POOL=0 y "
+        "DJANGO_DB_POOL=1 contra la misma base para comparar."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--url", default="/staff/reparaciones/")
+        parser.add_argument("--usuario", help="Username con el que loguearse (default: primer staff).")
+        parser.add_argument("--concurrencia", type=int, default=16)
+        parser.add_argument("--requests", type=int, default=400)
+
+    def handle(self, *args, **options):
+        usuario = (
+            User.objects.filter(username=options["usuario"]).first()
+            if options["usuario"]
+            else User.objects.filter(is_staff=True).order_by("pk").first()
+        )
+        if usuario is None:
+            raise CommandError("No hay usuario para loguearse.")
+        login = Client()
+        login.force_login(usuario)
+        cookies = login.cookies
+
+        pendientes = iter(range(options["requests"]))
+        lock = threading.Lock()
+        latencias = []
+        errores = []
+
+        def worker():
+            cliente = Client(SERVER_NAME="localhost")
+            cliente.cookies = cookies
+            try:
+                while True:
+                    with lock:
+                        if next(pendientes, None) is None:
+                            return
+                    inicio = time.perf_counter()
+                    response = cliente.get(options["url"])
+                    duracion = (time.perf_counter() - inicio) * 1000
+                    with lock:
+                        latencias.append(duracion)
+                        if response.status_code != 200:
+                            errores.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options["concurrencia"])]
+        inicio = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        total = time.perf_counter() - inicio
+
+        percentiles = statistics.quantiles(latencias, n=100, method="inclusive")
+        modo = "pool" if settings.DB_POOL else f"CONN_MAX_AGE={settings.DATABASES['default']['CONN_MAX_AGE']}"
+        self.stdout.write(
+            f"{options['url']} · {modo} · {options['concurrencia']} threads · "
+            f"{len(latencias)} requests en {total:.2f}s ({len(latencias) / total:.1f} req/s)"
+        )
+        self.stdout.write(
+            f"p50 {percentiles[49]:.1f} ms · p95 {percentiles[94]:.1f} ms · "
+            f"p99 {percentiles[98]:.1f} ms · máx {max(latencias):.1f} ms"
+        )
+        if errores:
+            self.stdout.write(self.style.WARNING(f"{len(errores)} respuestas no-200: {set(errores)}"))
+        for fila in estadisticas_pool():
+            self.stdout.write(
+                f"pool {fila['alias']}: {fila['abiertas']}/{fila['maximo']} conexiones, "
+                f"{fila['encolados']} pedidos esperaron "
+                f"{fila['espera_promedio_ms']:.1f} ms en promedio"
+            )
@@ -0,0 +1,122 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Prefetch
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+
+from reparaciones.models import Presupuesto, Reparacion, actualizar_resumen_presupuestos
+from reparaciones.storage import urls_firmadas
+
+# Credenciales de mentira: firmar una URL no habla con R2, así que se mide
+# solo el costo de la firma.
+STORAGE_R2 = {
+    "default": {
+        "BACKEND": "reparaciones.storage.R2Storage",
+        "OPTIONS": {
+            "access_key": "benchmark",
+            "secret_key": "benchmark",
+            "bucket_name": "taller",
+            "endpoint_url": "https://cuenta.r2.cloudflarestorage.com",
+            "region_name": "auto",
+        },
+    },
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Renderiza el tablero con N tarjetas sobre R2Storage, con y sin la "
+        "cache de URLs firmadas, y compara los tiempos. Cada render firma las "
+        "fotos, el video y el presupuesto de cada tarjeta."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--tarjetas", type=int, default=200)
+        parser.add_argument("--repeticiones", type=int, default=20)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                reparaciones = self._cargar(options["tarjetas"])
+                with override_settings(STORAGES=STORAGE_R2):
+                    for cache in (False, True):
+                        self._medir(reparaciones, cache, options["repeticiones"])
+                raise _Rollback
+        except _Rollback:
+            pass
+
+    def _cargar(self, cantidad):
+        usuario = User.objects.create_user("medir_render_urls")
+        reparaciones = Reparacion.objects.bulk_create(
+            Reparacion(
+                usuario=usuario,
+                nombre_cliente="Cliente",
+                telefono="2944000000",
+                tipo_equipo="Surf",
+                descripcion="Golpe en la cola",
+                imagen=f"reparaciones/foto_{i}.jpg",
+                imagen2=f"reparaciones/foto_{i}_b.jpg",
+                video=f"reparaciones/videos/video_{i}.mp4",
+            )
+            for i in range(cantidad)
+        )
+        Presupuesto.objects.bulk_create(
+            Presupuesto(
+                reparacion=reparacion,
+                archivo_presupuesto=f"reparaciones/presupuestos/presupuesto_{reparacion.pk}.pdf",
+                estado="enviado",
+            )
+            for reparacion in reparaciones
+        )
+        # bulk_create no pasa por Presupuesto.save: sin esto las tarjetas
+        # quedan sin último presupuesto y el tablero no lo muestra.
+        actualizar_resumen_presupuestos(reparacion.pk for reparacion in reparaciones)
+        # La misma consulta que inicio.
+        return list(
+            Reparacion.objects.filter(usuario=usuario)
+            .select_related("usuario", "factura_final", "ultimo_presupuesto")
+            .prefetch_related(
+                Prefetch("presupuestos", queryset=Presupuesto.objects.order_by("-fecha_creacion"))
+            )
+        )
+
+    def _firmar_archivos(self, reparaciones):
+        # El tablero firma imagen e imagen2; el video y los presupuestos se
+        # bajan por servir_media y descargar_presupuesto, así que se firman
+        # aparte para que la medición cubra los cuatro tipos de URL.
+        for reparacion in reparaciones:
+            reparacion.video.url
+            for presupuesto in reparacion.presupuestos.all():
+                presupuesto.archivo_presupuesto.url
+
+    def _medir(self, reparaciones, cache, repeticiones):
+        request = RequestFactory().get("/")
+        request.user = reparaciones[0].usuario if reparaciones else None
+        urls_firmadas.clear()
+        tiempos = []
+        with override_settings(MEDIA_URLS_CACHE=cache):
+            for _ in range(repeticiones + 1):
+                inicio = time.perf_counter()
+                render_to_string(
+                    "reparaciones/_tablero.html",
+                    {"reparaciones": reparaciones, "pagina": None},
+                    request=request,
+                )
+                self._firmar_archivos(reparaciones)
+                tiempos.append((time.perf_counter() - inicio) * 1000)
+        # El primer render llena la cache: se informa aparte.
+        primero, resto = tiempos[0], tiempos[1:]
+        self.stdout.write(
+            f"{'con cache' if cache else 'sin cache'}: primer render {primero:.1f} ms · "
+            f"mediana {statistics.median(resto):.1f} ms · mínimo {min(resto):.1f} ms "
+            f"({len(reparaciones)} tarjetas)"
+        )
@@ -0,0 +1,84 @@
+import signal
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+from django.tasks import DEFAULT_TASK_BACKEND_ALIAS, DEFAULT_TASK_QUEUE_NAME, task_backends
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from reparaciones.cola import BaseDeDatosBackend
+from reparaciones.models import TareaEncolada
+
+
+class Command(BaseCommand):
+    help = (
+        "Worker de la cola de tareas en la base (reparaciones.cola): toma las "
+        "tareas listas de a una y las ejecuta, con reintentos. SIGTERM/SIGINT "
+        "terminan la tarea en curso y salen."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--backend", default=DEFAULT_TASK_BACKEND_ALIAS)
+        parser.add_argument("--colas", nargs="+", default=[DEFAULT_TASK_QUEUE_NAME])
+        parser.add_argument(
+            "--espera",
+            type=float,
+            default=1.0,
+            help="Segundos entre consultas cuando no hay tareas.",
+        )
+        parser.add_argument(
+            "--hasta-vaciar",
+            action="store_true",
+            help="Salir cuando no queden tareas listas (cron, tests).",
+        )
+        parser.add_argument(
+            "--purgar",
+            action="store_true",
+            help="Solo borrar las tareas terminadas hace más de TAREAS_CONSERVAR_DIAS.",
+        )
+
+    def handle(self, *args, **options):
+        if options["purgar"]:
+            limite = timezone.now() - timedelta(days=settings.TAREAS_CONSERVAR_DIAS)
+            borradas, _ = TareaEncolada.objects.filter(finalizada_en__lt=limite).delete()
+            self.stdout.write(self.style.SUCCESS(f"Listo: {borradas} tareas borradas."))
+            return
+
+        backend = task_backends[options["backend"]]
+        if not isinstance(backend, BaseDeDatosBackend):
+            raise CommandError(
+                f"El backend {options['backend']!r} no es una cola en la base "
+                "(¿TAREAS_EN_SEGUNDO_PLANO apagado?)."
+            )
+
+        self.seguir = True
+
+        def detener(signum, frame):
+            self.seguir = False
+
+        anteriores = {
+            senal: signal.signal(senal, detener) for senal in (signal.SIGTERM, signal.SIGINT)
+        }
+        worker_id = get_random_string(32)
+        total = 0
+        try:
+            while self.seguir:
+                close_old_connections()
+                fila = backend.tomar(options["colas"], worker_id)
+                if fila is None:
+                    if options["hasta_vaciar"]:
+                        break
+                    time.sleep(options["espera"])
+                    continue
+                resultado = backend.ejecutar(fila)
+                total += 1
+                estado = resultado.status if resultado is not None else "FAILED"
+                self.stdout.write(f"{total} tareas procesadas... ({fila.tarea}: {estado})")
+        finally:
+            for senal, anterior in anteriores.items():
+                signal.signal(senal, anterior)
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} tareas."))
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reparaciones.models import Reparacion, actualizar_resumen_presupuestos
+
+
+class Command(BaseCommand):
+    help = (
+        "Completa ultimo_presupuesto y presupuestos_count de las reparaciones "
+        "existentes, en lotes por id."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lote", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        lote = options["lote"]
+        ultimo_id = 0
+        total = 0
+        while True:
+            ids = list(
+                Reparacion.objects.filter(pk__gt=ultimo_id)
+                .order_by("pk")
+                .values_list("pk", flat=True)[:lote]
+            )
+            if not ids:
+                break
+            with transaction.atomic():
+                total += actualizar_resumen_presupuestos(ids)
+            ultimo_id = ids[-1]
+            self.stdout.write(f"{total} reparaciones actualizadas...")
+
+        self.stdout.write(self.style.SUCCESS(f"Listo: {total} reparaciones."))
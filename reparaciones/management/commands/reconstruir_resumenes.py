@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from reparaciones.resumenes import reconstruir_resumenes
+
+
+class Command(BaseCommand):
+    help = (
+        "Reconstruye desde cero el resumen mensual de facturas y presupuestos "
+        "que usa la página de estadísticas."
+    )
+
+    def handle(self, *args, **options):
+        celdas = reconstruir_resumenes()
+        self.stdout.write(self.style.SUCCESS(f"Resumen reconstruido: {celdas} celdas."))
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 11:43
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0018_presupuesto_aprobado_en_presupuesto_aprobado_por_and_more'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['reparacion', 'fecha_creacion'], name='presupuesto_rep_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacion',
+            index=models.Index(fields=['created_at', 'id'], name='reparacion_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacion',
+            index=models.Index(fields=['estado', 'created_at', 'id'], name='reparacion_estado_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacion',
+            index=models.Index(fields=['usuario', 'created_at', 'id'], name='reparacion_usuario_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacion',
+            index=models.Index(fields=['tipo_equipo'], name='reparacion_tipo_equipo_idx'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 6.0 on 2026-10-18 11:44
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0019_indices_listados'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reparacion',
+            name='presupuestos_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reparacion',
+            name='ultimo_presupuesto',
+            field=models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='reparaciones.presupuesto'),
+        ),
+    ]
@@ -0,0 +1,91 @@
+from django.db import migrations
+
+# El SQL va copiado y no importado de reparaciones.busqueda: la migración
+# tiene que crear siempre lo mismo aunque el módulo cambie.
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE reparaciones_reparacion ADD COLUMN busqueda tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('spanish', coalesce(tipo_equipo, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(nombre_cliente, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(telefono, '')), 'A') ||
+        setweight(to_tsvector('spanish', coalesce(ubicacion, '')), 'B') ||
+        setweight(to_tsvector('spanish', coalesce(descripcion, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX reparacion_busqueda_gin ON reparaciones_reparacion USING gin (busqueda)",
+    """
+    CREATE INDEX reparacion_telefono_trgm ON reparaciones_reparacion
+    USING gin (telefono gin_trgm_ops)
+    """,
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS reparacion_telefono_trgm",
+    "DROP INDEX IF EXISTS reparacion_busqueda_gin",
+    "ALTER TABLE reparaciones_reparacion DROP COLUMN IF EXISTS busqueda",
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE reparaciones_reparacion_fts USING fts5(
+        nombre_cliente, telefono, ubicacion, tipo_equipo, descripcion,
+        content='reparaciones_reparacion',
+        content_rowid='id',
+        tokenize='trigram'
+    )
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS reparaciones_reparacion_fts_ai AFTER INSERT ON reparaciones_reparacion BEGIN
+        INSERT INTO reparaciones_reparacion_fts(rowid, nombre_cliente, telefono, ubicacion, tipo_equipo, descripcion)
+        VALUES (new.id, new.nombre_cliente, new.telefono, new.ubicacion, new.tipo_equipo, new.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS reparaciones_reparacion_fts_ad AFTER DELETE ON reparaciones_reparacion BEGIN
+        INSERT INTO reparaciones_reparacion_fts(reparaciones_reparacion_fts, rowid, nombre_cliente, telefono, ubicacion, tipo_equipo, descripcion)
+        VALUES ('delete', old.id, old.nombre_cliente, old.telefono, old.ubicacion, old.tipo_equipo, old.descripcion);
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS reparaciones_reparacion_fts_au
+    AFTER UPDATE OF nombre_cliente, telefono, ubicacion, tipo_equipo, descripcion
+    ON reparaciones_reparacion BEGIN
+        INSERT INTO reparaciones_reparacion_fts(reparaciones_reparacion_fts, rowid, nombre_cliente, telefono, ubicacion, tipo_equipo, descripcion)
+        VALUES ('delete', old.id, old.nombre_cliente, old.telefono, old.ubicacion, old.tipo_equipo, old.descripcion);
+        INSERT INTO reparaciones_reparacion_fts(rowid, nombre_cliente, telefono, ubicacion, tipo_equipo, descripcion)
+        VALUES (new.id, new.nombre_cliente, new.telefono, new.ubicacion, new.tipo_equipo, new.descripcion);
+    END
+    """,
+    "INSERT INTO reparaciones_reparacion_fts(reparaciones_reparacion_fts) VALUES ('rebuild')",
+]
+
+SQLITE_REVERSE = [
+    "DROP TRIGGER IF EXISTS reparaciones_reparacion_fts_au",
+    "DROP TRIGGER IF EXISTS reparaciones_reparacion_fts_ad",
+    "DROP TRIGGER IF EXISTS reparaciones_reparacion_fts_ai",
+    "DROP TABLE IF EXISTS reparaciones_reparacion_fts",
+]
+
+
+def _ejecutar(sentencias_por_motor):
+    def operacion(apps, schema_editor):
+        for sql in sentencias_por_motor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("reparaciones", "0020_reparacion_resumen_presupuestos"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _ejecutar({"postgresql": POSTGRES_FORWARD, "sqlite": SQLITE_FORWARD}),
+            _ejecutar({"postgresql": POSTGRES_REVERSE, "sqlite": SQLITE_REVERSE}),
+        ),
+    ]
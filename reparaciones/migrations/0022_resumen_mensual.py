@@ -0,0 +1,47 @@
+# Generated by Django 6.0 on 2026-10-18 11:49
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0021_busqueda_reparaciones'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ResumenMensual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('mes', models.DateField()),
+                ('moneda', models.CharField(max_length=3)),
+                ('tipo_equipo', models.CharField(max_length=50)),
+                ('ubicacion', models.CharField(blank=True, max_length=200)),
+                ('facturas_cantidad', models.PositiveIntegerField(default=0)),
+                ('facturas_monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('presupuestos_cantidad', models.PositiveIntegerField(default=0)),
+                ('presupuestos_monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('aprobados_cantidad', models.PositiveIntegerField(default=0)),
+                ('aprobados_monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-mes', 'moneda', 'tipo_equipo', 'ubicacion'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='facturafinal',
+            index=models.Index(fields=['created_at'], name='facturafinal_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['fecha_creacion'], name='presupuesto_fecha_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='resumenmensual',
+            constraint=models.UniqueConstraint(fields=('mes', 'moneda', 'tipo_equipo', 'ubicacion'), name='resumen_mensual_unico'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 6.0 on 2026-10-18 11:51
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0022_resumen_mensual'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransicionEstado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estado_anterior', models.CharField(blank=True, choices=[('recibida', 'Recibimos tu solicitud'), ('pendiente_presupuesto', 'Estamos presupuestando el pedido'), ('pendiente_pago', 'Estamos a espera de tu aprobación y pago de seña'), ('en_proceso', 'En proceso de reparación'), ('listo_para_entregar', 'Listo para entregar'), ('entregado', 'Recibido por el cliente'), ('finalizado', 'Recibimos el pago final')], max_length=50)),
+                ('estado_nuevo', models.CharField(choices=[('recibida', 'Recibimos tu solicitud'), ('pendiente_presupuesto', 'Estamos presupuestando el pedido'), ('pendiente_pago', 'Estamos a espera de tu aprobación y pago de seña'), ('en_proceso', 'En proceso de reparación'), ('listo_para_entregar', 'Listo para entregar'), ('entregado', 'Recibido por el cliente'), ('finalizado', 'Recibimos el pago final')], max_length=50)),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now)),
+                ('origen', models.CharField(blank=True, max_length=50)),
+                ('reparacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transiciones', to='reparaciones.reparacion')),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['fecha', 'id'],
+                'indexes': [models.Index(fields=['reparacion', 'fecha', 'id'], name='transicion_rep_fecha_idx'), models.Index(fields=['fecha'], name='transicion_fecha_idx')],
+            },
+        ),
+    ]
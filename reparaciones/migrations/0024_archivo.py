@@ -0,0 +1,89 @@
+# Generated by Django 6.0 on 2026-10-18 11:53
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0023_transicion_estado'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReparacionArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('nombre_cliente', models.CharField(max_length=100)),
+                ('telefono', models.CharField(max_length=20)),
+                ('ubicacion', models.CharField(blank=True, max_length=200)),
+                ('tipo_equipo', models.CharField(max_length=50)),
+                ('descripcion', models.TextField()),
+                ('imagen', models.ImageField(blank=True, upload_to='reparaciones/')),
+                ('imagen2', models.ImageField(blank=True, null=True, upload_to='reparaciones/')),
+                ('video', models.FileField(blank=True, null=True, upload_to='reparaciones/videos/')),
+                ('estado', models.CharField(choices=[('recibida', 'Recibimos tu solicitud'), ('pendiente_presupuesto', 'Estamos presupuestando el pedido'), ('pendiente_pago', 'Estamos a espera de tu aprobación y pago de seña'), ('en_proceso', 'En proceso de reparación'), ('listo_para_entregar', 'Listo para entregar'), ('entregado', 'Recibido por el cliente'), ('finalizado', 'Recibimos el pago final')], max_length=50)),
+                ('created_at', models.DateTimeField()),
+                ('fecha_estimada_entrega', models.DateField(blank=True, null=True)),
+                ('presupuestos_count', models.PositiveIntegerField(default=0)),
+                ('finalizado_en', models.DateTimeField()),
+                ('archivado_en', models.DateTimeField(auto_now_add=True)),
+                ('historial', models.JSONField(blank=True, default=list)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='PresupuestoArchivado',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('archivo_presupuesto', models.FileField(upload_to='reparaciones/presupuestos/')),
+                ('estado', models.CharField(choices=[('pendiente', 'Pendiente'), ('enviado', 'Enviado'), ('aprobado', 'Aprobado'), ('rechazado', 'Rechazado')], max_length=20)),
+                ('monto', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('moneda', models.CharField(max_length=3)),
+                ('fecha_creacion', models.DateTimeField()),
+                ('fecha_envio', models.DateTimeField(blank=True, null=True)),
+                ('notas_internas', models.TextField(blank=True)),
+                ('cerrado', models.BooleanField(default=False)),
+                ('aprobado_en', models.DateTimeField(blank=True, null=True)),
+                ('aprobado_por', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('reparacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='presupuestos', to='reparaciones.reparacionarchivada')),
+            ],
+            options={
+                'ordering': ['-fecha_creacion', '-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='FacturaFinalArchivada',
+            fields=[
+                ('id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('monto_total', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('moneda', models.CharField(max_length=3)),
+                ('archivo_factura', models.FileField(blank=True, null=True, upload_to='reparaciones/facturas_finales/')),
+                ('link_factura', models.URLField(blank=True)),
+                ('notas_internas', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField()),
+                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+                ('reparacion', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='factura_final', to='reparaciones.reparacionarchivada')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='reparacionarchivada',
+            index=models.Index(fields=['created_at', 'id'], name='archivada_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacionarchivada',
+            index=models.Index(fields=['usuario', 'created_at', 'id'], name='archivada_usuario_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuestoarchivado',
+            index=models.Index(fields=['fecha_creacion'], name='presupuesto_arch_fecha_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturafinalarchivada',
+            index=models.Index(fields=['created_at'], name='facturafinal_arch_created_idx'),
+        ),
+    ]
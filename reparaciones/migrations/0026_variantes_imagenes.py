@@ -0,0 +1,23 @@
+# Generated by Django 6.0 on 2026-10-18 12:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0025_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reparacion',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.AddField(
+            model_name='reparacionarchivada',
+            name='variantes',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
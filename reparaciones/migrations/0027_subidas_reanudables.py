@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 12:13
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0026_variantes_imagenes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaReanudable',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('campo', models.CharField(max_length=20)),
+                ('tipo', models.CharField(max_length=100)),
+                ('tamano', models.BigIntegerField()),
+                ('tamano_parte', models.PositiveIntegerField()),
+                ('clave', models.CharField(max_length=255)),
+                ('upload_id', models.CharField(blank=True, max_length=255)),
+                ('completada', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_reanudables', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['completada', 'updated_at'], name='subida_completada_upd_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 6.0 on 2026-10-18 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0029_retencion_media'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TareaEncolada',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('tarea', models.CharField(max_length=255)),
+                ('cola', models.CharField(max_length=50)),
+                ('prioridad', models.SmallIntegerField(default=0)),
+                ('args', models.JSONField(default=list)),
+                ('kwargs', models.JSONField(default=dict)),
+                ('estado', models.CharField(choices=[('READY', 'Ready'), ('RUNNING', 'Running'), ('FAILED', 'Failed'), ('SUCCESSFUL', 'Successful')], max_length=10)),
+                ('ejecutar_desde', models.DateTimeField(blank=True, null=True)),
+                ('encolada_en', models.DateTimeField()),
+                ('iniciada_en', models.DateTimeField(blank=True, null=True)),
+                ('ultimo_intento_en', models.DateTimeField(blank=True, null=True)),
+                ('finalizada_en', models.DateTimeField(blank=True, null=True)),
+                ('worker_ids', models.JSONField(default=list)),
+                ('errores', models.JSONField(default=list)),
+                ('resultado', models.JSONField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['estado', 'cola', 'prioridad', 'encolada_en'], name='tarea_pendiente_idx'), models.Index(fields=['finalizada_en'], name='tarea_finalizada_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,98 @@
+# Generated by Django 6.0 on 2026-10-18 12:42
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+# Búsqueda por teléfono sin separadores: índice trigram sobre
+# telefono_digitos en Postgres y la columna sumada al FTS5 en SQLite.
+POSTGRES_FORWARD = [
+    "DROP INDEX IF EXISTS reparacion_telefono_trgm",
+    """
+    CREATE INDEX reparacion_telefono_digitos_trgm ON reparaciones_reparacion
+    USING gin (telefono_digitos gin_trgm_ops)
+    """,
+]
+
+POSTGRES_REVERSE = [
+    "DROP INDEX IF EXISTS reparacion_telefono_digitos_trgm",
+    """
+    CREATE INDEX reparacion_telefono_trgm ON reparaciones_reparacion
+    USING gin (telefono gin_trgm_ops)
+    """,
+]
+
+SQLITE_BORRAR_FTS = [
+    "DROP TRIGGER IF EXISTS reparaciones_reparacion_fts_au",
+    "DROP TRIGGER IF EXISTS reparaciones_reparacion_fts_ad",
+    "DROP TRIGGER IF EXISTS reparaciones_reparacion_fts_ai",
+    "DROP TABLE IF EXISTS reparaciones_reparacion_fts",
+]
+
+
+def _sqlite_fts(columnas, editables):
+    lista = ", ".join(columnas)
+    nuevos = ", ".join(f"new.{c}" for c in columnas)
+    viejos = ", ".join(f"old.{c}" for c in columnas)
+    return [
+        *SQLITE_BORRAR_FTS,
+        f"""
+        CREATE VIRTUAL TABLE reparaciones_reparacion_fts USING fts5(
+            {lista},
+            content='reparaciones_reparacion',
+            content_rowid='id',
+            tokenize='trigram'
+        )
+        """,
+        f"""
+        CREATE TRIGGER reparaciones_reparacion_fts_ai AFTER INSERT ON reparaciones_reparacion BEGIN
+            INSERT INTO reparaciones_reparacion_fts(rowid, {lista}) VALUES (new.id, {nuevos});
+        END
+        """,
+        f"""
+        CREATE TRIGGER reparaciones_reparacion_fts_ad AFTER DELETE ON reparaciones_reparacion BEGIN
+            INSERT INTO reparaciones_reparacion_fts(reparaciones_reparacion_fts, rowid, {lista})
+            VALUES ('delete', old.id, {viejos});
+        END
+        """,
+        f"""
+        CREATE TRIGGER reparaciones_reparacion_fts_au AFTER UPDATE OF {", ".join(editables)}
+        ON reparaciones_reparacion BEGIN
+            INSERT INTO reparaciones_reparacion_fts(reparaciones_reparacion_fts, rowid, {lista})
+            VALUES ('delete', old.id, {viejos});
+            INSERT INTO reparaciones_reparacion_fts(rowid, {lista}) VALUES (new.id, {nuevos});
+        END
+        """,
+        "INSERT INTO reparaciones_reparacion_fts(reparaciones_reparacion_fts) VALUES ('rebuild')",
+    ]
+
+
+EDITABLES = ("nombre_cliente", "telefono", "ubicacion", "tipo_equipo", "descripcion")
+SQLITE_FORWARD = _sqlite_fts((*EDITABLES, "telefono_digitos"), EDITABLES)
+SQLITE_REVERSE = _sqlite_fts(EDITABLES, EDITABLES)
+
+
+def _ejecutar(sentencias_por_motor):
+    def operacion(apps, schema_editor):
+        for sql in sentencias_por_motor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+
+    return operacion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0030_tareas_encoladas'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reparacion',
+            name='telefono_digitos',
+            field=models.GeneratedField(db_persist=True, expression=django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(django.db.models.functions.text.Replace(models.F('telefono'), models.Value(' '), models.Value('')), models.Value('-'), models.Value('')), models.Value('('), models.Value('')), models.Value(')'), models.Value('')), models.Value('+'), models.Value('')), models.Value('.'), models.Value('')), models.Value('/'), models.Value('')), output_field=models.CharField(max_length=20)),
+        ),
+        migrations.RunPython(
+            _ejecutar({"postgresql": POSTGRES_FORWARD, "sqlite": SQLITE_FORWARD}),
+            _ejecutar({"postgresql": POSTGRES_REVERSE, "sqlite": SQLITE_REVERSE}),
+        ),
+    ]
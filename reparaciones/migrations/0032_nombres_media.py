@@ -0,0 +1,118 @@
+# Generated by Django 6.0 on 2026-10-18 13:10
+
+import django.db.models.deletion
+import os
+import re
+from itertools import batched
+
+from django.db import migrations, models
+
+# Los nombres lógicos que ya guardan las filas (ver dedup.nombre_blob; copia
+# local para que la migración no dependa del código que cambie).
+LOGICO = re.compile(r"^(?:.*/)?(?P<digest>[0-9a-f]{32})/(?P<base>[^/]+)$")
+CAMPOS = {
+    "Reparacion": ("imagen", "imagen2", "video"),
+    "ReparacionArchivada": ("imagen", "imagen2", "video"),
+    "Presupuesto": ("archivo_presupuesto",),
+    "PresupuestoArchivado": ("archivo_presupuesto",),
+    "FacturaFinal": ("archivo_factura",),
+    "FacturaFinalArchivada": ("archivo_factura",),
+}
+
+
+def _nombres(apps):
+    for modelo, campos in CAMPOS.items():
+        con_variantes = modelo.startswith("Reparacion")
+        columnas = (*campos, "variantes") if con_variantes else campos
+        for fila in apps.get_model("reparaciones", modelo).objects.values_list(*columnas).iterator():
+            yield from (nombre for nombre in fila[: len(campos)] if nombre)
+            if con_variantes:
+                for lista in (fila[-1] or {}).values():
+                    for variante in lista:
+                        yield from (variante.get("webp"), variante.get("jpeg"))
+
+
+def registrar_nombres(apps, schema_editor):
+    BlobMedia = apps.get_model("reparaciones", "BlobMedia")
+    NombreMedia = apps.get_model("reparaciones", "NombreMedia")
+    blobs = {}
+    for nombre in _nombres(apps):
+        coincidencia = LOGICO.match(nombre or "")
+        if coincidencia:
+            digest = coincidencia["digest"]
+            extension = os.path.splitext(coincidencia["base"])[1].lower()
+            blobs[nombre] = f"blobs/{digest[:2]}/{digest}{extension}"
+    existentes = set()
+    for grupo in batched(set(blobs.values()), 500):
+        existentes.update(BlobMedia.objects.filter(nombre__in=grupo).values_list("nombre", flat=True))
+    NombreMedia.objects.bulk_create(
+        (
+            NombreMedia(nombre=nombre, blob_id=blob)
+            for nombre, blob in blobs.items()
+            if blob in existentes
+        ),
+        batch_size=500,
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reparaciones', '0031_telefono_digitos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NombreMedia',
+            fields=[
+                ('nombre', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='nombres', to='reparaciones.blobmedia')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='facturafinal',
+            index=models.Index(fields=['archivo_factura'], name='facturafinal_archivo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='facturafinalarchivada',
+            index=models.Index(fields=['archivo_factura'], name='facturafinal_arch_archivo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuesto',
+            index=models.Index(fields=['archivo_presupuesto'], name='presupuesto_archivo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='presupuestoarchivado',
+            index=models.Index(fields=['archivo_presupuesto'], name='presupuesto_arch_archivo_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacion',
+            index=models.Index(fields=['imagen'], name='reparacion_imagen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacion',
+            index=models.Index(fields=['imagen2'], name='reparacion_imagen2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacion',
+            index=models.Index(fields=['video'], name='reparacion_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacionarchivada',
+            index=models.Index(fields=['imagen'], name='archivada_imagen_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacionarchivada',
+            index=models.Index(fields=['imagen2'], name='archivada_imagen2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='reparacionarchivada',
+            index=models.Index(fields=['video'], name='archivada_video_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='subidareanudable',
+            index=models.Index(fields=['clave'], name='subida_clave_idx'),
+        ),
+        migrations.RunPython(registrar_nombres, migrations.RunPython.noop),
+    ]
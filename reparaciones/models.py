@@ -1,7 +1,13 @@
-from django.db import models
+import uuid
+
+from django.db import models, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Replace
 from django.contrib.auth.models import User
 from django.core.validators import FileExtensionValidator
 from django.core.exceptions import ValidationError, ObjectDoesNotExist
+from django.tasks import TaskResultStatus
+from django.utils import timezone
 
 
 ESTADOS = [
@@ -41,6 +47,17 @@ def validar_tamano_factura(archivo):
         raise ValidationError("El archivo supera el tamaño máximo permitido.")
 
 
+# Lo que la gente escribe entre los dígitos de un teléfono.
+SEPARADORES_TELEFONO = " -()+./"
+
+
+def solo_digitos(campo):
+    expresion = F(campo)
+    for separador in SEPARADORES_TELEFONO:
+        expresion = Replace(expresion, Value(separador), Value(""))
+    return expresion
+
+
 class Reparacion(models.Model):
     # -----------------------------
     # Datos del cliente
@@ -48,6 +65,13 @@ class Reparacion(models.Model):
     usuario = models.ForeignKey(User, on_delete=models.CASCADE)
     nombre_cliente = models.CharField(max_length=100)
     telefono = models.CharField(max_length=20)
+    # El teléfono sin separadores, para buscar "45678901" en "11 4567-8901".
+    # Lo calcula la base; está en el índice de búsqueda (ver reparaciones.busqueda).
+    telefono_digitos = models.GeneratedField(
+        expression=solo_digitos("telefono"),
+        output_field=models.CharField(max_length=20),
+        db_persist=True,
+    )
     ubicacion = models.CharField(max_length=200, blank=True)
     tipo_equipo = models.CharField(max_length=50)
     descripcion = models.TextField()
@@ -63,6 +87,11 @@ class Reparacion(models.Model):
         null=True,
         validators=[FileExtensionValidator(["mov", "mp4", "webm"])],
     )
+    # Versiones reducidas de imagen/imagen2 (ver reparaciones.imagenes).
+    variantes = models.JSONField(default=dict, blank=True, editable=False)
+    # Media que quitó o achicó la política de retención, con la fecha
+    # (ver reparaciones.retencion): {"video": "...", "imagen": "..."}.
+    retencion_media = models.JSONField(default=dict, blank=True, editable=False)
 
     # -----------------------------
     # Estado del proceso
@@ -74,12 +103,50 @@ class Reparacion(models.Model):
     )
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # También lo tocan los cambios de sus presupuestos y de la factura final
+    # (tocar_reparaciones), así alcanza con esta columna para validar caches.
+    updated_at = models.DateTimeField(auto_now=True)
 
     fecha_estimada_entrega = models.DateField(
         blank=True,
         null=True,
     )
 
+    # -----------------------------
+    # Resumen de presupuestos (desnormalizado)
+    # -----------------------------
+    # Lo mantiene actualizar_resumen_presupuestos() en la misma transacción
+    # que cada alta/baja de Presupuesto.
+    ultimo_presupuesto = models.ForeignKey(
+        "Presupuesto",
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        editable=False,
+        related_name="+",
+    )
+    presupuestos_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # Listados paginados por cursor: inicio, staff y admin.
+            models.Index(fields=["created_at", "id"], name="reparacion_created_idx"),
+            models.Index(
+                fields=["estado", "created_at", "id"], name="reparacion_estado_created_idx"
+            ),
+            models.Index(
+                fields=["usuario", "created_at", "id"], name="reparacion_usuario_created_idx"
+            ),
+            # Filtro lateral del admin.
+            models.Index(fields=["tipo_equipo"], name="reparacion_tipo_equipo_idx"),
+            # Validador de los listados de staff (max(updated_at) por estado).
+            models.Index(fields=["estado", "updated_at"], name="reparacion_estado_upd_idx"),
+            # Archivos por nombre exacto: huérfanos y media servida (ver huerfanos.referenciados).
+            models.Index(fields=["imagen"], name="reparacion_imagen_idx"),
+            models.Index(fields=["imagen2"], name="reparacion_imagen2_idx"),
+            models.Index(fields=["video"], name="reparacion_video_idx"),
+        ]
+
     # -------------------
     @property
     def factura_final_safe(self):
@@ -129,6 +196,7 @@ class Presupuesto(models.Model):
         default="ARS",
     )
     fecha_creacion = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
     fecha_envio = models.DateTimeField(blank=True, null=True)
     notas_internas = models.TextField(blank=True)
     cerrado = models.BooleanField(default=False)
@@ -143,10 +211,91 @@ class Presupuesto(models.Model):
 
     class Meta:
         ordering = ["-fecha_creacion"]
+        indexes = [
+            models.Index(
+                fields=["reparacion", "fecha_creacion"], name="presupuesto_rep_fecha_idx"
+            ),
+            models.Index(fields=["fecha_creacion"], name="presupuesto_fecha_idx"),
+            models.Index(fields=["archivo_presupuesto"], name="presupuesto_archivo_idx"),
+        ]
 
     def __str__(self):
         return f"Presupuesto #{self.pk} - Reparación #{self.reparacion_id}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._reparacion_id_original = instance.__dict__.get("reparacion_id")
+        return instance
+
+    def save(self, *args, **kwargs):
+        from .resumenes import claves_de_presupuestos, recalcular_resumenes
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None:
+            # auto_now solo se guarda si está en update_fields.
+            update_fields = kwargs["update_fields"] = {*update_fields, "updated_at"}
+        es_alta = self._state.adding
+        reparacion_original = getattr(self, "_reparacion_id_original", None)
+        with transaction.atomic(using=kwargs.get("using")):
+            claves = set()
+            if not es_alta:
+                claves = claves_de_presupuestos(Presupuesto.objects.filter(pk=self.pk))
+            super().save(*args, **kwargs)
+            if es_alta or update_fields is None or "reparacion" in update_fields:
+                actualizar_resumen_presupuestos(
+                    {self.reparacion_id, reparacion_original} - {None}
+                )
+            else:
+                tocar_reparaciones([self.reparacion_id])
+            claves |= claves_de_presupuestos(Presupuesto.objects.filter(pk=self.pk))
+            recalcular_resumenes(claves)
+        self._reparacion_id_original = self.reparacion_id
+
+    def delete(self, *args, **kwargs):
+        from .resumenes import claves_de_presupuestos, recalcular_resumenes
+
+        with transaction.atomic(using=kwargs.get("using")):
+            claves = claves_de_presupuestos(Presupuesto.objects.filter(pk=self.pk))
+            resultado = super().delete(*args, **kwargs)
+            actualizar_resumen_presupuestos([self.reparacion_id])
+            recalcular_resumenes(claves)
+        return resultado
+
+
+def actualizar_resumen_presupuestos(reparacion_ids):
+    """
+    Recalcula ultimo_presupuesto y presupuestos_count de las reparaciones dadas
+    con un único UPDATE. Llamarla dentro de la transacción que escribió los
+    presupuestos para que el resumen nunca quede desfasado.
+    """
+    reparacion_ids = list(reparacion_ids)
+    if not reparacion_ids:
+        return 0
+    presupuestos = Presupuesto.objects.filter(reparacion=OuterRef("pk"))
+    return Reparacion.objects.filter(pk__in=reparacion_ids).update(
+        updated_at=timezone.now(),
+        ultimo_presupuesto=Subquery(
+            presupuestos.order_by("-fecha_creacion", "-pk").values("pk")[:1]
+        ),
+        presupuestos_count=Coalesce(
+            Subquery(
+                presupuestos.order_by()
+                .values("reparacion")
+                .annotate(total=Count("pk"))
+                .values("total")
+            ),
+            0,
+        ),
+    )
+
+
+def tocar_reparaciones(reparacion_ids):
+    """Marca como modificadas las reparaciones cuyo contenido cambió por otro camino."""
+    return Reparacion.objects.filter(pk__in=list(reparacion_ids)).update(
+        updated_at=timezone.now()
+    )
+
 
 class FacturaFinal(models.Model):
     MONEDA_CHOICES = [
@@ -187,6 +336,330 @@ class FacturaFinal(models.Model):
     link_factura = models.URLField(blank=True)
     notas_internas = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="facturafinal_created_idx"),
+            models.Index(fields=["archivo_factura"], name="facturafinal_archivo_idx"),
+        ]
 
     def __str__(self):
         return f"Factura final #{self.pk} - Reparación #{self.reparacion_id}"
+
+    def save(self, *args, **kwargs):
+        from .resumenes import claves_de_facturas, recalcular_resumenes
+
+        with transaction.atomic(using=kwargs.get("using")):
+            claves = set()
+            if not self._state.adding:
+                claves = claves_de_facturas(FacturaFinal.objects.filter(pk=self.pk))
+            super().save(*args, **kwargs)
+            tocar_reparaciones([self.reparacion_id])
+            claves |= claves_de_facturas(FacturaFinal.objects.filter(pk=self.pk))
+            recalcular_resumenes(claves)
+
+    def delete(self, *args, **kwargs):
+        from .resumenes import claves_de_facturas, recalcular_resumenes
+
+        with transaction.atomic(using=kwargs.get("using")):
+            claves = claves_de_facturas(FacturaFinal.objects.filter(pk=self.pk))
+            resultado = super().delete(*args, **kwargs)
+            tocar_reparaciones([self.reparacion_id])
+            recalcular_resumenes(claves)
+        return resultado
+
+
+class ResumenMensual(models.Model):
+    """
+    Totales por mes, moneda, tipo de equipo y ubicación. Lo mantienen
+    reparaciones.resumenes en cada alta/cambio/baja de presupuestos y facturas;
+    la página de estadísticas lee solo de acá.
+    """
+
+    mes = models.DateField()
+    moneda = models.CharField(max_length=3)
+    tipo_equipo = models.CharField(max_length=50)
+    ubicacion = models.CharField(max_length=200, blank=True)
+
+    facturas_cantidad = models.PositiveIntegerField(default=0)
+    facturas_monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    presupuestos_cantidad = models.PositiveIntegerField(default=0)
+    presupuestos_monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    aprobados_cantidad = models.PositiveIntegerField(default=0)
+    aprobados_monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    actualizado_en = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["-mes", "moneda", "tipo_equipo", "ubicacion"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["mes", "moneda", "tipo_equipo", "ubicacion"],
+                name="resumen_mensual_unico",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.mes:%Y-%m} · {self.moneda} · {self.tipo_equipo} · {self.ubicacion or '—'}"
+
+
+class TransicionEstado(models.Model):
+    """
+    Historial append-only de cambios de estado de una reparación. Se escribe
+    solo a través de reparaciones.transiciones.cambiar_estado().
+    """
+
+    reparacion = models.ForeignKey(
+        Reparacion,
+        on_delete=models.CASCADE,
+        related_name="transiciones",
+    )
+    estado_anterior = models.CharField(max_length=50, choices=ESTADOS, blank=True)
+    estado_nuevo = models.CharField(max_length=50, choices=ESTADOS)
+    fecha = models.DateTimeField(default=timezone.now)
+    usuario = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        blank=True,
+        null=True,
+        related_name="+",
+    )
+    origen = models.CharField(max_length=50, blank=True)
+
+    class Meta:
+        ordering = ["fecha", "id"]
+        indexes = [
+            models.Index(fields=["reparacion", "fecha", "id"], name="transicion_rep_fecha_idx"),
+            models.Index(fields=["fecha"], name="transicion_fecha_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reparación #{self.reparacion_id}: {self.estado_anterior or '—'} → {self.estado_nuevo}"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Las transiciones de estado no se modifican.")
+        super().save(*args, **kwargs)
+
+
+# -----------------------------
+# Archivo (reparaciones finalizadas hace tiempo)
+# -----------------------------
+# Copias de Reparacion/Presupuesto/FacturaFinal que conservan el id original,
+# así los links de descarga siguen funcionando. Las mueve
+# reparaciones.archivo.archivar_reparaciones(); son de solo lectura.
+class ReparacionArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    nombre_cliente = models.CharField(max_length=100)
+    telefono = models.CharField(max_length=20)
+    ubicacion = models.CharField(max_length=200, blank=True)
+    tipo_equipo = models.CharField(max_length=50)
+    descripcion = models.TextField()
+    imagen = models.ImageField(upload_to="reparaciones/", blank=True)
+    imagen2 = models.ImageField(upload_to="reparaciones/", blank=True, null=True)
+    video = models.FileField(upload_to="reparaciones/videos/", blank=True, null=True)
+    variantes = models.JSONField(default=dict, blank=True)
+    retencion_media = models.JSONField(default=dict, blank=True)
+    estado = models.CharField(max_length=50, choices=ESTADOS)
+    created_at = models.DateTimeField()
+    fecha_estimada_entrega = models.DateField(blank=True, null=True)
+    presupuestos_count = models.PositiveIntegerField(default=0)
+    finalizado_en = models.DateTimeField()
+    archivado_en = models.DateTimeField(auto_now_add=True)
+    # Transiciones de estado de la reparación, en el formato de TransicionEstado.
+    historial = models.JSONField(default=list, blank=True)
+
+    archivada = True
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="archivada_created_idx"),
+            models.Index(
+                fields=["usuario", "created_at", "id"], name="archivada_usuario_created_idx"
+            ),
+            models.Index(fields=["imagen"], name="archivada_imagen_idx"),
+            models.Index(fields=["imagen2"], name="archivada_imagen2_idx"),
+            models.Index(fields=["video"], name="archivada_video_idx"),
+        ]
+
+    def __str__(self):
+        return f"Reparación archivada #{self.pk}"
+
+    @property
+    def ultimo_presupuesto(self):
+        presupuestos = list(self.presupuestos.all())
+        return presupuestos[0] if presupuestos else None
+
+    @property
+    def factura_final_safe(self):
+        try:
+            return self.factura_final
+        except ObjectDoesNotExist:
+            return None
+
+
+class PresupuestoArchivado(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    reparacion = models.ForeignKey(
+        ReparacionArchivada,
+        on_delete=models.CASCADE,
+        related_name="presupuestos",
+    )
+    archivo_presupuesto = models.FileField(upload_to="reparaciones/presupuestos/")
+    estado = models.CharField(max_length=20, choices=ESTADOS_PRESUPUESTO)
+    monto = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    moneda = models.CharField(max_length=3)
+    fecha_creacion = models.DateTimeField()
+    fecha_envio = models.DateTimeField(blank=True, null=True)
+    notas_internas = models.TextField(blank=True)
+    cerrado = models.BooleanField(default=False)
+    aprobado_en = models.DateTimeField(null=True, blank=True)
+    aprobado_por = models.ForeignKey(
+        User, null=True, blank=True, on_delete=models.SET_NULL, related_name="+"
+    )
+
+    class Meta:
+        ordering = ["-fecha_creacion", "-id"]
+        indexes = [
+            models.Index(fields=["fecha_creacion"], name="presupuesto_arch_fecha_idx"),
+            models.Index(fields=["archivo_presupuesto"], name="presupuesto_arch_archivo_idx"),
+        ]
+
+    def __str__(self):
+        return f"Presupuesto archivado #{self.pk} - Reparación #{self.reparacion_id}"
+
+
+class FacturaFinalArchivada(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    usuario = models.ForeignKey(
+        User, on_delete=models.SET_NULL, blank=True, null=True, related_name="+"
+    )
+    reparacion = models.OneToOneField(
+        ReparacionArchivada,
+        on_delete=models.CASCADE,
+        related_name="factura_final",
+    )
+    monto_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
+    moneda = models.CharField(max_length=3)
+    archivo_factura = models.FileField(
+        upload_to="reparaciones/facturas_finales/", blank=True, null=True
+    )
+    link_factura = models.URLField(blank=True)
+    notas_internas = models.TextField(blank=True)
+    created_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at"], name="facturafinal_arch_created_idx"),
+            models.Index(fields=["archivo_factura"], name="facturafinal_arch_archivo_idx"),
+        ]
+
+    def __str__(self):
+        return f"Factura final archivada #{self.pk} - Reparación #{self.reparacion_id}"
+
+
+# -----------------------------
+# Subidas reanudables (videos grandes)
+# -----------------------------
+# Progreso de una subida en partes (ver reparaciones.subidas). En R2/S3 es un
+# multipart upload y las partes recibidas se consultan al bucket; en
+# filesystem cada parte es un archivo aparte hasta completar.
+class SubidaReanudable(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    usuario = models.ForeignKey(
+        User, on_delete=models.CASCADE, related_name="subidas_reanudables"
+    )
+    campo = models.CharField(max_length=20)
+    tipo = models.CharField(max_length=100)
+    tamano = models.BigIntegerField()
+    tamano_parte = models.PositiveIntegerField()
+    clave = models.CharField(max_length=255)
+    upload_id = models.CharField(max_length=255, blank=True)
+    completada = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["completada", "updated_at"], name="subida_completada_upd_idx"),
+            models.Index(fields=["clave"], name="subida_clave_idx"),
+        ]
+
+    def __str__(self):
+        return f"Subida {self.pk} ({self.clave})"
+
+    @property
+    def cantidad_partes(self):
+        return -(-self.tamano // self.tamano_parte)
+
+    def tamano_de_parte(self, numero):
+        if numero < self.cantidad_partes:
+            return self.tamano_parte
+        return self.tamano - self.tamano_parte * (self.cantidad_partes - 1)
+
+
+# -----------------------------
+# Media deduplicada
+# -----------------------------
+# Un blob por contenido en el storage real (ver reparaciones.dedup), con la
+# cantidad de archivos lógicos que lo usan.
+class BlobMedia(models.Model):
+    nombre = models.CharField(max_length=100, primary_key=True)
+    tamano = models.BigIntegerField()
+    referencias = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.nombre} ({self.referencias} refs)"
+
+
+# Cada nombre lógico que se guardó y el blob al que apunta: el recolector de
+# huérfanos pasa de blob a nombres por índice y no buscando el digest dentro
+# de los campos.
+class NombreMedia(models.Model):
+    nombre = models.CharField(max_length=255, primary_key=True)
+    blob = models.ForeignKey(BlobMedia, on_delete=models.CASCADE, related_name="nombres")
+
+    def __str__(self):
+        return f"{self.nombre} -> {self.blob_id}"
+
+
+# -----------------------------
+# Cola de tareas (django.tasks)
+# -----------------------------
+# Una fila por TaskResult del backend reparaciones.cola.BaseDeDatosBackend;
+# la toma el worker de procesar_tareas.
+class TareaEncolada(models.Model):
+    id = models.CharField(max_length=32, primary_key=True)
+    tarea = models.CharField(max_length=255)
+    cola = models.CharField(max_length=50)
+    prioridad = models.SmallIntegerField(default=0)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    estado = models.CharField(max_length=10, choices=TaskResultStatus.choices)
+    ejecutar_desde = models.DateTimeField(null=True, blank=True)
+    encolada_en = models.DateTimeField()
+    iniciada_en = models.DateTimeField(null=True, blank=True)
+    ultimo_intento_en = models.DateTimeField(null=True, blank=True)
+    finalizada_en = models.DateTimeField(null=True, blank=True)
+    worker_ids = models.JSONField(default=list)
+    errores = models.JSONField(default=list)
+    resultado = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # Lo que consulta el worker para tomar la próxima.
+            models.Index(
+                fields=["estado", "cola", "prioridad", "encolada_en"],
+                name="tarea_pendiente_idx",
+            ),
+            models.Index(fields=["finalizada_en"], name="tarea_finalizada_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.tarea} ({self.estado})"
@@ -0,0 +1,110 @@
+import base64
+import binascii
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+
+# -----------------------------
+# Cursor (created_at, id)
+# -----------------------------
+def codificar_cursor(reparacion):
+    raw = f"{reparacion.created_at.isoformat()}|{reparacion.pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decodificar_cursor(valor):
+    if not valor:
+        return None
+    try:
+        padding = "=" * (-len(valor) % 4)
+        raw = base64.urlsafe_b64decode(valor + padding).decode()
+        fecha, pk = raw.split("|", 1)
+        created_at = parse_datetime(fecha)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if created_at is None:
+        return None
+    return created_at, pk
+
+
+def _tamano_pagina(request):
+    por_defecto = getattr(settings, "REPARACIONES_POR_PAGINA", 25)
+    maximo = getattr(settings, "REPARACIONES_POR_PAGINA_MAX", 100)
+    try:
+        tamano = int(request.GET.get("por_pagina", por_defecto))
+    except (TypeError, ValueError):
+        tamano = por_defecto
+    return max(1, min(tamano, maximo))
+
+
+class PaginaCursor:
+    """Una página de reparaciones ordenadas por (-created_at, -id)."""
+
+    def __init__(self, request, items, has_next, has_previous, tamano):
+        self.items = items
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.tamano = tamano
+        self._request = request
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def _url(self, parametro, reparacion):
+        params = self._request.GET.copy()
+        params.pop("despues", None)
+        params.pop("antes", None)
+        params[parametro] = codificar_cursor(reparacion)
+        return f"?{params.urlencode()}"
+
+    @property
+    def url_siguiente(self):
+        if not (self.has_next and self.items):
+            return ""
+        return self._url("despues", self.items[-1])
+
+    @property
+    def url_anterior(self):
+        if not (self.has_previous and self.items):
+            return ""
+        return self._url("antes", self.items[0])
+
+
+def paginar_reparaciones(request, queryset):
+    """
+    Pagina un queryset de Reparacion por cursor sobre (created_at, id).
+
+    `?despues=<cursor>` avanza hacia registros más viejos y `?antes=<cursor>`
+    retrocede hacia los más nuevos. El costo de cada página no depende de
+    cuántas filas haya antes, a diferencia de OFFSET.
+    """
+    tamano = _tamano_pagina(request)
+    despues = decodificar_cursor(request.GET.get("despues"))
+    antes = decodificar_cursor(request.GET.get("antes"))
+
+    if antes and not despues:
+        created_at, pk = antes
+        filas = list(
+            queryset.filter(
+                Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk)
+            ).order_by("created_at", "id")[: tamano + 1]
+        )
+        has_previous = len(filas) > tamano
+        items = filas[:tamano][::-1]
+        return PaginaCursor(request, items, True, has_previous, tamano)
+
+    queryset = queryset.order_by("-created_at", "-id")
+    if despues:
+        created_at, pk = despues
+        queryset = queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+        )
+    filas = list(queryset[: tamano + 1])
+    has_next = len(filas) > tamano
+    return PaginaCursor(request, filas[:tamano], has_next, bool(despues), tamano)
@@ -0,0 +1,38 @@
+import os
+
+from django.db import connections
+
+# Las estadísticas son del pool de este proceso: con gunicorn cada worker
+# tiene el suyo, así que el endpoint muestra el worker que atendió el request.
+
+
+def estadisticas_pool():
+    """Estado del pool de cada base configurada con OPTIONS["pool"]."""
+    filas = []
+    for alias in connections:
+        pool = getattr(connections[alias], "pool", None)
+        if pool is None:
+            continue
+        # Django abre el pool con la primera conexión; antes de eso pool_size
+        # informa min_size aunque no haya nada abierto.
+        stats = {} if pool.closed else pool.get_stats()
+        encolados = stats.get("requests_queued", 0)
+        filas.append(
+            {
+                "alias": alias,
+                "pid": os.getpid(),
+                "abierto": not pool.closed,
+                "minimo": pool.min_size,
+                "maximo": pool.max_size,
+                "abiertas": stats.get("pool_size", 0),
+                "en_uso": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+                "esperando": stats.get("requests_waiting", 0),
+                "pedidos": stats.get("requests_num", 0),
+                "encolados": encolados,
+                "espera_promedio_ms": (
+                    stats.get("requests_wait_ms", 0) / encolados if encolados else 0
+                ),
+                "errores": stats.get("requests_errors", 0),
+            }
+        )
+    return filas
@@ -0,0 +1,144 @@
+import os
+import re
+import uuid
+
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+# Respuestas con Range (RFC 9110) para archivos en disco: el reproductor de
+# video pide tramos al adelantar y el visor de PDF pide páginas sueltas.
+
+_RANGO = re.compile(r"^\s*(\d*)\s*-\s*(\d*)\s*$")
+# Más tramos que esto en un pedido no es un navegador: se responde completo.
+MAX_RANGOS = 16
+BLOQUE = 64 * 1024
+
+
+def parsear_rangos(cabecera, tamano):
+    """
+    Tramos (inicio, fin) inclusivos de una cabecera Range. None si la
+    cabecera no se entiende (se ignora y va el archivo completo); lista
+    vacía si ningún tramo cae dentro del archivo (416).
+    """
+    if not cabecera.startswith("bytes="):
+        return None
+    rangos = []
+    for parte in cabecera[len("bytes="):].split(","):
+        coincidencia = _RANGO.match(parte)
+        if not coincidencia or coincidencia.group(1, 2) == ("", ""):
+            return None
+        desde, hasta = coincidencia.groups()
+        if not desde:
+            # "-500": los últimos 500 bytes.
+            if int(hasta) == 0:
+                continue
+            rangos.append((max(0, tamano - int(hasta)), tamano - 1))
+            continue
+        inicio = int(desde)
+        if hasta and int(hasta) < inicio:
+            return None
+        if inicio < tamano:
+            fin = min(int(hasta), tamano - 1) if hasta else tamano - 1
+            rangos.append((inicio, fin))
+    if len(rangos) > MAX_RANGOS:
+        return None
+    return rangos
+
+
+class _Tramo:
+    """
+    `largo` bytes desde la posición actual de `archivo`. Expone fileno() para
+    que el servidor WSGI use os.sendfile: gunicorn lo hace con
+    wsgi.file_wrapper, desde la posición del descriptor y hasta Content-Length.
+    """
+
+    def __init__(self, archivo, largo):
+        self.archivo = archivo
+        self.restante = largo
+
+    def read(self, cantidad=-1):
+        if cantidad < 0 or cantidad > self.restante:
+            cantidad = self.restante
+        datos = self.archivo.read(cantidad)
+        self.restante -= len(datos)
+        return datos
+
+    def fileno(self):
+        return self.archivo.fileno()
+
+    def close(self):
+        self.archivo.close()
+
+
+def _multiparte(ruta, partes, cierre):
+    with open(ruta, "rb") as archivo:
+        for encabezado, inicio, fin in partes:
+            yield encabezado
+            archivo.seek(inicio)
+            restante = fin - inicio + 1
+            while restante:
+                datos = archivo.read(min(BLOQUE, restante))
+                if not datos:
+                    return
+                restante -= len(datos)
+                yield datos
+        yield cierre
+
+
+def _if_range_vale(request, modificado):
+    # Si el archivo cambió desde lo que tiene el navegador, va completo.
+    condicion = request.headers.get("If-Range")
+    return condicion is None or condicion == modificado
+
+
+def respuesta_con_rangos(request, ruta, tipo, disposicion=None):
+    """Sirve el archivo `ruta` completo (200), en un tramo o en varios (206)."""
+    estado = os.stat(ruta)
+    tamano = estado.st_size
+    modificado = http_date(estado.st_mtime)
+
+    rangos = None
+    cabecera = request.headers.get("Range")
+    if cabecera and request.method in ("GET", "HEAD") and _if_range_vale(request, modificado):
+        rangos = parsear_rangos(cabecera, tamano)
+
+    if rangos == []:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{tamano}"
+    elif not rangos:
+        response = FileResponse(open(ruta, "rb"), content_type=tipo)
+    elif len(rangos) == 1:
+        ((inicio, fin),) = rangos
+        archivo = open(ruta, "rb")
+        archivo.seek(inicio)
+        response = FileResponse(_Tramo(archivo, fin - inicio + 1), status=206, content_type=tipo)
+        response["Content-Length"] = fin - inicio + 1
+        response["Content-Range"] = f"bytes {inicio}-{fin}/{tamano}"
+    else:
+        limite = uuid.uuid4().hex
+        partes = [
+            (
+                (
+                    f"\r\n--{limite}\r\nContent-Type: {tipo}\r\n"
+                    f"Content-Range: bytes {inicio}-{fin}/{tamano}\r\n\r\n"
+                ).encode(),
+                inicio,
+                fin,
+            )
+            for inicio, fin in rangos
+        ]
+        cierre = f"\r\n--{limite}--\r\n".encode()
+        response = StreamingHttpResponse(
+            _multiparte(ruta, partes, cierre),
+            status=206,
+            content_type=f"multipart/byteranges; boundary={limite}",
+        )
+        response["Content-Length"] = len(cierre) + sum(
+            len(encabezado) + fin - inicio + 1 for encabezado, inicio, fin in partes
+        )
+
+    response["Accept-Ranges"] = "bytes"
+    response["Last-Modified"] = modificado
+    if disposicion and response.status_code != 416:
+        response["Content-Disposition"] = disposicion
+    return response
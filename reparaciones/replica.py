@@ -0,0 +1,100 @@
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# Lecturas a la réplica solo donde se pidió explícitamente (listados de staff,
+# changelists del admin, exportaciones); todo lo demás va al primario.
+# Después de un POST la sesión queda "pegada" al primario REPLICA_PEGADO_SEGUNDOS
+# para que el usuario vea lo que acaba de escribir aunque la réplica venga atrasada.
+
+_en_replica = ContextVar("en_replica", default=False)
+
+CLAVE_SESION = "ultima_escritura"
+
+
+def _alias_replica():
+    return getattr(settings, "REPLICA_DB", None)
+
+
+@contextmanager
+def leer_de_replica():
+    token = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(token)
+
+
+def pegado_al_primario(request):
+    session = getattr(request, "session", None)
+    if session is None:
+        return False
+    ultima = session.get(CLAVE_SESION)
+    return ultima is not None and time.time() - ultima < settings.REPLICA_PEGADO_SEGUNDOS
+
+
+def _puede_usar_replica(request):
+    return (
+        _alias_replica() is not None
+        and request.method in ("GET", "HEAD")
+        and not pegado_al_primario(request)
+    )
+
+
+def lectura_en_replica(view_func):
+    """Hace las lecturas de la vista (y de su render) contra la réplica."""
+
+    @wraps(view_func)
+    def _wrapped(request, *args, **kwargs):
+        if not _puede_usar_replica(request):
+            return view_func(request, *args, **kwargs)
+        with leer_de_replica():
+            response = view_func(request, *args, **kwargs)
+            # Las TemplateResponse (admin) consultan al renderizar.
+            if hasattr(response, "render") and not response.is_rendered:
+                response.render()
+        return response
+
+    return _wrapped
+
+
+class RouterReplica:
+    def db_for_read(self, model, **hints):
+        alias = _alias_replica()
+        if alias is None or not _en_replica.get():
+            return None
+        # Dentro de una transacción se lee lo que la transacción ve.
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # La réplica tiene los mismos datos: los objetos se pueden relacionar.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+class PegarAlPrimarioMiddleware:
+    """Marca en la sesión el momento de cada request que escribe."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if (
+            _alias_replica() is not None
+            and request.method not in ("GET", "HEAD", "OPTIONS", "TRACE")
+            and hasattr(request, "session")
+        ):
+            request.session[CLAVE_SESION] = time.time()
+        return response
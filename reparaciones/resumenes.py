@@ -0,0 +1,153 @@
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Count, DateField, F, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import (
+    FacturaFinal,
+    FacturaFinalArchivada,
+    Presupuesto,
+    PresupuestoArchivado,
+    ResumenMensual,
+)
+
+# Una "clave" es una celda del resumen: (mes, moneda, tipo_equipo, ubicacion).
+# Cada escritura recalcula solo las celdas que tocó, a partir de las filas de
+# ese mes, así el resumen no acumula errores aunque se edite un monto.
+
+AGREGADOS_FACTURAS = {
+    "facturas_cantidad": Count("pk"),
+    "facturas_monto": Sum("monto_total"),
+}
+
+AGREGADOS_PRESUPUESTOS = {
+    "presupuestos_cantidad": Count("pk"),
+    "presupuestos_monto": Sum("monto"),
+    "aprobados_cantidad": Count("pk", filter=Q(estado="aprobado")),
+    "aprobados_monto": Sum("monto", filter=Q(estado="aprobado")),
+}
+
+# Las tablas de archivo también cuentan: archivar una reparación no cambia
+# la historia del mes.
+FUENTES = (
+    (FacturaFinal, "created_at", AGREGADOS_FACTURAS),
+    (Presupuesto, "fecha_creacion", AGREGADOS_PRESUPUESTOS),
+    (FacturaFinalArchivada, "created_at", AGREGADOS_FACTURAS),
+    (PresupuestoArchivado, "fecha_creacion", AGREGADOS_PRESUPUESTOS),
+)
+
+
+def _mes(fecha):
+    return timezone.localtime(fecha).date().replace(day=1)
+
+
+def _rango_mes(mes):
+    tz = timezone.get_current_timezone()
+    inicio = datetime(mes.year, mes.month, 1, tzinfo=tz)
+    if mes.month == 12:
+        fin = datetime(mes.year + 1, 1, 1, tzinfo=tz)
+    else:
+        fin = datetime(mes.year, mes.month + 1, 1, tzinfo=tz)
+    return inicio, fin
+
+
+def claves_de_presupuestos(queryset):
+    return {
+        (_mes(fecha), moneda, tipo_equipo, ubicacion)
+        for fecha, moneda, tipo_equipo, ubicacion in queryset.order_by().values_list(
+            "fecha_creacion", "moneda", "reparacion__tipo_equipo", "reparacion__ubicacion"
+        )
+    }
+
+
+def claves_de_facturas(queryset):
+    return {
+        (_mes(fecha), moneda, tipo_equipo, ubicacion)
+        for fecha, moneda, tipo_equipo, ubicacion in queryset.order_by().values_list(
+            "created_at", "moneda", "reparacion__tipo_equipo", "reparacion__ubicacion"
+        )
+    }
+
+
+def claves_de_reparaciones(reparacion_ids):
+    reparacion_ids = list(reparacion_ids)
+    return claves_de_presupuestos(
+        Presupuesto.objects.filter(reparacion__in=reparacion_ids)
+    ) | claves_de_facturas(FacturaFinal.objects.filter(reparacion__in=reparacion_ids))
+
+
+def recalcular_resumenes(claves):
+    # Orden fijo para que dos escrituras concurrentes bloqueen en el mismo orden.
+    for clave in sorted(claves):
+        _recalcular(clave)
+
+
+def _recalcular(clave):
+    mes, moneda, tipo_equipo, ubicacion = clave
+    inicio, fin = _rango_mes(mes)
+    filtro = {
+        "moneda": moneda,
+        "reparacion__tipo_equipo": tipo_equipo,
+        "reparacion__ubicacion": ubicacion,
+    }
+    with transaction.atomic():
+        resumen, _ = ResumenMensual.objects.get_or_create(
+            mes=mes, moneda=moneda, tipo_equipo=tipo_equipo, ubicacion=ubicacion
+        )
+        # El lock serializa a quienes recalculan la misma celda: el segundo
+        # agrega después de que el primero confirmó.
+        resumen = ResumenMensual.objects.select_for_update().get(pk=resumen.pk)
+        valores = dict.fromkeys([*AGREGADOS_FACTURAS, *AGREGADOS_PRESUPUESTOS], 0)
+        for modelo, campo_fecha, agregados in FUENTES:
+            fila = modelo.objects.filter(
+                **{f"{campo_fecha}__gte": inicio, f"{campo_fecha}__lt": fin},
+                **filtro,
+            ).aggregate(**agregados)
+            for campo, valor in fila.items():
+                valores[campo] += valor or 0
+        if not any(valores.values()):
+            resumen.delete()
+            return
+        for campo, valor in valores.items():
+            setattr(resumen, campo, valor)
+        resumen.save()
+
+
+def reconstruir_resumenes():
+    """Recalcula todo el resumen desde cero. Devuelve la cantidad de celdas."""
+    celdas = {}
+    for modelo, campo_fecha, agregados in FUENTES:
+        filas = (
+            modelo.objects.order_by()
+            .values(
+                "moneda",
+                mes=TruncMonth(campo_fecha, output_field=DateField()),
+                tipo=F("reparacion__tipo_equipo"),
+                lugar=F("reparacion__ubicacion"),
+            )
+            .annotate(**agregados)
+        )
+        for fila in filas.iterator():
+            clave = (fila["mes"], fila["moneda"], fila["tipo"], fila["lugar"])
+            valores = celdas.setdefault(clave, {})
+            for campo in agregados:
+                valores[campo] = valores.get(campo, 0) + (fila[campo] or 0)
+
+    with transaction.atomic():
+        ResumenMensual.objects.all().delete()
+        ResumenMensual.objects.bulk_create(
+            (
+                ResumenMensual(
+                    mes=mes,
+                    moneda=moneda,
+                    tipo_equipo=tipo_equipo,
+                    ubicacion=ubicacion,
+                    **valores,
+                )
+                for (mes, moneda, tipo_equipo, ubicacion), valores in celdas.items()
+            ),
+            batch_size=1000,
+        )
+    return len(celdas)
@@ -0,0 +1,190 @@
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .imagenes import ANCHOS, CAMPOS_IMAGEN, FORMATOS, variantes_de_archivo
+from .models import Reparacion, ReparacionArchivada, TransicionEstado
+
+logger = logging.getLogger(__name__)
+
+# Política de retención de media para reparaciones ya entregadas: cada regla
+# de settings.MEDIA_RETENCION es {"accion": ..., "dias": N} y se aplica a las
+# reparaciones entregadas o finalizadas hace más de N días. Lo que se quita
+# queda anotado en `retencion_media` para que tarjetas y admin muestren
+# "eliminado" en vez de "sin video". Los archivos se borran del storage
+# recién cuando la fila se guardó.
+
+ESTADOS_ENTREGADA = ("entregado", "finalizado")
+
+
+def reparaciones_entregadas(modelo, antes_de):
+    """
+    Reparaciones (activas o archivadas) entregadas antes de `antes_de`. La
+    fecha sale de la última transición a entregado/finalizado, como en
+    archivo.reparaciones_a_archivar.
+    """
+    if modelo is ReparacionArchivada:
+        return ReparacionArchivada.objects.filter(finalizado_en__lt=antes_de)
+    ultima_entrega = (
+        TransicionEstado.objects.filter(
+            reparacion=OuterRef("pk"), estado_nuevo__in=ESTADOS_ENTREGADA
+        )
+        .order_by("-fecha", "-id")
+        .values("fecha")[:1]
+    )
+    return (
+        Reparacion.objects.filter(estado__in=ESTADOS_ENTREGADA)
+        .annotate(entregada_en=Coalesce(Subquery(ultima_entrega), "created_at"))
+        .filter(entregada_en__lt=antes_de)
+    )
+
+
+def _tamano(storage, nombre):
+    try:
+        return storage.size(nombre)
+    except (OSError, NotImplementedError):
+        return 0
+
+
+# -----------------------------
+# Acciones
+# -----------------------------
+# Cada acción tiene un filtro de candidatas y una función que modifica la
+# instancia y devuelve los nombres a borrar del storage.
+def _con_video():
+    return Q(video__isnull=False) & ~Q(video="")
+
+
+def _sin_video(reparacion, fecha, simular):
+    nombre = reparacion.video.name
+    reparacion.video = None
+    reparacion.retencion_media["video"] = fecha
+    return [nombre]
+
+
+def _con_imagen_completa():
+    filtro = Q()
+    for campo in CAMPOS_IMAGEN:
+        filtro |= (
+            Q(**{f"{campo}__isnull": False})
+            & ~Q(**{campo: ""})
+            & ~Q(retencion_media__has_key=campo)
+        )
+    return filtro
+
+
+def _solo_miniatura(reparacion, fecha, simular):
+    """La foto pasa a ser su variante más chica; el original y el resto se borran."""
+    borrar = []
+    variantes = dict(reparacion.variantes or {})
+    for campo in CAMPOS_IMAGEN:
+        archivo = getattr(reparacion, campo)
+        if not archivo or campo in reparacion.retencion_media:
+            continue
+        propias = variantes.get(campo) or []
+        if not propias and simular:
+            # Sin generar la miniatura: se cuenta el original entero.
+            borrar.append(archivo.name)
+            continue
+        if not propias:
+            try:
+                propias = variantes_de_archivo(archivo, anchos=ANCHOS[:1])
+            except Exception:
+                logger.exception("No se pudo generar la miniatura de %s", archivo.name)
+                continue
+        miniatura = min(propias, key=lambda variante: variante["ancho"])
+        if len(miniatura["jpeg"]) > reparacion._meta.get_field(campo).max_length:
+            logger.warning("La miniatura %s no entra en %s", miniatura["jpeg"], campo)
+            continue
+        borrar.append(archivo.name)
+        borrar.extend(
+            variante[formato]
+            for variante in propias
+            if variante is not miniatura
+            for formato in FORMATOS
+        )
+        setattr(reparacion, campo, miniatura["jpeg"])
+        variantes[campo] = [miniatura]
+        reparacion.retencion_media[campo] = fecha
+    reparacion.variantes = variantes
+    return borrar
+
+
+ACCIONES = {
+    "sin_video": (_con_video, _sin_video),
+    "solo_miniatura": (_con_imagen_completa, _solo_miniatura),
+}
+
+
+def _aplicar(modelo, pk, antes_de, filtro, accion, simular):
+    """Aplica la acción a una reparación. Devuelve los bytes liberados (o a liberar)."""
+    with transaction.atomic():
+        reparacion = (
+            reparaciones_entregadas(modelo, antes_de)
+            .filter(filtro, pk=pk)
+            .select_for_update(of=("self",))
+            .first()
+        )
+        if reparacion is None:
+            return None
+        storage = reparacion.imagen.storage
+        campos = ["imagen", "imagen2", "video", "variantes", "retencion_media"]
+        anteriores = {reparacion.imagen.name, reparacion.imagen2.name, reparacion.video.name}
+        borrar = accion(reparacion, timezone.now().isoformat(), simular)
+        if not borrar:
+            return None
+        liberados = sum(_tamano(storage, nombre) for nombre in borrar)
+        if simular:
+            return liberados
+        if modelo is Reparacion:
+            campos.append("updated_at")
+        reparacion.save(update_fields=campos)
+        if getattr(storage, "cuenta_referencias", False):
+            # Con media deduplicada, los archivos que dejan los FileField los
+            # libera dedup al guardar; acá quedan las variantes.
+            borrar = [nombre for nombre in borrar if nombre not in anteriores]
+
+        def borrar_archivos():
+            for nombre in borrar:
+                storage.delete(nombre)
+
+        transaction.on_commit(borrar_archivos)
+    return liberados
+
+
+def aplicar_retencion(reglas=None, *, lote=200, simular=False):
+    """
+    Aplica las reglas en lotes por id y va devolviendo
+    (acción, reparaciones, bytes) acumulados por regla. Con `simular` no se
+    modifica nada. Con media deduplicada los bytes son una cota superior: un
+    blob compartido no se libera.
+    """
+    for regla in reglas if reglas is not None else settings.MEDIA_RETENCION:
+        if not regla["dias"]:
+            continue
+        candidatas, accion = ACCIONES[regla["accion"]]
+        antes_de = timezone.now() - timedelta(days=regla["dias"])
+        total = liberados = 0
+        for modelo in (Reparacion, ReparacionArchivada):
+            ultimo_id = 0
+            while True:
+                ids = list(
+                    reparaciones_entregadas(modelo, antes_de)
+                    .filter(candidatas(), pk__gt=ultimo_id)
+                    .order_by("pk")
+                    .values_list("pk", flat=True)[:lote]
+                )
+                if not ids:
+                    break
+                ultimo_id = ids[-1]
+                for pk in ids:
+                    bytes_reparacion = _aplicar(modelo, pk, antes_de, candidatas(), accion, simular)
+                    if bytes_reparacion is not None:
+                        total += 1
+                        liberados += bytes_reparacion
+                yield regla["accion"], total, liberados
@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from storages.backends.s3boto3 import S3Boto3Storage
+
+
+class _URLsFirmadas:
+    """LRU en memoria del proceso con vencimiento por entrada."""
+
+    def __init__(self):
+        self._urls = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, clave):
+        with self._lock:
+            entrada = self._urls.get(clave)
+            if entrada is None:
+                return None
+            url, vence = entrada
+            if vence <= time.monotonic():
+                del self._urls[clave]
+                return None
+            self._urls.move_to_end(clave)
+            return url
+
+    def set(self, clave, url, segundos):
+        with self._lock:
+            self._urls[clave] = (url, time.monotonic() + segundos)
+            self._urls.move_to_end(clave)
+            while len(self._urls) > settings.MEDIA_URLS_CACHE_MAX:
+                self._urls.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._urls.clear()
+
+
+urls_firmadas = _URLsFirmadas()
+
+
+class R2Storage(S3Boto3Storage):
+    """
+    S3Boto3Storage que reutiliza cada URL firmada hasta
+    MEDIA_URLS_MARGEN_SEGUNDOS antes de que venza, en vez de calcular una
+    firma SigV4 nueva por cada .url de cada render.
+    """
+
+    def url(self, name, parameters=None, expire=None, http_method=None):
+        # Con dominio propio la URL no se firma; con parámetros o método
+        # distintos es un caso puntual que no vale la pena cachear.
+        if (
+            not settings.MEDIA_URLS_CACHE
+            or not self.querystring_auth
+            or self.custom_domain
+            or parameters
+            or http_method
+        ):
+            return super().url(name, parameters, expire, http_method)
+
+        if expire is None:
+            expire = self.querystring_expire
+        vigencia = expire - settings.MEDIA_URLS_MARGEN_SEGUNDOS
+        if vigencia <= 0:
+            return super().url(name, expire=expire)
+
+        clave = (self.bucket_name, self.location, name, expire)
+        url = urls_firmadas.get(clave)
+        if url is None:
+            url = super().url(name, expire=expire)
+            urls_firmadas.set(clave, url, vigencia)
+        return url
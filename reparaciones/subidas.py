@@ -0,0 +1,362 @@
+import mimetypes
+import re
+import tempfile
+import uuid
+
+from botocore.exceptions import ClientError
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.urls import reverse
+from django.utils import timezone
+from storages.backends.s3boto3 import S3Boto3Storage
+
+from .dedup import storage_base
+from .models import SubidaReanudable
+
+# Subida directa: el navegador pide una firma, sube el archivo al bucket sin
+# pasar por gunicorn y el formulario solo manda la clave del objeto, que se
+# verifica con un HEAD antes de guardarla en la reparación.
+#
+# Con el storage en filesystem (local, tests) la "firma" es un token de
+# django.core.signing y el PUT lo recibe la vista subida_local. Con la media
+# deduplicada se trabaja sobre el storage real: las claves son exactas.
+
+SAL_LOCAL = "reparaciones.subida-directa"
+SAL_PARTE = "reparaciones.subida-parte"
+
+TIPOS = {
+    "imagen": {
+        "image/jpeg": ".jpg",
+        "image/png": ".png",
+        "image/webp": ".webp",
+        "image/gif": ".gif",
+    },
+    "video": {
+        "video/mp4": ".mp4",
+        "video/quicktime": ".mov",
+        "video/webm": ".webm",
+    },
+}
+CAMPOS_SUBIDA = {
+    "imagen": ("reparaciones/", "imagen"),
+    "imagen2": ("reparaciones/", "imagen"),
+    "video": ("reparaciones/videos/", "video"),
+}
+
+_NOMBRE = re.compile(r"^[0-9a-f]{32}\.[a-z0-9]+$")
+
+
+def maximo_bytes(campo):
+    from .forms import ReparacionForm
+
+    _, tipo = CAMPOS_SUBIDA[campo]
+    mb = ReparacionForm.MAX_VIDEO_MB if tipo == "video" else settings.SUBIDA_IMAGEN_MAX_MB
+    return mb * 1024 * 1024
+
+
+def _prefijo(campo, usuario):
+    carpeta, _ = CAMPOS_SUBIDA[campo]
+    return f"{carpeta}directas/{usuario.pk}/"
+
+
+def _es_s3(storage):
+    return isinstance(storage, S3Boto3Storage)
+
+
+def _validar_pedido(campo, tipo, tamano):
+    if campo not in CAMPOS_SUBIDA:
+        raise ValidationError("Campo inválido.")
+    tipos = TIPOS[CAMPOS_SUBIDA[campo][1]]
+    if tipo not in tipos:
+        raise ValidationError("Formato no permitido.")
+    maximo = maximo_bytes(campo)
+    if not 0 < tamano <= maximo:
+        raise ValidationError(
+            f"El archivo supera el máximo permitido ({maximo // (1024 * 1024)}MB)."
+        )
+    return tipos[tipo]
+
+
+def _clave_nueva(usuario, campo, tipo, tamano):
+    extension = _validar_pedido(campo, tipo, tamano)
+    return f"{_prefijo(campo, usuario)}{uuid.uuid4().hex}{extension}"
+
+
+def preparar_subida(usuario, campo, tipo, tamano, storage=default_storage):
+    """
+    Devuelve lo que necesita el navegador para subir un archivo:
+    {"clave", "metodo", "url", "headers", "campos"}. Tipo y tamaño quedan
+    atados a la firma (Content-Type y Content-Length firmados en el PUT,
+    condiciones de la policy en el POST).
+    """
+    storage = storage_base(storage)
+    clave = _clave_nueva(usuario, campo, tipo, tamano)
+    segundos = settings.SUBIDA_DIRECTA_SEGUNDOS
+
+    if not _es_s3(storage):
+        token = signing.dumps({"clave": clave, "tipo": tipo, "tamano": tamano}, salt=SAL_LOCAL)
+        return {
+            "clave": clave,
+            "metodo": "PUT",
+            "url": reverse("subida_local", args=[token]),
+            "headers": {"Content-Type": tipo},
+            "campos": {},
+        }
+
+    cliente = storage.connection.meta.client
+    objeto = storage._normalize_name(clave)
+    if settings.SUBIDA_DIRECTA_METODO == "post":
+        firma = cliente.generate_presigned_post(
+            storage.bucket_name,
+            objeto,
+            Fields={"Content-Type": tipo},
+            Conditions=[
+                {"Content-Type": tipo},
+                ["content-length-range", 1, maximo_bytes(campo)],
+            ],
+            ExpiresIn=segundos,
+        )
+        return {
+            "clave": clave,
+            "metodo": "POST",
+            "url": firma["url"],
+            "headers": {},
+            "campos": firma["fields"],
+        }
+
+    url = cliente.generate_presigned_url(
+        "put_object",
+        Params={
+            "Bucket": storage.bucket_name,
+            "Key": objeto,
+            "ContentType": tipo,
+            "ContentLength": tamano,
+        },
+        ExpiresIn=segundos,
+    )
+    return {
+        "clave": clave,
+        "metodo": "PUT",
+        "url": url,
+        "headers": {"Content-Type": tipo},
+        "campos": {},
+    }
+
+
+def leer_token_local(token, sal=SAL_LOCAL):
+    """Datos firmados por preparar_subida, o None si el token es inválido o venció."""
+    try:
+        return signing.loads(token, salt=sal, max_age=settings.SUBIDA_DIRECTA_SEGUNDOS)
+    except signing.BadSignature:
+        return None
+
+
+def _cabecera(storage, clave):
+    if _es_s3(storage):
+        try:
+            cabecera = storage.connection.meta.client.head_object(
+                Bucket=storage.bucket_name, Key=storage._normalize_name(clave)
+            )
+        except ClientError:
+            return None
+        return cabecera["ContentLength"], cabecera.get("ContentType", "")
+    if not storage.exists(clave):
+        return None
+    return storage.size(clave), mimetypes.guess_type(clave)[0] or ""
+
+
+def verificar_subida(usuario, campo, clave, storage=default_storage):
+    """
+    Confirma con un HEAD que `clave` es un objeto subido por `usuario` para
+    `campo`, con tipo y tamaño permitidos. Devuelve la clave para asignarla
+    al FileField; levanta ValidationError si no corresponde.
+    """
+    storage = storage_base(storage)
+    prefijo = _prefijo(campo, usuario)
+    if not clave.startswith(prefijo) or not _NOMBRE.match(clave[len(prefijo):]):
+        raise ValidationError("El archivo subido no es válido.")
+
+    cabecera = _cabecera(storage, clave)
+    if cabecera is None:
+        raise ValidationError("No encontramos el archivo subido. Probá de nuevo.")
+    tamano, tipo = cabecera
+    extension = _validar_pedido(campo, tipo, tamano)
+    if not clave.endswith(extension):
+        raise ValidationError("El archivo subido no es válido.")
+    return clave
+
+
+# -----------------------------
+# Subidas reanudables
+# -----------------------------
+# Para videos desde conexiones que se cortan: el archivo se sube en partes
+# de SUBIDA_PARTE_MB y, si algo falla, el navegador pide el estado y
+# reenvía solo las partes que faltan. En R2/S3 es un multipart upload con
+# URLs prefirmadas por parte (los bytes tampoco pasan por Django) y las
+# partes recibidas se le preguntan al bucket con ListParts.
+
+
+def iniciar_reanudable(usuario, campo, tipo, tamano, storage=default_storage):
+    storage = storage_base(storage)
+    subida = SubidaReanudable(
+        usuario=usuario,
+        campo=campo,
+        tipo=tipo,
+        tamano=tamano,
+        tamano_parte=settings.SUBIDA_PARTE_MB * 1024 * 1024,
+        clave=_clave_nueva(usuario, campo, tipo, tamano),
+    )
+    if _es_s3(storage):
+        subida.upload_id = storage.connection.meta.client.create_multipart_upload(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(subida.clave),
+            ContentType=tipo,
+        )["UploadId"]
+    subida.save()
+    return subida
+
+
+def _nombre_parte(subida, numero):
+    return f"subidas_parciales/{subida.pk}/{numero:05d}"
+
+
+def _partes_s3(subida, storage):
+    paginas = storage.connection.meta.client.get_paginator("list_parts").paginate(
+        Bucket=storage.bucket_name,
+        Key=storage._normalize_name(subida.clave),
+        UploadId=subida.upload_id,
+    )
+    return {
+        parte["PartNumber"]: parte
+        for pagina in paginas
+        for parte in pagina.get("Parts", [])
+        if parte["Size"] == subida.tamano_de_parte(parte["PartNumber"])
+    }
+
+
+def partes_recibidas(subida, storage=default_storage):
+    storage = storage_base(storage)
+    if _es_s3(storage):
+        return set(_partes_s3(subida, storage))
+    return {
+        numero
+        for numero in range(1, subida.cantidad_partes + 1)
+        if storage.exists(_nombre_parte(subida, numero))
+        and storage.size(_nombre_parte(subida, numero)) == subida.tamano_de_parte(numero)
+    }
+
+
+def _url_parte(subida, numero, storage):
+    if not _es_s3(storage):
+        token = signing.dumps({"id": str(subida.pk), "numero": numero}, salt=SAL_PARTE)
+        return reverse("subida_parte_local", args=[token])
+    return storage.connection.meta.client.generate_presigned_url(
+        "upload_part",
+        Params={
+            "Bucket": storage.bucket_name,
+            "Key": storage._normalize_name(subida.clave),
+            "UploadId": subida.upload_id,
+            "PartNumber": numero,
+            "ContentLength": subida.tamano_de_parte(numero),
+        },
+        ExpiresIn=settings.SUBIDA_DIRECTA_SEGUNDOS,
+    )
+
+
+def estado_reanudable(subida, storage=default_storage):
+    """
+    Lo que el navegador necesita para seguir: bytes ya recibidos y una URL
+    (PUT) por cada parte que falta. Cuenta como actividad para el vencimiento.
+    """
+    storage = storage_base(storage)
+    recibidas = partes_recibidas(subida, storage) if not subida.completada else set()
+    SubidaReanudable.objects.filter(pk=subida.pk).update(updated_at=timezone.now())
+    return {
+        "id": str(subida.pk),
+        "tamano": subida.tamano,
+        "tamano_parte": subida.tamano_parte,
+        "completada": subida.completada,
+        "clave": subida.clave if subida.completada else "",
+        "recibido": sum(subida.tamano_de_parte(numero) for numero in recibidas),
+        "pendientes": [
+            {"numero": numero, "url": _url_parte(subida, numero, storage)}
+            for numero in range(1, subida.cantidad_partes + 1)
+            if numero not in recibidas and not subida.completada
+        ],
+    }
+
+
+def guardar_parte_local(subida, numero, contenido, storage=default_storage):
+    """Guarda una parte recibida por subida_parte_local; reenviarla la reemplaza."""
+    storage = storage_base(storage)
+    nombre = _nombre_parte(subida, numero)
+    storage.delete(nombre)
+    storage.save(nombre, contenido)
+    SubidaReanudable.objects.filter(pk=subida.pk).update(updated_at=timezone.now())
+
+
+def completar_reanudable(subida, storage=default_storage):
+    """
+    Arma el archivo final en `subida.clave` si están todas las partes.
+    Levanta ValidationError si falta alguna.
+    """
+    storage = storage_base(storage)
+    if subida.completada:
+        return subida.clave
+    numeros = range(1, subida.cantidad_partes + 1)
+
+    if _es_s3(storage):
+        partes = _partes_s3(subida, storage)
+        if set(numeros) - set(partes):
+            raise ValidationError("Faltan partes del archivo.")
+        storage.connection.meta.client.complete_multipart_upload(
+            Bucket=storage.bucket_name,
+            Key=storage._normalize_name(subida.clave),
+            UploadId=subida.upload_id,
+            MultipartUpload={
+                "Parts": [
+                    {"PartNumber": numero, "ETag": partes[numero]["ETag"]} for numero in numeros
+                ]
+            },
+        )
+    else:
+        if set(numeros) - partes_recibidas(subida, storage):
+            raise ValidationError("Faltan partes del archivo.")
+        with tempfile.TemporaryFile() as completo:
+            for numero in numeros:
+                with storage.open(_nombre_parte(subida, numero), "rb") as parte:
+                    for bloque in parte.chunks():
+                        completo.write(bloque)
+            completo.seek(0)
+            storage.save(subida.clave, File(completo))
+        _borrar_partes_locales(subida, storage)
+
+    subida.completada = True
+    subida.save(update_fields=["completada", "updated_at"])
+    return subida.clave
+
+
+def _borrar_partes_locales(subida, storage):
+    for numero in range(1, subida.cantidad_partes + 1):
+        storage.delete(_nombre_parte(subida, numero))
+
+
+def descartar_reanudable(subida, storage=default_storage):
+    """Libera lo subido de una subida que no se completó y borra el registro."""
+    storage = storage_base(storage)
+    if not subida.completada:
+        if _es_s3(storage):
+            try:
+                storage.connection.meta.client.abort_multipart_upload(
+                    Bucket=storage.bucket_name,
+                    Key=storage._normalize_name(subida.clave),
+                    UploadId=subida.upload_id,
+                )
+            except ClientError:
+                pass
+        else:
+            _borrar_partes_locales(subida, storage)
+    subida.delete()
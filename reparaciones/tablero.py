@@ -0,0 +1,110 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.middleware.csrf import get_token
+
+from .models import FacturaFinal, Presupuesto, Reparacion
+
+# El tablero de cada cliente se cachea ya renderizado bajo
+# (usuario, versión, validador, request). Cualquier escritura sobre sus
+# reparaciones, presupuestos o facturas sube la versión, y las claves viejas
+# quedan huérfanas hasta que expiran; no hace falta borrar nada. La versión
+# vive en la cache: con LocMem cada proceso tiene la suya y no se entera de
+# lo que escribe otro. Por eso la clave lleva también el validador del GET
+# condicional (cantidad, max(updated_at)), que sale de la base y cambia con
+# las mismas escrituras.
+
+
+def _cache():
+    return caches[settings.TABLERO_CACHE]
+
+
+def _clave_version(usuario_id):
+    return f"tablero:version:{usuario_id}"
+
+
+def version_tablero(usuario_id):
+    clave = _clave_version(usuario_id)
+    # Arranca en un timestamp y no en 1: si la cache pierde la versión, la
+    # nueva nunca coincide con la de fragmentos que sigan guardados.
+    _cache().add(clave, time.time_ns(), None)
+    return _cache().get(clave)
+
+
+def _subir_versiones(usuario_ids):
+    for usuario_id in usuario_ids:
+        try:
+            _cache().incr(_clave_version(usuario_id))
+        except ValueError:
+            _cache().add(_clave_version(usuario_id), time.time_ns(), None)
+
+
+def invalidar_tableros(usuario_ids):
+    usuario_ids = {usuario_id for usuario_id in usuario_ids if usuario_id}
+    if not usuario_ids:
+        return
+    _subir_versiones(usuario_ids)
+    # Y otra vez al confirmar: un request concurrente pudo cachear con la
+    # versión nueva lo que leyó antes del commit.
+    transaction.on_commit(lambda: _subir_versiones(usuario_ids))
+
+
+def usuarios_de_reparaciones(reparacion_ids):
+    return Reparacion.objects.filter(pk__in=list(reparacion_ids)).values_list(
+        "usuario_id", flat=True
+    )
+
+
+def clave_tablero(request, validador):
+    """
+    Clave del fragmento para este request: página, filtros, token CSRF y
+    `validador`, el (cantidad, max(updated_at)) de las reparaciones que muestra.
+    """
+    # El fragmento trae el token de {% csrf_token %}; get_token() fija el
+    # secreto (y la cookie) antes de usarlo en la clave.
+    get_token(request)
+    csrf = request.META["CSRF_COOKIE"]
+    cantidad, ultima = validador
+    detalle = hashlib.sha256(
+        "|".join(
+            [
+                request.GET.urlencode(),
+                csrf,
+                str(cantidad),
+                ultima.isoformat() if ultima else "",
+            ]
+        ).encode()
+    ).hexdigest()[:24]
+    return f"tablero:{request.user.pk}:{version_tablero(request.user.pk)}:{detalle}"
+
+
+def obtener_tablero(clave):
+    return _cache().get(clave)
+
+
+def guardar_tablero(clave, html):
+    _cache().set(clave, html, settings.TABLERO_CACHE_SEGUNDOS)
+
+
+# -----------------------------
+# Señales
+# -----------------------------
+def _reparacion_cambiada(sender, instance, **kwargs):
+    invalidar_tableros([instance.usuario_id])
+
+
+def _hijo_cambiado(sender, instance, **kwargs):
+    # En un borrado en cascada la reparación puede no existir ya; en ese caso
+    # la invalida la señal de la propia Reparacion.
+    invalidar_tableros(usuarios_de_reparaciones([instance.reparacion_id]))
+
+
+def conectar_senales():
+    for senal in (post_save, post_delete):
+        senal.connect(_reparacion_cambiada, sender=Reparacion)
+        senal.connect(_hijo_cambiado, sender=Presupuesto)
+        senal.connect(_hijo_cambiado, sender=FacturaFinal)
@@ -0,0 +1,66 @@
+import logging
+import os
+
+from django.conf import settings
+from django.core.mail import send_mail
+from django.tasks import task
+
+from .imagenes import CAMPOS_IMAGEN, generar_variantes, guardar_variantes
+from .models import Presupuesto, Reparacion
+
+logger = logging.getLogger(__name__)
+
+# Trabajo que no necesita terminar antes de responder: se encola con
+# django.tasks (ver TASKS en settings). Los argumentos van por JSON, así que
+# se pasan ids y no instancias, y todo lo que dependa del request (URLs
+# absolutas) se arma en la vista.
+
+
+@task
+def notificar_presupuesto_aprobado(presupuesto_id, admin_url):
+    destinatario = os.environ.get("TALLER_NOTIFY_EMAIL", "").strip()
+    if not destinatario:
+        logger.info("TALLER_NOTIFY_EMAIL no configurado; se omite el envío.")
+        return
+
+    presupuesto = (
+        Presupuesto.objects.select_related("reparacion__usuario").filter(pk=presupuesto_id).first()
+    )
+    if presupuesto is None:
+        return
+    usuario = presupuesto.reparacion.usuario
+    monto = ""
+    if presupuesto.monto is not None:
+        monto = f"{presupuesto.moneda} {presupuesto.monto}"
+    subject = f"✅ Presupuesto aprobado — Reparación #{presupuesto.reparacion_id}"
+    body = "\n".join(
+        [
+            f"Usuario: {usuario.username if usuario else '—'}",
+            f"Reparación: #{presupuesto.reparacion_id}",
+            f"Presupuesto: #{presupuesto.pk}",
+            f"Monto: {monto or '—'}",
+            f"Admin: {admin_url}",
+        ]
+    )
+    # Sin fail_silently: si el SMTP falla, la cola reintenta.
+    send_mail(
+        subject=subject,
+        message=body,
+        from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@example.com"),
+        recipient_list=[destinatario],
+    )
+    notificar_proveedor_externo.enqueue(presupuesto_id)
+
+
+@task
+def notificar_proveedor_externo(presupuesto_id):
+    """Hook para integrar WhatsApp/SMS en el futuro."""
+    return
+
+
+@task
+def generar_variantes_reparacion(reparacion_id, campos=CAMPOS_IMAGEN):
+    reparacion = Reparacion.objects.filter(pk=reparacion_id).first()
+    if reparacion is None:
+        return
+    guardar_variantes(reparacion, campos, generar_variantes(reparacion, campos))
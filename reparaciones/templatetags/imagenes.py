@@ -0,0 +1,30 @@
+from django import template
+
+register = template.Library()
+
+# Las tarjetas del tablero ocupan toda la pantalla en celular y ~320px en
+# la grilla de escritorio (minmax(260px, 1fr)).
+SIZES_TARJETA = "(max-width: 600px) 100vw, 320px"
+
+
+@register.inclusion_tag("reparaciones/_imagen_responsive.html")
+def imagen_responsive(reparacion, campo, alt, sizes=SIZES_TARJETA):
+    archivo = getattr(reparacion, campo)
+    variantes = (reparacion.variantes or {}).get(campo) or []
+    if not variantes:
+        return {"src": archivo.url, "alt": alt}
+
+    storage = archivo.storage
+    # src para navegadores sin srcset: la variante de 640 (o la más cercana).
+    por_defecto = min(variantes, key=lambda variante: abs(variante["ancho"] - 640))
+    return {
+        "src": storage.url(por_defecto["jpeg"]),
+        "srcset_webp": ", ".join(
+            f"{storage.url(variante['webp'])} {variante['ancho']}w" for variante in variantes
+        ),
+        "srcset_jpeg": ", ".join(
+            f"{storage.url(variante['jpeg'])} {variante['ancho']}w" for variante in variantes
+        ),
+        "sizes": sizes,
+        "alt": alt,
+    }
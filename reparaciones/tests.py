@@ -1,3 +1,1429 @@
-from django.test import TestCase
+from datetime import timedelta
+import base64
+import os
+import shutil
+import tempfile
+import zipfile
+from io import BytesIO, StringIO
+from smtplib import SMTPException
+from unittest import mock
 
-# Create your tests here.
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.contrib.messages import get_messages
+from django.contrib.sessions.models import Session
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import connection, transaction
+from django.tasks import TaskResultStatus
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from . import dedup, tareas
+from .busqueda import buscar_reparaciones
+from .huerfanos import recolectar_huerfanos
+from .limite_consultas import LimiteConsultasExcedido, limite_consultas
+from .limite_subida import MB, LimiteSubidaHandler
+from .models import (
+    BlobMedia,
+    FacturaFinal,
+    Presupuesto,
+    Reparacion,
+    ReparacionArchivada,
+    ResumenMensual,
+    SubidaReanudable,
+    TareaEncolada,
+    TransicionEstado,
+)
+from .paginacion import paginar_reparaciones
+from .replica import CLAVE_SESION, RouterReplica, leer_de_replica
+from .resumenes import reconstruir_resumenes
+from .storage import R2Storage, urls_firmadas
+from .subidas import preparar_subida
+from .transiciones import cambiar_estado, tiempos_por_estado
+from .views import LIMITES_FACTURA, LIMITES_PRESUPUESTO
+
+
+def crear_reparacion(usuario, **kwargs):
+    datos = {
+        "usuario": usuario,
+        "nombre_cliente": usuario.username,
+        "telefono": "2944000000",
+        "ubicacion": "Centro",
+        "tipo_equipo": "Surf",
+        "descripcion": "Golpe en la cola",
+        "imagen": "reparaciones/test.jpg",
+    }
+    datos.update(kwargs)
+    return Reparacion.objects.create(**datos)
+
+
+def crear_presupuesto(reparacion, **kwargs):
+    datos = {
+        "reparacion": reparacion,
+        "archivo_presupuesto": "reparaciones/presupuestos/test.pdf",
+        "estado": "enviado",
+        "monto": 1000,
+    }
+    datos.update(kwargs)
+    return Presupuesto.objects.create(**datos)
+
+
+# Las tareas (mails, variantes) corren en el momento, sin depender de
+# TAREAS_EN_SEGUNDO_PLANO del entorno.
+TAREAS_INMEDIATAS = {"default": {"BACKEND": "django.tasks.backends.immediate.ImmediateBackend"}}
+
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        cliente = User.objects.create_user("cliente", password="x")
+        base = timezone.now() - timedelta(days=1)
+        # Las tres primeras comparten created_at: desempata el id.
+        fechas = [base, base, base, base - timedelta(hours=1), base - timedelta(hours=2)]
+        self.reparaciones = []
+        for fecha in fechas:
+            reparacion = crear_reparacion(cliente)
+            Reparacion.objects.filter(pk=reparacion.pk).update(created_at=fecha)
+            reparacion.refresh_from_db()
+            self.reparaciones.append(reparacion)
+        # Orden esperado: (-created_at, -id).
+        self.orden = sorted(self.reparaciones, key=lambda r: (r.created_at, r.pk), reverse=True)
+
+    def pagina(self, query=""):
+        request = RequestFactory().get(f"/?por_pagina=2&{query.lstrip('?')}")
+        return paginar_reparaciones(request, Reparacion.objects.all())
+
+    def test_siguiente_y_anterior_con_empates(self):
+        primera = self.pagina()
+        self.assertEqual(list(primera), self.orden[:2])
+        self.assertFalse(primera.has_previous)
+
+        segunda = self.pagina(primera.url_siguiente)
+        self.assertEqual(list(segunda), self.orden[2:4])
+        tercera = self.pagina(segunda.url_siguiente)
+        self.assertEqual(list(tercera), self.orden[4:])
+        self.assertFalse(tercera.has_next)
+
+        self.assertEqual(list(self.pagina(tercera.url_anterior)), self.orden[2:4])
+        volver = self.pagina(segunda.url_anterior)
+        self.assertEqual(list(volver), self.orden[:2])
+        self.assertFalse(volver.has_previous)
+
+    def test_cursor_invalido_vuelve_a_la_primera(self):
+        adulterado = base64.urlsafe_b64encode(b"no-es-fecha|abc").decode()
+        for cursor in ("%%%", "abc", adulterado):
+            pagina = self.pagina(f"despues={cursor}")
+            self.assertEqual(list(pagina), self.orden[:2])
+            self.assertFalse(pagina.has_previous)
+
+    def test_pagina_profunda_sin_offset(self):
+        cursor = self.pagina(self.pagina().url_siguiente).url_siguiente
+        with CaptureQueriesContext(connection) as capturadas:
+            list(self.pagina(cursor))
+        (consulta,) = capturadas
+        self.assertNotIn("OFFSET", consulta["sql"].upper())
+        self.assertIn("LIMIT 3", consulta["sql"].upper())
+
+
+class ResumenPresupuestosTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.reparacion = crear_reparacion(self.cliente)
+        self.otra = crear_reparacion(self.cliente)
+
+    def resumen(self, reparacion):
+        reparacion.refresh_from_db()
+        return reparacion.ultimo_presupuesto_id, reparacion.presupuestos_count
+
+    def test_alta_y_baja_del_ultimo(self):
+        primero = crear_presupuesto(self.reparacion)
+        self.assertEqual(self.resumen(self.reparacion), (primero.pk, 1))
+        segundo = crear_presupuesto(self.reparacion)
+        self.assertEqual(self.resumen(self.reparacion), (segundo.pk, 2))
+
+        segundo.delete()
+        self.assertEqual(self.resumen(self.reparacion), (primero.pk, 1))
+        primero.delete()
+        self.assertEqual(self.resumen(self.reparacion), (None, 0))
+
+    def test_mover_a_otra_reparacion(self):
+        primero = crear_presupuesto(self.reparacion)
+        segundo = crear_presupuesto(self.reparacion)
+
+        segundo.reparacion = self.otra
+        segundo.save()
+        self.assertEqual(self.resumen(self.reparacion), (primero.pk, 1))
+        self.assertEqual(self.resumen(self.otra), (segundo.pk, 1))
+
+        primero.reparacion = self.otra
+        primero.save(update_fields=["reparacion"])
+        self.assertEqual(self.resumen(self.reparacion), (None, 0))
+        self.assertEqual(self.resumen(self.otra), (segundo.pk, 2))
+
+    def test_recalcular_coincide_con_el_agregado(self):
+        for reparacion, cantidad in ((self.reparacion, 3), (self.otra, 1)):
+            for _ in range(cantidad):
+                crear_presupuesto(reparacion)
+        sin_presupuestos = crear_reparacion(self.cliente)
+        # Como quedan las filas antes de completar el resumen.
+        Reparacion.objects.update(ultimo_presupuesto=None, presupuestos_count=0)
+
+        call_command("recalcular_resumen_presupuestos", lote=2, stdout=StringIO())
+
+        for reparacion in (self.reparacion, self.otra, sin_presupuestos):
+            presupuestos = Presupuesto.objects.filter(reparacion=reparacion)
+            ultimo = presupuestos.order_by("-fecha_creacion", "-pk").first()
+            self.assertEqual(
+                self.resumen(reparacion),
+                (ultimo.pk if ultimo else None, presupuestos.count()),
+            )
+
+
+@override_settings(LIMITE_CONSULTAS_ESTRICTO=True, REPARACIONES_POR_PAGINA=50)
+class ConsultasPorVistaTests(TestCase):
+    """La cantidad de consultas de cada vista no depende de cuántas filas muestra."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        cls.cliente = User.objects.create_user("cliente", password="x")
+
+    def sembrar(self, cantidad):
+        for i in range(cantidad):
+            usuario = User.objects.create_user(f"cliente_{self.sembradas}_{i}")
+            for duenio in (usuario, self.cliente):
+                reparacion = crear_reparacion(duenio)
+                crear_presupuesto(reparacion)
+                crear_presupuesto(reparacion, estado="aprobado")
+                finalizada = crear_reparacion(duenio, estado="finalizado")
+                crear_presupuesto(finalizada, estado="aprobado")
+                FacturaFinal.objects.create(reparacion=finalizada, monto_total=500)
+        self.sembradas += cantidad
+
+    def contar_consultas(self, usuario, url):
+        self.client.force_login(usuario)
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(capturadas)
+
+    def assertConsultasConstantes(self, usuario, url_factory):
+        self.sembradas = 0
+        self.sembrar(2)
+        pocas = self.contar_consultas(usuario, url_factory())
+        self.sembrar(10)
+        muchas = self.contar_consultas(usuario, url_factory())
+        self.assertEqual(pocas, muchas)
+
+    def test_inicio(self):
+        self.assertConsultasConstantes(self.cliente, lambda: reverse("inicio"))
+
+    def test_staff_reparaciones(self):
+        self.assertConsultasConstantes(self.staff, lambda: reverse("staff_reparaciones"))
+
+    def test_staff_finalizados(self):
+        self.assertConsultasConstantes(self.staff, lambda: reverse("staff_finalizados"))
+
+    def test_staff_presupuestos(self):
+        def url():
+            reparacion = Reparacion.objects.filter(usuario=self.cliente).first()
+            for _ in range(self.sembradas):
+                crear_presupuesto(reparacion)
+            return reverse("staff_presupuestos", args=[reparacion.pk])
+
+        self.assertConsultasConstantes(self.staff, url)
+
+
+class ExplicarConsultasTests(TestCase):
+    def test_listados_y_filtros_usan_los_indices(self):
+        salida = StringIO()
+        call_command("explicar_consultas", reparaciones=300, usuarios=5, stdout=salida)
+        texto = salida.getvalue()
+        self.assertIn("Todas las consultas usan índices.", texto)
+        self.assertIn("== admin changelist ?estado=en_proceso ==", texto)
+        self.assertNotRegex(texto, r"SCAN reparaciones_reparacion(?! USING)")
+        self.assertIn("USING INDEX reparacion_usuario_created_idx", texto)
+        self.assertIn("USING INDEX reparacion_estado_created_idx (estado=?)", texto)
+        # El dataset se revierte al terminar.
+        self.assertFalse(Reparacion.objects.exists())
+
+
+class LimiteConsultasTests(TestCase):
+    def setUp(self):
+        self.request = RequestFactory().get("/")
+
+    @staticmethod
+    def vista_con_consultas(cantidad):
+        @limite_consultas(1)
+        def vista(request):
+            for _ in range(cantidad):
+                list(User.objects.all())
+            return "ok"
+
+        return vista
+
+    @override_settings(LIMITE_CONSULTAS_ESTRICTO=True)
+    def test_estricto_lanza_excepcion(self):
+        self.assertEqual(self.vista_con_consultas(1)(self.request), "ok")
+        with self.assertRaises(LimiteConsultasExcedido):
+            self.vista_con_consultas(2)(self.request)
+
+    @override_settings(LIMITE_CONSULTAS_ESTRICTO=False)
+    def test_no_estricto_loguea(self):
+        with self.assertLogs("reparaciones.limite_consultas", "WARNING"):
+            self.assertEqual(self.vista_con_consultas(2)(self.request), "ok")
+
+
+class BusquedaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        cliente = User.objects.create_user("cliente", password="x")
+        cls.kite = crear_reparacion(
+            cliente, tipo_equipo="Kite", telefono="2944123456", descripcion="Válvula rota"
+        )
+        cls.surf = crear_reparacion(
+            cliente, tipo_equipo="Surf", telefono="2944987654", descripcion="Quilla floja"
+        )
+
+    def buscar(self, texto):
+        return list(buscar_reparaciones(Reparacion.objects.all(), texto))
+
+    def test_fragmento_de_telefono(self):
+        self.assertEqual(self.buscar("12345"), [self.kite])
+
+    def test_telefono_con_separadores(self):
+        Reparacion.objects.filter(pk=self.kite.pk).update(telefono="(0294) 412-3456")
+        self.assertEqual(self.buscar("4123456"), [self.kite])
+        self.assertEqual(self.buscar("kite 412 3456"), [self.kite])
+        self.assertEqual(self.buscar("0294-4123456"), [self.kite])
+        self.assertEqual(self.buscar("4123 999"), [])
+
+    def test_numero_corto_es_texto(self):
+        self.assertEqual(self.buscar("kite 2"), [self.kite])
+        self.assertEqual(self.buscar("surf 44"), [self.surf])
+
+    def test_icontains_compara_digitos(self):
+        from .busqueda import _buscar_icontains, _separar_numeros
+
+        Reparacion.objects.filter(pk=self.surf.pk).update(telefono="2944 98-7654")
+        terminos, numeros = _separar_numeros("Surf 98 7654")
+        self.assertEqual(
+            list(_buscar_icontains(Reparacion.objects.all(), terminos, numeros)), [self.surf]
+        )
+
+    def test_descripcion(self):
+        self.assertEqual(self.buscar("quilla"), [self.surf])
+
+    def test_refleja_actualizaciones(self):
+        Reparacion.objects.filter(pk=self.surf.pk).update(descripcion="Nariz golpeada")
+        self.assertEqual(self.buscar("quilla"), [])
+        self.assertEqual(self.buscar("nariz"), [self.surf])
+
+    def test_vista_staff(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("staff_buscar"), {"q": "9876"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context["pagina"]), [self.surf])
+
+
+class ResumenMensualTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", password="x")
+
+    def celdas(self):
+        return list(
+            ResumenMensual.objects.values_list(
+                "mes",
+                "moneda",
+                "tipo_equipo",
+                "ubicacion",
+                "facturas_cantidad",
+                "facturas_monto",
+                "presupuestos_cantidad",
+                "presupuestos_monto",
+                "aprobados_cantidad",
+                "aprobados_monto",
+            )
+        )
+
+    def assertIgualAReconstruir(self):
+        incremental = self.celdas()
+        reconstruir_resumenes()
+        self.assertEqual(incremental, self.celdas())
+
+    def test_altas_cambios_y_bajas(self):
+        kite = crear_reparacion(self.cliente, tipo_equipo="Kite")
+        surf = crear_reparacion(self.cliente, ubicacion="Dina Huapi")
+        crear_presupuesto(kite, monto=100)
+        aprobado = crear_presupuesto(kite, monto=250, moneda="USD")
+        borrado = crear_presupuesto(surf, monto=80)
+        FacturaFinal.objects.create(reparacion=surf, monto_total=300)
+        self.assertIgualAReconstruir()
+
+        aprobado.estado = "aprobado"
+        aprobado.save(update_fields=["estado"])
+        borrado.delete()
+        factura = FacturaFinal.objects.get(reparacion=surf)
+        factura.monto_total = 450
+        factura.save()
+        self.assertIgualAReconstruir()
+
+        resumen = ResumenMensual.objects.get(moneda="USD")
+        self.assertEqual((resumen.aprobados_cantidad, resumen.aprobados_monto), (1, 250))
+
+    def test_vista_staff(self):
+        staff = User.objects.create_user("staff", password="x", is_staff=True)
+        crear_presupuesto(crear_reparacion(self.cliente), monto=100)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("staff_estadisticas"))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["por_mes"][0]["presupuestos_monto"], 100)
+
+
+class TransicionEstadoTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_superuser("staff", password="x")
+        self.cliente = User.objects.create_user("cliente", password="x")
+
+    def test_accion_masiva_del_admin(self):
+        reparaciones = [crear_reparacion(self.cliente) for _ in range(3)]
+        crear_reparacion(self.cliente, estado="en_proceso")
+        self.client.force_login(self.staff)
+        self.client.post(
+            reverse("admin:reparaciones_reparacion_changelist"),
+            {
+                "action": "marcar_en_proceso",
+                "_selected_action": [r.pk for r in Reparacion.objects.all()],
+            },
+        )
+        transiciones = TransicionEstado.objects.all()
+        self.assertEqual(
+            sorted(t.reparacion_id for t in transiciones), [r.pk for r in reparaciones]
+        )
+        self.assertEqual({t.origen for t in transiciones}, {"admin:marcar_en_proceso"})
+        self.assertEqual({t.estado_anterior for t in transiciones}, {"recibida"})
+
+    def test_accion_de_presupuestos_con_listado_filtrado(self):
+        reparacion = crear_reparacion(self.cliente, estado="pendiente_pago")
+        presupuesto = crear_presupuesto(reparacion, estado="enviado")
+        self.client.force_login(self.staff)
+        self.client.post(
+            reverse("admin:reparaciones_presupuesto_changelist") + "?estado__exact=enviado",
+            {"action": "marcar_aprobado", "_selected_action": [presupuesto.pk]},
+        )
+        presupuesto.refresh_from_db()
+        reparacion.refresh_from_db()
+        self.assertEqual((presupuesto.estado, reparacion.estado), ("aprobado", "en_proceso"))
+        transicion = TransicionEstado.objects.get()
+        self.assertEqual(transicion.origen, "admin:presupuesto_aprobado")
+
+    def test_finalizar_desde_staff(self):
+        reparacion = crear_reparacion(self.cliente, estado="entregado")
+        self.client.force_login(self.staff)
+        self.client.post(reverse("staff_finalizar_reparacion", args=[reparacion.pk]))
+        transicion = TransicionEstado.objects.get()
+        self.assertEqual(
+            (transicion.estado_anterior, transicion.estado_nuevo, transicion.usuario),
+            ("entregado", "finalizado", self.staff),
+        )
+
+    def test_cambiar_estado_ignora_las_que_ya_estan(self):
+        crear_reparacion(self.cliente, estado="finalizado")
+        self.assertEqual(cambiar_estado(Reparacion.objects.all(), "finalizado"), 0)
+        self.assertFalse(TransicionEstado.objects.exists())
+
+    def test_percentiles(self):
+        inicio = timezone.now() - timedelta(days=30)
+        transiciones = []
+        # Diez reparaciones que pasan 1..10 días en "en_proceso".
+        for dias in range(1, 11):
+            reparacion = crear_reparacion(self.cliente)
+            transiciones += [
+                TransicionEstado(
+                    reparacion=reparacion, estado_nuevo="en_proceso", fecha=inicio
+                ),
+                TransicionEstado(
+                    reparacion=reparacion,
+                    estado_anterior="en_proceso",
+                    estado_nuevo="listo_para_entregar",
+                    fecha=inicio + timedelta(days=dias),
+                ),
+            ]
+        TransicionEstado.objects.bulk_create(transiciones)
+
+        (fila,) = tiempos_por_estado()
+        self.assertEqual((fila["estado"], fila["cantidad"]), ("en_proceso", 10))
+        self.assertAlmostEqual(fila["p50"], timedelta(days=5).total_seconds(), places=0)
+        self.assertAlmostEqual(fila["p90"], timedelta(days=9).total_seconds(), places=0)
+
+        self.client.force_login(self.staff)
+        self.assertEqual(self.client.get(reverse("staff_tiempos")).status_code, 200)
+
+
+class ArchivoTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.cliente = User.objects.create_user("cliente", password="x")
+        hace_dos_anios = timezone.now() - timedelta(days=730)
+        self.vieja = crear_reparacion(self.cliente)
+        crear_presupuesto(self.vieja, estado="aprobado")
+        FacturaFinal.objects.create(
+            reparacion=self.vieja, monto_total=500, link_factura="https://example.com/factura.pdf"
+        )
+        cambiar_estado(Reparacion.objects.filter(pk=self.vieja.pk), "finalizado")
+        TransicionEstado.objects.filter(reparacion=self.vieja).update(fecha=hace_dos_anios)
+        # Finalizada hace poco aunque se haya dado de alta hace mucho.
+        self.reciente = crear_reparacion(self.cliente)
+        Reparacion.objects.filter(pk=self.reciente.pk).update(created_at=hace_dos_anios)
+        cambiar_estado(Reparacion.objects.filter(pk=self.reciente.pk), "finalizado")
+
+    def test_mueve_solo_las_viejas_y_conserva_el_resumen(self):
+        resumen = list(ResumenMensual.objects.values())
+        call_command("archivar_reparaciones", meses=12, lote=1, stdout=StringIO())
+
+        self.assertEqual(list(Reparacion.objects.all()), [self.reciente])
+        archivada = ReparacionArchivada.objects.get()
+        self.assertEqual(archivada.pk, self.vieja.pk)
+        self.assertEqual(archivada.presupuestos.get().estado, "aprobado")
+        self.assertEqual(archivada.factura_final_safe.monto_total, 500)
+        self.assertEqual(archivada.historial[0]["estado_nuevo"], "finalizado")
+        self.assertEqual(list(ResumenMensual.objects.values()), resumen)
+        reconstruir_resumenes()
+        self.assertEqual(
+            list(ResumenMensual.objects.values_list("facturas_monto", "aprobados_monto")),
+            [(500, 1000)],
+        )
+
+    def test_lectura_de_archivadas(self):
+        call_command("archivar_reparaciones", meses=12, stdout=StringIO())
+        self.client.force_login(self.cliente)
+        response = self.client.get(reverse("inicio"), {"archivadas": "1"})
+        self.assertEqual([r.pk for r in response.context["pagina"]], [self.vieja.pk])
+        response = self.client.get(reverse("descargar_factura_final", args=[self.vieja.pk]))
+        self.assertRedirects(
+            response, "https://example.com/factura.pdf", fetch_redirect_response=False
+        )
+
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("staff_finalizados"), {"archivadas": "1"})
+        self.assertEqual([r.pk for r in response.context["pagina"]], [self.vieja.pk])
+
+
+@override_settings(REPLICA_DB="replica")
+class RouterReplicaTests(SimpleTestCase):
+    def test_solo_en_contexto_de_lectura(self):
+        router = RouterReplica()
+        self.assertIsNone(router.db_for_read(Reparacion))
+        with leer_de_replica():
+            self.assertEqual(router.db_for_read(Reparacion), "replica")
+            self.assertEqual(router.db_for_write(Reparacion), "default")
+
+
+@override_settings(REPLICA_DB="replica")
+class ReplicaTests(TestCase):
+    def test_transaccion_lee_del_primario(self):
+        # TestCase corre cada test dentro de una transacción.
+        self.assertTrue(transaction.get_connection().in_atomic_block)
+        with leer_de_replica():
+            self.assertIsNone(RouterReplica().db_for_read(Reparacion))
+
+    def test_sesion_pegada_al_primario_despues_de_escribir(self):
+        staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.client.force_login(staff)
+        self.client.post(reverse("staff_finalizar_reparacion", args=[1]))
+        self.assertIn(CLAVE_SESION, self.client.session)
+
+
+class PoolTests(TestCase):
+    def test_endpoint_solo_staff(self):
+        self.client.force_login(User.objects.create_user("cliente", password="x"))
+        self.assertRedirects(self.client.get(reverse("staff_pool")), reverse("inicio"))
+
+        self.client.force_login(User.objects.create_user("staff", password="x", is_staff=True))
+        response = self.client.get(reverse("staff_pool"))
+        # SQLite no tiene pool: la lista viene vacía.
+        self.assertEqual(response.json(), {"pools": []})
+
+
+class TableroCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.reparacion = crear_reparacion(self.cliente)
+        self.client.force_login(self.cliente)
+
+    def consultas_a_reparaciones(self):
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(reverse("inicio"))
+        # El validador del GET condicional siempre consulta reparaciones;
+        # el armado del tablero es el que trae los presupuestos.
+        tablas = [q["sql"] for q in capturadas if "reparaciones_presupuesto" in q["sql"]]
+        return response, len(tablas)
+
+    def test_segunda_visita_sale_de_cache(self):
+        self.assertGreater(self.consultas_a_reparaciones()[1], 0)
+        self.assertEqual(self.consultas_a_reparaciones()[1], 0)
+
+    def test_invalida_con_senales_y_updates_masivos(self):
+        self.consultas_a_reparaciones()
+        crear_presupuesto(self.reparacion, monto=1234)
+        response, consultas = self.consultas_a_reparaciones()
+        self.assertGreater(consultas, 0)
+        self.assertContains(response, "presupuesto-box")
+
+        cambiar_estado(Reparacion.objects.filter(pk=self.reparacion.pk), "listo_para_entregar")
+        response, _ = self.consultas_a_reparaciones()
+        self.assertContains(response, "Listo para entregar")
+
+    def test_escritura_de_otro_proceso(self):
+        self.consultas_a_reparaciones()
+        # Con LocMem, una escritura en otro worker no sube la versión de este.
+        with mock.patch("reparaciones.tablero._subir_versiones"):
+            crear_presupuesto(self.reparacion, monto=1234)
+        response, consultas = self.consultas_a_reparaciones()
+        self.assertGreater(consultas, 0)
+        self.assertContains(response, "presupuesto-box")
+
+
+class LimpiarSesionesTests(TestCase):
+    def test_borra_solo_las_vencidas(self):
+        ahora = timezone.now()
+        for i in range(3):
+            Session.objects.create(
+                session_key=f"vencida{i}", session_data="", expire_date=ahora - timedelta(days=1)
+            )
+        Session.objects.create(session_key="vigente", session_data="", expire_date=ahora + timedelta(days=1))
+
+        call_command("limpiar_sesiones", lote=2, stdout=StringIO())
+        self.assertEqual(list(Session.objects.values_list("session_key", flat=True)), ["vigente"])
+
+
+class URLsFirmadasTests(SimpleTestCase):
+    def setUp(self):
+        urls_firmadas.clear()
+        self.storage = R2Storage(
+            access_key="test",
+            secret_key="test",
+            bucket_name="taller",
+            endpoint_url="https://cuenta.r2.cloudflarestorage.com",
+            region_name="auto",
+        )
+
+    def test_reutiliza_la_firma_hasta_cerca_del_vencimiento(self):
+        url = self.storage.url("reparaciones/foto.jpg")
+        self.assertIn("Signature", url)
+        self.assertIs(self.storage.url("reparaciones/foto.jpg"), url)
+        self.assertNotEqual(self.storage.url("reparaciones/otra.jpg"), url)
+
+    def test_entrada_vencida(self):
+        urls_firmadas.set("clave", "https://ejemplo", 0)
+        self.assertIsNone(urls_firmadas.get("clave"))
+
+
+class RespuestaCondicionalTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.reparacion = crear_reparacion(self.cliente)
+        self.client.force_login(self.cliente)
+
+    def test_304_sin_cambios_y_200_despues_de_un_cambio(self):
+        url = reverse("inicio")
+        etag = self.client.get(url)["ETag"]
+        with CaptureQueriesContext(connection) as capturadas:
+            response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertFalse(
+            [q for q in capturadas if "reparaciones_presupuesto" in q["sql"]]
+        )
+
+        crear_presupuesto(self.reparacion)
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+    def test_la_fecha_sola_no_da_304(self):
+        # max(updated_at) no ve borrados ni el usuario: solo valida el ETag.
+        url = reverse("inicio")
+        self.assertNotIn("Last-Modified", self.client.get(url))
+        response = self.client.get(
+            url, headers={"if-modified-since": "Wed, 01 Jan 2099 00:00:00 GMT"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_update_masivo_cambia_el_validador(self):
+        staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.client.force_login(staff)
+        url = reverse("staff_reparacion_detalle", args=[self.reparacion.pk])
+        etag = self.client.get(url)["ETag"]
+        cambiar_estado(Reparacion.objects.filter(pk=self.reparacion.pk), "en_proceso")
+        response = self.client.get(url, headers={"if-none-match": etag})
+        self.assertEqual(response.status_code, 200)
+
+
+def foto_de_celular(ancho=1000, alto=500):
+    """JPEG apaisado con orientación EXIF 6 (se ve vertical) y GPS."""
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    exif[0x8825] = {2: (41.0, 8.0, 0.0)}
+    salida = BytesIO()
+    Image.new("RGB", (ancho, alto), "red").save(salida, "JPEG", exif=exif)
+    return SimpleUploadedFile("foto.jpg", salida.getvalue(), content_type="image/jpeg")
+
+
+@override_settings(TASKS=TAREAS_INMEDIATAS)
+class VariantesImagenTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.client.force_login(self.cliente)
+
+    def test_alta_genera_variantes_rotadas_y_sin_metadatos(self):
+        self.client.post(
+            reverse("crear_reparacion"),
+            {
+                "telefono": "2944000000",
+                "ubicacion": "Centro",
+                "tipo_equipo": "Surf",
+                "descripcion": "Golpe",
+                "imagen": foto_de_celular(),
+            },
+        )
+        reparacion = Reparacion.objects.get()
+        (variante,) = reparacion.variantes["imagen"]
+        with reparacion.imagen.storage.open(variante["jpeg"]) as archivo:
+            reducida = Image.open(archivo)
+            self.assertEqual(reducida.size, (320, 640))
+            self.assertFalse(reducida.getexif())
+
+        response = self.client.get(reverse("inicio"))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, 'loading="lazy"')
+
+    def test_backfill(self):
+        reparacion = crear_reparacion(self.cliente, imagen=foto_de_celular(2000, 1500))
+        call_command("generar_variantes", hilos=1, stdout=StringIO())
+        reparacion.refresh_from_db()
+        self.assertEqual([v["ancho"] for v in reparacion.variantes["imagen"]], [320, 640, 1280])
+
+    def archivos(self):
+        return {
+            os.path.relpath(os.path.join(raiz, nombre), self.media).replace(os.sep, "/")
+            for raiz, _, nombres in os.walk(self.media)
+            for nombre in nombres
+        }
+
+    def nombres_de_variantes(self, reparacion):
+        return {
+            variante[formato]
+            for variantes in reparacion.variantes.values()
+            for variante in variantes
+            for formato in ("webp", "jpeg")
+        }
+
+    def test_regenerar_borra_las_anteriores(self):
+        reparacion = crear_reparacion(self.cliente, imagen=foto_de_celular(2000, 1500))
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("generar_variantes", hilos=1, stdout=StringIO())
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("generar_variantes", hilos=1, todas=True, stdout=StringIO())
+        reparacion.refresh_from_db()
+        self.assertEqual(
+            self.archivos(), {reparacion.imagen.name} | self.nombres_de_variantes(reparacion)
+        )
+
+    def test_foto_cambiada_mientras_se_generan_descarta_las_nuevas(self):
+        reparacion = crear_reparacion(self.cliente, imagen=foto_de_celular())
+        original = reparacion.imagen.name
+        generar = tareas.generar_variantes
+
+        def cambiar_la_foto_en_el_medio(fila, campos):
+            nuevas = generar(fila, campos)
+            Reparacion.objects.filter(pk=fila.pk).update(imagen="reparaciones/otra.jpg")
+            return nuevas
+
+        with (
+            mock.patch.object(tareas, "generar_variantes", cambiar_la_foto_en_el_medio),
+            self.captureOnCommitCallbacks(execute=True),
+        ):
+            tareas.generar_variantes_reparacion.enqueue(reparacion.pk)
+        reparacion.refresh_from_db()
+        self.assertEqual(reparacion.variantes, {})
+        self.assertEqual(self.archivos(), {original})
+
+    def test_admin_cambia_foto_y_encola_variantes(self):
+        from .admin import ReparacionAdmin
+
+        reparacion = crear_reparacion(self.cliente, imagen=foto_de_celular())
+        with self.captureOnCommitCallbacks(execute=True):
+            tareas.generar_variantes_reparacion.enqueue(reparacion.pk)
+        reparacion.refresh_from_db()
+        anteriores = self.nombres_de_variantes(reparacion)
+        reparacion.retencion_media = {"imagen": "2024-01-01"}
+
+        reparacion.imagen = foto_de_celular(800, 400)
+        request = RequestFactory().post("/")
+        request.user = User.objects.create_superuser("staff", password="x")
+        formulario = mock.Mock(changed_data=["imagen"], initial={})
+        with self.captureOnCommitCallbacks(execute=True):
+            ReparacionAdmin(Reparacion, admin.site).save_model(
+                request, reparacion, formulario, change=True
+            )
+
+        reparacion.refresh_from_db()
+        nuevas = self.nombres_de_variantes(reparacion)
+        self.assertTrue(nuevas)
+        self.assertFalse(anteriores & self.archivos())
+        self.assertLessEqual(nuevas, self.archivos())
+        self.assertEqual(reparacion.retencion_media, {})
+
+
+@override_settings(SUBIDA_DIRECTA=True, TASKS=TAREAS_INMEDIATAS)
+class SubidaDirectaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.client.force_login(self.cliente)
+
+    def _subir(self, foto):
+        subida = self.client.post(
+            reverse("subida_firmada"),
+            {"campo": "imagen", "tipo": "image/jpeg", "tamano": foto.size},
+        ).json()
+        response = self.client.generic(
+            subida["metodo"], subida["url"], foto.read(), content_type="image/jpeg"
+        )
+        self.assertEqual(response.status_code, 201)
+        return subida["clave"]
+
+    def _crear(self, clave):
+        return self.client.post(
+            reverse("crear_reparacion"),
+            {
+                "telefono": "2944000000",
+                "ubicacion": "Centro",
+                "tipo_equipo": "Surf",
+                "descripcion": "Golpe",
+                "imagen_clave": clave,
+            },
+        )
+
+    def test_el_formulario_manda_solo_la_clave(self):
+        clave = self._subir(foto_de_celular())
+        self.assertRedirects(self._crear(clave), reverse("inicio"), fetch_redirect_response=False)
+        reparacion = Reparacion.objects.get()
+        self.assertEqual(reparacion.imagen.name, clave)
+        self.assertTrue(reparacion.variantes["imagen"])
+
+    def test_rechaza_claves_ajenas_o_inexistentes(self):
+        clave = self._subir(foto_de_celular())
+        otro = User.objects.create_user("otro", password="x")
+        self.client.force_login(otro)
+        self.assertEqual(self._crear(clave).status_code, 200)
+        self.assertEqual(self._crear(clave.replace(f"/{self.cliente.pk}/", f"/{otro.pk}/")).status_code, 200)
+        self.assertFalse(Reparacion.objects.exists())
+
+    def test_rechaza_videos_demasiado_grandes(self):
+        response = self.client.post(
+            reverse("subida_firmada"),
+            {"campo": "video", "tipo": "video/mp4", "tamano": 151 * 1024 * 1024},
+        )
+        self.assertEqual(response.status_code, 400)
+
+    @override_settings(SUBIDA_PARTE_MB=1)
+    def test_reanudable_reenvia_solo_las_partes_que_faltan(self):
+        video = bytes(range(256)) * 6144  # 1,5 MB: dos partes
+        subida = self.client.post(
+            reverse("subida_reanudable_crear"),
+            {"campo": "video", "tipo": "video/mp4", "tamano": len(video)},
+        ).json()
+        url = reverse("subida_reanudable", args=[subida["id"]])
+        primera, segunda = subida["pendientes"]
+        self.client.generic("PUT", primera["url"], video[: 1024 * 1024])
+
+        # Se cortó la conexión: al retomar solo falta la segunda parte.
+        estado = self.client.get(url).json()
+        self.assertEqual(estado["recibido"], 1024 * 1024)
+        self.assertEqual([p["numero"] for p in estado["pendientes"]], [2])
+        self.assertEqual(self.client.post(url).status_code, 409)
+
+        self.client.generic("PUT", estado["pendientes"][0]["url"], video[1024 * 1024 :])
+        clave = self.client.post(url).json()["clave"]
+        self.client.post(
+            reverse("crear_reparacion"),
+            {
+                "telefono": "2944000000",
+                "ubicacion": "Centro",
+                "tipo_equipo": "Surf",
+                "descripcion": "Golpe",
+                "imagen": foto_de_celular(),
+                "video_clave": clave,
+            },
+        )
+        reparacion = Reparacion.objects.get()
+        self.assertEqual(reparacion.video.name, clave)
+        with reparacion.video.open("rb") as archivo:
+            self.assertEqual(archivo.read(), video)
+
+    @override_settings(SUBIDA_PARTE_MB=1)
+    def test_limpiar_subidas_vencidas(self):
+        subida = self.client.post(
+            reverse("subida_reanudable_crear"),
+            {"campo": "video", "tipo": "video/mp4", "tamano": 2 * 1024 * 1024},
+        ).json()
+        self.client.generic("PUT", subida["pendientes"][0]["url"], b"x" * 1024 * 1024)
+        self.assertTrue(os.listdir(os.path.join(self.media, "subidas_parciales", subida["id"])))
+
+        SubidaReanudable.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        call_command("limpiar_subidas", stdout=StringIO())
+        self.assertFalse(SubidaReanudable.objects.exists())
+        self.assertFalse(os.listdir(os.path.join(self.media, "subidas_parciales", subida["id"])))
+
+    def test_put_prefirmado_firma_tipo_y_tamano(self):
+        storage = R2Storage(
+            access_key="test",
+            secret_key="test",
+            bucket_name="taller",
+            endpoint_url="https://cuenta.r2.cloudflarestorage.com",
+            region_name="auto",
+        )
+        subida = preparar_subida(self.cliente, "video", "video/mp4", 1000, storage=storage)
+        self.assertEqual(subida["metodo"], "PUT")
+        self.assertIn("content-length%3Bcontent-type", subida["url"])
+
+
+class EntregaArchivosTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.presupuesto = crear_presupuesto(crear_reparacion(self.cliente))
+        self.client.force_login(self.cliente)
+        self.url = reverse("descargar_presupuesto", args=[self.presupuesto.pk])
+
+    @override_settings(ENTREGA_ARCHIVOS="x-accel")
+    def test_x_accel_redirect_sin_cuerpo(self):
+        response = self.client.get(self.url)
+        self.assertEqual(
+            response["X-Accel-Redirect"], "/media-protegida/reparaciones/presupuestos/test.pdf"
+        )
+        self.assertEqual(response["Content-Disposition"], 'inline; filename="test.pdf"')
+        self.assertEqual(response.content, b"")
+
+    def test_r2_redirige_a_url_prefirmada(self):
+        storages = {
+            "default": {
+                "BACKEND": "reparaciones.storage.R2Storage",
+                "OPTIONS": {
+                    "access_key": "test",
+                    "secret_key": "test",
+                    "bucket_name": "taller",
+                    "endpoint_url": "https://cuenta.r2.cloudflarestorage.com",
+                    "region_name": "auto",
+                    "custom_domain": "media.ejemplo.com",
+                },
+            },
+            "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+        }
+        with override_settings(STORAGES=storages):
+            response = self.client.get(self.url, {"download": "1"})
+        self.assertEqual(response.status_code, 302)
+        self.assertIn("cloudflarestorage.com", response["Location"])
+        self.assertIn("response-content-disposition=attachment", response["Location"])
+        self.assertIn("Signature", response["Location"])
+
+    def test_sin_permiso_no_entrega(self):
+        self.client.force_login(User.objects.create_user("otro", password="x"))
+        self.assertRedirects(self.client.get(self.url), reverse("inicio"), fetch_redirect_response=False)
+
+
+class LimiteSubidaTests(TestCase):
+    def setUp(self):
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.reparacion = crear_reparacion(self.staff)
+        self.client.force_login(self.staff)
+
+    def test_corta_el_archivo_que_supera_el_limite_del_campo(self):
+        url = reverse("staff_cargar_presupuesto", args=[self.reparacion.pk])
+        archivo = SimpleUploadedFile("presupuesto.pdf", b"x" * (MB + MB // 2))
+        with mock.patch.dict(LIMITES_PRESUPUESTO, {"archivo_presupuesto": (1 * MB, None)}):
+            response = self.client.post(url, {"archivo_presupuesto": archivo, "monto": "10"})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        mensajes = [str(m) for m in get_messages(response.wsgi_request)]
+        self.assertIn("supera el máximo permitido (1MB)", mensajes[0])
+        self.assertFalse(Presupuesto.objects.exists())
+
+    def test_extension_no_permitida(self):
+        response = self.client.post(
+            reverse("crear_reparacion"),
+            {
+                "telefono": "2944000000",
+                "ubicacion": "Centro",
+                "tipo_equipo": "Surf",
+                "descripcion": "Golpe",
+                "imagen": SimpleUploadedFile("foto.bmp", b"BM"),
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Reparacion.objects.count(), 1)
+
+    def test_content_length_excedido_no_lee_el_cuerpo(self):
+        request = RequestFactory().post("/")
+        handler = LimiteSubidaHandler(request, LIMITES_FACTURA)
+        post, files = handler.handle_raw_input(None, {}, 500 * MB, b"borde")
+        self.assertFalse(post or files)
+        self.assertIn("supera el máximo permitido (21MB)", handler.error)
+
+
+@override_settings(TASKS=TAREAS_INMEDIATAS)
+class MediaDeduplicadaTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        ajustes = override_settings(
+            STORAGES={
+                "default": {
+                    "BACKEND": "reparaciones.dedup.AlmacenDeduplicado",
+                    "OPTIONS": {
+                        "backend": "django.core.files.storage.FileSystemStorage",
+                        "options": {"location": media},
+                    },
+                },
+                "staticfiles": {
+                    "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"
+                },
+            }
+        )
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.media = media
+        self.staff = User.objects.create_user("staff", password="x", is_staff=True)
+        self.reparacion = crear_reparacion(self.staff)
+        self.client.force_login(self.staff)
+
+    def _cargar(self):
+        self.client.post(
+            reverse("staff_cargar_presupuesto", args=[self.reparacion.pk]),
+            {"archivo_presupuesto": SimpleUploadedFile("presupuesto.pdf", b"%PDF-1.4 mismo"), "moneda": "ARS"},
+        )
+        return Presupuesto.objects.latest("pk")
+
+    def test_mismo_archivo_se_guarda_una_vez_y_se_borra_sin_referencias(self):
+        primero, segundo = self._cargar(), self._cargar()
+        self.assertRegex(
+            primero.archivo_presupuesto.name, r"^reparaciones/presupuestos/[0-9a-f]{32}/presupuesto.pdf$"
+        )
+        blob = BlobMedia.objects.get()
+        self.assertEqual(blob.referencias, 2)
+        with primero.archivo_presupuesto.open("rb") as archivo:
+            self.assertEqual(archivo.read(), b"%PDF-1.4 mismo")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            primero.delete()
+        self.assertTrue(os.path.exists(os.path.join(self.media, blob.nombre)))
+        with self.captureOnCommitCallbacks(execute=True):
+            segundo.delete()
+        self.assertFalse(BlobMedia.objects.exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media, blob.nombre)))
+
+    def test_url_local_es_el_nombre_logico_y_los_blobs_no_se_sirven(self):
+        presupuesto = self._cargar()
+        url = presupuesto.archivo_presupuesto.url
+        self.assertEqual(url, "/media/" + presupuesto.archivo_presupuesto.name)
+        response = self.client.get(url)
+        self.assertEqual(b"".join(response.streaming_content), b"%PDF-1.4 mismo")
+
+        blob = BlobMedia.objects.get().nombre
+        self.assertEqual(self.client.get("/media/" + blob).status_code, 404)
+        self.client.logout()
+        for ruta in (url, "/media/" + blob, "/media/reparaciones/../" + blob):
+            self.assertEqual(self.client.get(ruta).status_code, 404, ruta)
+
+    def test_nombre_inventado_con_el_digest_no_lleva_al_blob(self):
+        presupuesto = self._cargar()
+        digest = presupuesto.archivo_presupuesto.name.split("/")[-2]
+        inventados = [
+            f"/media/reparaciones/{digest}/x.pdf",
+            f"/media/reparaciones/videos/{digest}/presupuesto.pdf",
+            f"/media/reparaciones/presupuestos/{digest}/otro.pdf",
+        ]
+        for ruta in inventados:
+            self.assertEqual(self.client.get(ruta).status_code, 404, ruta)
+        self.client.logout()
+        for ruta in inventados:
+            self.assertEqual(self.client.get(ruta).status_code, 404, ruta)
+
+    def test_reemplazar_el_archivo_libera_el_anterior(self):
+        presupuesto = self._cargar()
+        viejo = BlobMedia.objects.get().nombre
+        presupuesto = Presupuesto.objects.get(pk=presupuesto.pk)
+        presupuesto.archivo_presupuesto = SimpleUploadedFile("presupuesto.pdf", b"%PDF-1.4 otro")
+        with self.captureOnCommitCallbacks(execute=True):
+            presupuesto.save()
+        self.assertEqual(
+            list(BlobMedia.objects.values_list("referencias", flat=True)), [1]
+        )
+        self.assertFalse(BlobMedia.objects.filter(pk=viejo).exists())
+        self.assertFalse(os.path.exists(os.path.join(self.media, viejo)))
+
+    def test_recolector_mira_las_filas_y_no_el_contador(self):
+        usado, perdido = self._cargar(), self._cargar()
+        Presupuesto.objects.filter(pk=perdido.pk).update(archivo_presupuesto="")
+        # Un blob con contador pero sin filas que lo nombren.
+        huerfano = default_storage.save(
+            "reparaciones/presupuestos/huerfano.pdf", ContentFile(b"%PDF-1.4 huerfano")
+        )
+        blob = dedup.nombre_blob(huerfano)
+
+        list(recolectar_huerfanos(default_storage, antes_de=timezone.now() + timedelta(hours=1)))
+        self.assertFalse(os.path.exists(os.path.join(self.media, blob)))
+        self.assertFalse(BlobMedia.objects.filter(pk=blob).exists())
+        with usado.archivo_presupuesto.open("rb") as archivo:
+            self.assertEqual(archivo.read(), b"%PDF-1.4 mismo")
+
+    def test_recolector_llega_a_las_variantes_por_el_nombre_de_la_foto(self):
+        reparacion = crear_reparacion(self.staff, imagen=foto_de_celular())
+        with self.captureOnCommitCallbacks(execute=True):
+            tareas.generar_variantes_reparacion.enqueue(reparacion.pk)
+        reparacion.refresh_from_db()
+        variante = reparacion.variantes["imagen"][0]["webp"]
+        self.assertRegex(
+            variante, rf"^{reparacion.imagen.name[:-len('foto.jpg')]}[0-9a-f]{{32}}/foto.jpg__320w.webp$"
+        )
+        suelta = default_storage.save("reparaciones/suelta.jpg__320w.webp", ContentFile(b"x"))
+
+        with CaptureQueriesContext(connection) as consultas:
+            list(recolectar_huerfanos(default_storage, antes_de=timezone.now() + timedelta(hours=1)))
+        self.assertFalse(any("LIKE" in consulta["sql"] for consulta in consultas))
+        self.assertTrue(default_storage.exists(variante))
+        self.assertTrue(default_storage.exists(reparacion.imagen.name))
+        self.assertFalse(default_storage.exists(suelta))
+
+    @override_settings(MEDIA_RETENCION=[{"accion": "sin_video", "dias": 90}])
+    def test_retencion_libera_cada_archivo_una_vez(self):
+        entregada = crear_reparacion(
+            self.staff, estado="finalizado", video=SimpleUploadedFile("video.mp4", b"v" * 64)
+        )
+        crear_reparacion(self.staff, video=SimpleUploadedFile("video.mp4", b"v" * 64))
+        Reparacion.objects.filter(pk=entregada.pk).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+        blob = dedup.nombre_blob(entregada.video.name)
+        self.assertEqual(BlobMedia.objects.get(pk=blob).referencias, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("aplicar_retencion", stdout=StringIO())
+        self.assertEqual(BlobMedia.objects.get(pk=blob).referencias, 1)
+
+    def test_archivar_no_libera_y_los_nombres_viejos_siguen_andando(self):
+        presupuesto = self._cargar()
+        viejo = crear_presupuesto(self.reparacion)
+        self.assertEqual(viejo.archivo_presupuesto.url, "/media/reparaciones/presupuestos/test.pdf")
+        cambiar_estado(Reparacion.objects.filter(pk=self.reparacion.pk), "finalizado")
+        call_command("archivar_reparaciones", meses=0, stdout=StringIO())
+        self.assertFalse(Presupuesto.objects.filter(pk=presupuesto.pk).exists())
+        self.assertEqual(BlobMedia.objects.get().referencias, 1)
+
+
+class RangosTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.datos = bytes(range(256)) * 4
+        for ruta in ("reparaciones/videos/video.mp4", "reparaciones/presupuestos/test.pdf"):
+            os.makedirs(os.path.dirname(os.path.join(self.media, ruta)), exist_ok=True)
+            with open(os.path.join(self.media, ruta), "wb") as archivo:
+                archivo.write(self.datos)
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.presupuesto = crear_presupuesto(crear_reparacion(self.cliente))
+
+    def test_un_tramo_varios_y_fuera_de_rango(self):
+        url = "/media/reparaciones/videos/video.mp4"
+        response = self.client.get(url, headers={"range": "bytes=100-199"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response["Content-Range"], "bytes 100-199/1024")
+        self.assertEqual(b"".join(response.streaming_content), self.datos[100:200])
+
+        response = self.client.get(url, headers={"range": "bytes=0-9,-5"})
+        self.assertEqual(response.status_code, 206)
+        self.assertTrue(response["Content-Type"].startswith("multipart/byteranges; boundary="))
+        cuerpo = b"".join(response.streaming_content)
+        self.assertEqual(int(response["Content-Length"]), len(cuerpo))
+        self.assertIn(b"Content-Range: bytes 1019-1023/1024\r\n\r\n" + self.datos[-5:], cuerpo)
+
+        self.assertEqual(self.client.get(url, headers={"range": "bytes=5000-"}).status_code, 416)
+        response = self.client.get(
+            url, headers={"range": "bytes=0-9", "if-range": "Wed, 21 Oct 2015 07:28:00 GMT"}
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_presupuestos_solo_para_el_duenio_y_staff(self):
+        url = "/media/reparaciones/presupuestos/test.pdf"
+        self.assertEqual(self.client.get(url).status_code, 404)
+        self.client.force_login(User.objects.create_user("otro", password="x"))
+        self.assertEqual(self.client.get(url).status_code, 404)
+
+        self.client.force_login(self.cliente)
+        response = self.client.get(url, headers={"range": "bytes=0-3"})
+        self.assertEqual(response.status_code, 206)
+        response = self.client.get(
+            reverse("descargar_presupuesto", args=[self.presupuesto.pk]),
+            headers={"range": "bytes=-4"},
+        )
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), self.datos[-4:])
+
+
+class ExportacionZipTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        for ruta in (
+            "reparaciones/test.jpg",
+            "reparaciones/presupuestos/test.pdf",
+            "reparaciones/facturas_finales/factura.pdf",
+        ):
+            os.makedirs(os.path.dirname(os.path.join(self.media, ruta)), exist_ok=True)
+            with open(os.path.join(self.media, ruta), "wb") as archivo:
+                archivo.write(ruta.encode() * 1000)
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.reparacion = crear_reparacion(self.cliente, video="reparaciones/videos/falta.mp4")
+        crear_presupuesto(self.reparacion)
+        self.factura = FacturaFinal.objects.create(
+            reparacion=self.reparacion,
+            archivo_factura="reparaciones/facturas_finales/factura.pdf",
+        )
+
+    def test_exporta_una_reparacion_en_stream(self):
+        self.client.force_login(User.objects.create_user("staff", password="x", is_staff=True))
+        response = self.client.get(reverse("staff_exportar_zip"), {"reparacion": self.reparacion.pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/zip")
+
+        zf = zipfile.ZipFile(BytesIO(b"".join(response.streaming_content)))
+        carpeta = f"reparacion_{self.reparacion.pk}"
+        presupuesto = self.reparacion.presupuestos.get()
+        self.assertEqual(
+            sorted(zf.namelist()),
+            [
+                "FALTANTES.txt",
+                f"{carpeta}/factura_factura.pdf",
+                f"{carpeta}/imagen.jpg",
+                f"{carpeta}/presupuestos/{presupuesto.pk}_test.pdf",
+            ],
+        )
+        self.assertEqual(zf.read(f"{carpeta}/imagen.jpg"), b"reparaciones/test.jpg" * 1000)
+        self.assertEqual(zf.read("FALTANTES.txt"), b"reparaciones/videos/falta.mp4\n")
+
+        self.client.force_login(self.cliente)
+        response = self.client.get(reverse("staff_exportar_zip"), {"reparacion": self.reparacion.pk})
+        self.assertRedirects(response, reverse("inicio"), fetch_redirect_response=False)
+
+    def test_comando_exporta_facturas_del_periodo(self):
+        salida = os.path.join(self.media, "facturas.zip")
+        hoy = timezone.localdate()
+        call_command(
+            "exportar_zip", desde=str(hoy), hasta=str(hoy), salida=salida, stdout=StringIO()
+        )
+        with zipfile.ZipFile(salida) as zf:
+            self.assertEqual(
+                zf.namelist(),
+                [f"facturas/{hoy:%Y-%m-%d}_reparacion_{self.reparacion.pk}_factura.pdf"],
+            )
+
+
+    def test_fecha_inexistente(self):
+        self.client.force_login(User.objects.create_user("staff", password="x", is_staff=True))
+        response = self.client.get(
+            reverse("staff_exportar_zip"), {"desde": "2024-02-30", "hasta": "2024-03-01"}
+        )
+        self.assertRedirects(response, reverse("staff_finalizados"), fetch_redirect_response=False)
+        with self.assertRaises(CommandError):
+            call_command(
+                "exportar_zip",
+                desde="2024-02-30",
+                hasta="2024-03-01",
+                salida=os.path.join(self.media, "x.zip"),
+            )
+
+class MediaHuerfanaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cliente = User.objects.create_user("cliente", password="x")
+        crear_reparacion(
+            cliente,
+            imagen="reparaciones/foto.jpg",
+            imagen2="reparaciones/otra.png",
+            variantes={
+                # Nombre anterior, sin la extensión de la foto.
+                "imagen": [
+                    {
+                        "ancho": 320,
+                        "webp": "reparaciones/foto__320w.webp",
+                        "jpeg": "reparaciones/foto__320w.jpg",
+                    }
+                ],
+                "imagen2": [
+                    {
+                        "ancho": 320,
+                        "webp": "reparaciones/otra.png__320w_AbC1234.webp",
+                        "jpeg": "reparaciones/otra.png__320w.jpg",
+                    }
+                ],
+            },
+        )
+        self.archivos = {
+            "reparaciones/foto.jpg": True,
+            "reparaciones/foto__320w.webp": True,
+            "reparaciones/foto__320w.jpg": True,
+            "reparaciones/otra.png": True,
+            "reparaciones/otra.png__320w_AbC1234.webp": True,
+            "reparaciones/otra.png__320w.jpg": True,
+            "reparaciones/otra.png__320w.webp": False,
+            "reparaciones/vieja__320w.webp": False,
+            "reparaciones/presupuestos/borrado.pdf": False,
+            "reparaciones/facturas_finales/reemplazada.pdf": False,
+        }
+        hace_una_semana = (timezone.now() - timedelta(days=7)).timestamp()
+        for ruta in [*self.archivos, "reparaciones/videos/subiendo.mp4"]:
+            absoluta = os.path.join(self.media, ruta)
+            os.makedirs(os.path.dirname(absoluta), exist_ok=True)
+            with open(absoluta, "wb") as archivo:
+                archivo.write(b"x" * 10)
+            if ruta in self.archivos:
+                os.utime(absoluta, (hace_una_semana, hace_una_semana))
+
+    def existe(self, ruta):
+        return os.path.exists(os.path.join(self.media, ruta))
+
+    def test_borra_solo_lo_no_referenciado_fuera_de_la_gracia(self):
+        salida = StringIO()
+        call_command("limpiar_media_huerfana", simular=True, lote=2, stdout=salida)
+        self.assertIn("Listo: 4 de 11 archivos se borrarían", salida.getvalue())
+        self.assertTrue(all(self.existe(ruta) for ruta in self.archivos))
+
+        call_command("limpiar_media_huerfana", lote=2, stdout=StringIO())
+        for ruta, referenciado in self.archivos.items():
+            self.assertEqual(self.existe(ruta), referenciado, ruta)
+        # Más nuevo que MEDIA_HUERFANOS_GRACIA_HORAS: puede ser una subida en curso.
+        self.assertTrue(self.existe("reparaciones/videos/subiendo.mp4"))
+
+
+class RetencionMediaTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        ajustes = override_settings(MEDIA_ROOT=self.media)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        cache.clear()
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.reparacion = crear_reparacion(
+            self.cliente,
+            estado="finalizado",
+            imagen=foto_de_celular(2000, 1500),
+            video=SimpleUploadedFile("video.mp4", b"v" * 2048),
+        )
+        Reparacion.objects.filter(pk=self.reparacion.pk).update(
+            created_at=timezone.now() - timedelta(days=400)
+        )
+        self.original = self.reparacion.imagen.name
+        self.video = self.reparacion.video.name
+
+    def existe(self, nombre):
+        return os.path.exists(os.path.join(self.media, nombre))
+
+    def test_borra_video_y_deja_miniatura(self):
+        salida = StringIO()
+        call_command("aplicar_retencion", simular=True, stdout=salida)
+        self.assertIn("sin_video: 1 reparaciones, 0.0MB se liberarían.", salida.getvalue())
+        self.assertTrue(self.existe(self.video))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command("aplicar_retencion", stdout=StringIO())
+        reparacion = Reparacion.objects.get()
+        self.assertFalse(reparacion.video)
+        self.assertFalse(self.existe(self.video))
+        self.assertFalse(self.existe(self.original))
+        (miniatura,) = reparacion.variantes["imagen"]
+        self.assertEqual(reparacion.imagen.name, miniatura["jpeg"])
+        self.assertTrue(self.existe(miniatura["webp"]))
+        self.assertEqual(set(reparacion.retencion_media), {"video", "imagen"})
+
+        self.client.force_login(self.cliente)
+        self.assertContains(self.client.get(reverse("inicio")), "Video eliminado por antigüedad")
+        # Ya aplicada: una segunda pasada no encuentra nada.
+        salida = StringIO()
+        call_command("aplicar_retencion", stdout=salida)
+        self.assertIn("Listo: 0.0MB liberados.", salida.getvalue())
+
+
+COLA_EN_BASE = {
+    "default": {
+        "BACKEND": "reparaciones.cola.BaseDeDatosBackend",
+        "OPTIONS": {"INTENTOS": 2, "ESPERA_SEGUNDOS": 0},
+    }
+}
+
+
+@mock.patch.dict(os.environ, {"TALLER_NOTIFY_EMAIL": "taller@example.com"})
+class TareasTests(TestCase):
+    def setUp(self):
+        self.cliente = User.objects.create_user("cliente", password="x")
+        self.presupuesto = crear_presupuesto(crear_reparacion(self.cliente))
+        self.client.force_login(self.cliente)
+
+    def aceptar(self):
+        return self.client.post(reverse("aceptar_presupuesto", args=[self.presupuesto.pk]))
+
+    @override_settings(TASKS=TAREAS_INMEDIATAS)
+    def test_backend_inmediato_envia_en_el_request(self):
+        self.aceptar()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn(f"Reparación #{self.presupuesto.reparacion_id}", mail.outbox[0].subject)
+
+    @override_settings(TASKS=COLA_EN_BASE)
+    def test_cola_en_base_con_reintento(self):
+        self.aceptar()
+        self.assertEqual(mail.outbox, [])
+        tarea = TareaEncolada.objects.get()
+        self.assertEqual(tarea.estado, TaskResultStatus.READY)
+
+        with (
+            mock.patch.object(tareas, "send_mail", side_effect=[SMTPException("caído"), 1]),
+            self.assertLogs("reparaciones.cola", "ERROR"),
+        ):
+            call_command("procesar_tareas", hasta_vaciar=True, stdout=StringIO())
+
+        resultado = tareas.notificar_presupuesto_aprobado.get_result(tarea.pk)
+        self.assertEqual(resultado.status, TaskResultStatus.SUCCESSFUL)
+        self.assertEqual(resultado.attempts, 2)
+        self.assertEqual(resultado.errors[0].exception_class, SMTPException)
+        # El hook del proveedor externo se encoló desde la tarea y también corrió.
+        self.assertEqual(
+            TareaEncolada.objects.filter(estado=TaskResultStatus.SUCCESSFUL).count(), 2
+        )
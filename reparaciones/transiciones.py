@@ -0,0 +1,120 @@
+from django.db import connections, router, transaction
+from django.db.models import Subquery
+from django.utils import timezone
+
+from .models import ESTADOS, Reparacion, TransicionEstado
+from .tablero import invalidar_tableros
+
+
+def cambiar_estado(queryset, estado, usuario=None, origen=""):
+    """
+    Pasa a `estado` las reparaciones de `queryset` y registra una transición
+    por cada una que efectivamente cambió, todo en un UPDATE y un INSERT.
+
+    Devuelve la cantidad de reparaciones que cambiaron.
+    """
+    with transaction.atomic():
+        anteriores = list(
+            Reparacion.objects.filter(pk__in=Subquery(queryset.values("pk")))
+            .exclude(estado=estado)
+            .select_for_update()
+            .values_list("pk", "estado", "usuario_id")
+        )
+        if not anteriores:
+            return 0
+        ahora = timezone.now()
+        Reparacion.objects.filter(pk__in=[pk for pk, _, _ in anteriores]).update(
+            estado=estado, updated_at=ahora
+        )
+        # update() no dispara post_save: se invalida a mano.
+        invalidar_tableros(usuario_id for _, _, usuario_id in anteriores)
+        TransicionEstado.objects.bulk_create(
+            TransicionEstado(
+                reparacion_id=pk,
+                estado_anterior=anterior,
+                estado_nuevo=estado,
+                fecha=ahora,
+                usuario=usuario,
+                origen=origen,
+            )
+            for pk, anterior, _ in anteriores
+        )
+    return len(anteriores)
+
+
+def registrar_transicion(reparacion, estado_anterior, usuario=None, origen=""):
+    """Para cuando el estado ya se guardó por otro camino (alta, form del admin)."""
+    return TransicionEstado.objects.create(
+        reparacion=reparacion,
+        estado_anterior=estado_anterior or "",
+        estado_nuevo=reparacion.estado,
+        usuario=usuario,
+        origen=origen,
+    )
+
+
+def _segundos_entre(vendor, desde, hasta):
+    if vendor == "postgresql":
+        return f"EXTRACT(EPOCH FROM ({hasta} - {desde}))"
+    if vendor == "sqlite":
+        return f"(julianday({hasta}) - julianday({desde})) * 86400.0"
+    return f"TIMESTAMPDIFF(MICROSECOND, {desde}, {hasta}) / 1000000.0"
+
+
+def tiempos_por_estado(desde=None):
+    """
+    Percentiles p50/p90 (nearest-rank) de cuánto dura cada estado, calculados
+    en la base con LEAD() y CUME_DIST(). Solo cuenta estadías terminadas: el
+    estado actual de cada reparación todavía no tiene duración.
+
+    Devuelve una lista de dicts {estado, cantidad, p50, p90} en segundos,
+    en el orden de ESTADOS.
+    """
+    tabla = TransicionEstado._meta.db_table
+    # SQL crudo: se pide la conexión al router para respetar la réplica.
+    connection = connections[router.db_for_read(TransicionEstado)]
+    filtro = "WHERE fecha >= %s" if desde else ""
+    params = [desde] if desde else []
+    sql = f"""
+        WITH tramos AS (
+            SELECT estado_nuevo AS estado,
+                   LEAD(fecha) OVER (
+                       PARTITION BY reparacion_id ORDER BY fecha, id
+                   ) AS siguiente,
+                   fecha
+            FROM {tabla}
+            {filtro}
+        ),
+        duraciones AS (
+            SELECT estado, {_segundos_entre(connection.vendor, "fecha", "siguiente")} AS segundos
+            FROM tramos
+            WHERE siguiente IS NOT NULL
+        ),
+        ordenadas AS (
+            SELECT estado,
+                   segundos,
+                   CUME_DIST() OVER (PARTITION BY estado ORDER BY segundos) AS acumulado
+            FROM duraciones
+        )
+        SELECT estado,
+               COUNT(*),
+               MIN(CASE WHEN acumulado >= 0.5 THEN segundos END),
+               MIN(CASE WHEN acumulado >= 0.9 THEN segundos END)
+        FROM ordenadas
+        GROUP BY estado
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        filas = {estado: (cantidad, p50, p90) for estado, cantidad, p50, p90 in cursor.fetchall()}
+
+    return [
+        {
+            "estado": clave,
+            "etiqueta": etiqueta,
+            "cantidad": filas[clave][0],
+            "p50": float(filas[clave][1]),
+            "p90": float(filas[clave][2]),
+        }
+        for clave, etiqueta in ESTADOS
+        if clave in filas
+    ]
@@ -4,6 +4,19 @@ from . import views
 urlpatterns = [
     path('', views.inicio, name='inicio'),
     path('crear/', views.crear_reparacion, name='crear_reparacion'),
+    path('subidas/firmar/', views.subida_firmada, name='subida_firmada'),
+    path(
+        'subidas/reanudables/',
+        views.subida_reanudable_crear,
+        name='subida_reanudable_crear',
+    ),
+    path(
+        'subidas/reanudables/<uuid:subida_id>/',
+        views.subida_reanudable,
+        name='subida_reanudable',
+    ),
+    path('subidas/partes/<str:token>/', views.subida_parte_local, name='subida_parte_local'),
+    path('subidas/<str:token>/', views.subida_local, name='subida_local'),
     path('registrar/', views.registrar, name='registrar'),
     path('staff/reparaciones/', views.staff_reparaciones, name='staff_reparaciones'),
     path(
@@ -32,6 +45,11 @@ urlpatterns = [
         name='staff_factura_final',
     ),
     path('staff/finalizados/', views.staff_finalizados, name='staff_finalizados'),
+    path('staff/buscar/', views.staff_buscar, name='staff_buscar'),
+    path('staff/estadisticas/', views.staff_estadisticas, name='staff_estadisticas'),
+    path('staff/tiempos/', views.staff_tiempos, name='staff_tiempos'),
+    path('staff/pool/', views.staff_pool, name='staff_pool'),
+    path('staff/exportar/', views.staff_exportar_zip, name='staff_exportar_zip'),
     path(
         'staff/reparaciones/<int:reparacion_id>/reabrir/',
         views.staff_reabrir_reparacion,
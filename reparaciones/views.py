@@ -1,10 +1,20 @@
-import mimetypes
-import os
+from datetime import timedelta
+import posixpath
 
 from django.conf import settings
-from django.core.mail import send_mail
-from django.http import FileResponse, HttpResponseNotAllowed
+from django.core.paginator import Paginator
+from django.core.exceptions import ValidationError
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.http import (
+    Http404,
+    HttpResponse,
+    HttpResponseNotAllowed,
+    JsonResponse,
+    StreamingHttpResponse,
+)
 from django.shortcuts import get_object_or_404, render, redirect
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import login
@@ -13,72 +23,116 @@ from django.contrib import messages
 import logging
 from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_date
+from django.utils.http import content_disposition_header
+from django.utils.safestring import mark_safe
+from django.views.decorators.csrf import csrf_exempt
 
 from .forms import FacturaFinalForm, PresupuestoForm, RegistroForm, ReparacionForm
-from django.db.models import Prefetch
-
-from .models import FacturaFinal, Presupuesto, Reparacion
+from django.db.models import Count, Max, Prefetch, Sum
+
+from .archivo import reparaciones_archivadas
+from .busqueda import buscar_reparaciones
+from .condicional import respuesta_condicional, validador_del_request
+from .dedup import CARPETA_BLOBS, ubicar
+from .entrega import entregar, entregar_archivo
+from .exportacion import entradas_de_facturas, entradas_de_reparacion, zip_en_stream
+from .huerfanos import referenciados
+from .limite_consultas import limite_consultas
+from .limite_subida import MB, limite_subida
+from .models import (
+    MAX_FACTURA_MB,
+    MAX_PRESUPUESTO_MB,
+    FacturaFinal,
+    FacturaFinalArchivada,
+    Presupuesto,
+    PresupuestoArchivado,
+    Reparacion,
+    ReparacionArchivada,
+    ResumenMensual,
+    SubidaReanudable,
+)
+from .paginacion import paginar_reparaciones
+from .pool import estadisticas_pool
+from .replica import lectura_en_replica
+from .subidas import (
+    SAL_PARTE,
+    completar_reanudable,
+    estado_reanudable,
+    guardar_parte_local,
+    iniciar_reanudable,
+    leer_token_local,
+    preparar_subida,
+)
+from .tablero import clave_tablero, guardar_tablero, obtener_tablero
+from .tareas import generar_variantes_reparacion, notificar_presupuesto_aprobado
+from .transiciones import cambiar_estado, registrar_transicion, tiempos_por_estado
 
 logger = logging.getLogger(__name__)
 
 
 def _notify_taller_presupuesto_aprobado(request, presupuesto):
-    destinatario = os.environ.get("TALLER_NOTIFY_EMAIL", "").strip()
-    if not destinatario:
-        logger.info("TALLER_NOTIFY_EMAIL no configurado; se omite el envío.")
-        return
-
-    usuario = presupuesto.reparacion.usuario
-    monto = ""
-    if presupuesto.monto is not None:
-        monto = f"{presupuesto.moneda} {presupuesto.monto}"
+    # El mail sale desde la cola: un SMTP lento no demora la respuesta.
     admin_url = request.build_absolute_uri(
         reverse("admin:reparaciones_presupuesto_change", args=[presupuesto.pk])
     )
-    subject = f"✅ Presupuesto aprobado — Reparación #{presupuesto.reparacion_id}"
-    body = "\n".join(
-        [
-            f"Usuario: {usuario.username if usuario else '—'}",
-            f"Reparación: #{presupuesto.reparacion_id}",
-            f"Presupuesto: #{presupuesto.pk}",
-            f"Monto: {monto or '—'}",
-            f"Admin: {admin_url}",
-        ]
-    )
-    send_mail(
-        subject=subject,
-        message=body,
-        from_email=getattr(settings, "DEFAULT_FROM_EMAIL", "no-reply@example.com"),
-        recipient_list=[destinatario],
-        fail_silently=True,
-    )
-    _notify_taller_proveedor_externo(presupuesto)
-
-
-def _notify_taller_proveedor_externo(presupuesto):
-    """Hook para integrar WhatsApp/SMS en el futuro."""
-    return
+    notificar_presupuesto_aprobado.enqueue(presupuesto.pk, admin_url)
 
 # -----------------------------
 # Dashboard / Inicio
 # -----------------------------
+def _validar(queryset, campo="updated_at"):
+    datos = queryset.order_by().aggregate(cantidad=Count("pk"), ultima=Max(campo))
+    return datos["cantidad"], datos["ultima"]
+
+
+def _validar_inicio(request):
+    if _ver_archivadas(request):
+        return _validar(
+            ReparacionArchivada.objects.filter(usuario=request.user), "archivado_en"
+        )
+    return _validar(Reparacion.objects.filter(usuario=request.user))
+
+
 @login_required
+@limite_consultas(3)
+@respuesta_condicional(_validar_inicio)
 def inicio(request):
-    reparaciones = Reparacion.objects.filter(
-        usuario=request.user
-    ).select_related(
-        "factura_final"
-    ).prefetch_related(
-        Prefetch("presupuestos", queryset=Presupuesto.objects.order_by("-fecha_creacion"))
-    ).order_by("-created_at")
+    archivadas = _ver_archivadas(request)
+    clave = clave_tablero(request, validador_del_request(request, _validar_inicio))
+    tablero = obtener_tablero(clave)
+    if tablero is None:
+        if archivadas:
+            reparaciones = reparaciones_archivadas(
+                ReparacionArchivada.objects.filter(usuario=request.user)
+            )
+        else:
+            reparaciones = Reparacion.objects.filter(
+                usuario=request.user
+            ).select_related(
+                "usuario", "factura_final", "ultimo_presupuesto"
+            ).prefetch_related(
+                Prefetch("presupuestos", queryset=Presupuesto.objects.order_by("-fecha_creacion"))
+            )
+        pagina = paginar_reparaciones(request, reparaciones)
+        tablero = render_to_string(
+            "reparaciones/_tablero.html",
+            {"reparaciones": pagina, "pagina": pagina, "archivadas": archivadas},
+            request=request,
+        )
+        guardar_tablero(clave, tablero)
 
     return render(
         request,
         "reparaciones/inicio.html",
-        {"reparaciones": reparaciones}
+        {"tablero": mark_safe(tablero), "archivadas": archivadas}
     )
 
 
+def _ver_archivadas(request):
+    return request.GET.get("archivadas") == "1"
+
+
 @login_required
 def aceptar_presupuesto(request, presupuesto_id):
     if request.method != "POST":
@@ -99,9 +153,12 @@ def aceptar_presupuesto(request, presupuesto_id):
         presupuesto.aprobado_en = timezone.now()
         presupuesto.aprobado_por = request.user
         presupuesto.save(update_fields=["estado", "cerrado", "aprobado_en", "aprobado_por"])
-        reparacion = presupuesto.reparacion
-        reparacion.estado = "en_proceso"
-        reparacion.save(update_fields=["estado"])
+        cambiar_estado(
+            Reparacion.objects.filter(pk=presupuesto.reparacion_id),
+            "en_proceso",
+            usuario=request.user,
+            origen="aceptar_presupuesto",
+        )
 
     messages.success(request, "✅ Presupuesto aprobado. Vamos a comenzar la reparación.")
     _notify_taller_presupuesto_aprobado(request, presupuesto)
@@ -129,30 +186,147 @@ def registrar(request):
         {"form": form}
     )
 
+# -----------------------------
+# Límites de subida (se cortan mientras se reciben)
+# -----------------------------
+EXTENSIONES_IMAGEN = {"jpg", "jpeg", "png", "webp", "gif"}
+LIMITES_REPARACION = {
+    "imagen": (settings.SUBIDA_IMAGEN_MAX_MB * MB, EXTENSIONES_IMAGEN),
+    "imagen2": (settings.SUBIDA_IMAGEN_MAX_MB * MB, EXTENSIONES_IMAGEN),
+    "video": (ReparacionForm.MAX_VIDEO_MB * MB, {"mov", "mp4", "webm"}),
+}
+# Los presupuestos nunca tuvieron restricción de formato; las facturas sí.
+LIMITES_PRESUPUESTO = {"archivo_presupuesto": (MAX_PRESUPUESTO_MB * MB, None)}
+LIMITES_FACTURA = {"archivo_factura": (MAX_FACTURA_MB * MB, {"pdf", "jpg", "jpeg", "png"})}
+
+
 # -----------------------------
 # Crear reparación
 # -----------------------------
 @login_required
+@limite_subida(LIMITES_REPARACION)
 def crear_reparacion(request):
     if request.method == "POST":
-        form = ReparacionForm(request.POST, request.FILES)
+        form = ReparacionForm(request.POST, request.FILES, usuario=request.user)
         if form.is_valid():
             reparacion = form.save(commit=False)
             reparacion.usuario = request.user
             reparacion.nombre_cliente = request.user.username
-            reparacion.save()
+            with transaction.atomic():
+                reparacion.save()
+                registrar_transicion(
+                    reparacion, "", usuario=request.user, origen="crear_reparacion"
+                )
+            # Las fotos ya están en el storage: las versiones chicas se generan
+            # en la cola (mientras tanto la tarjeta muestra el original).
+            generar_variantes_reparacion.enqueue(reparacion.pk)
 
             # 👉 volver al dashboard
             return redirect("inicio")
     else:
-        form = ReparacionForm()
+        form = ReparacionForm(usuario=request.user)
 
     return render(
         request,
         "reparaciones/crear_reparacion.html",
-        {"form": form}
+        {"form": form, "subida_directa": settings.SUBIDA_DIRECTA}
     )
 
+
+# -----------------------------
+# Subida directa al bucket
+# -----------------------------
+def _pedido_de_subida(request):
+    # (campo, tipo, tamaño) del POST, o una respuesta de error.
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["POST"])
+    if not settings.SUBIDA_DIRECTA:
+        return JsonResponse({"error": "La subida directa no está habilitada."}, status=404)
+    try:
+        tamano = int(request.POST.get("tamano", ""))
+    except ValueError:
+        return JsonResponse({"error": "Tamaño inválido."}, status=400)
+    return request.POST.get("campo", ""), request.POST.get("tipo", ""), tamano
+
+
+@login_required
+def subida_firmada(request):
+    pedido = _pedido_de_subida(request)
+    if not isinstance(pedido, tuple):
+        return pedido
+    try:
+        subida = preparar_subida(request.user, *pedido)
+    except ValidationError as error:
+        return JsonResponse({"error": error.messages[0]}, status=400)
+    return JsonResponse(subida)
+
+
+@login_required
+def subida_reanudable_crear(request):
+    pedido = _pedido_de_subida(request)
+    if not isinstance(pedido, tuple):
+        return pedido
+    try:
+        subida = iniciar_reanudable(request.user, *pedido)
+    except ValidationError as error:
+        return JsonResponse({"error": error.messages[0]}, status=400)
+    return JsonResponse(estado_reanudable(subida), status=201)
+
+
+@login_required
+def subida_reanudable(request, subida_id):
+    # GET: qué partes faltan (para empezar o retomar). POST: completar.
+    subida = get_object_or_404(SubidaReanudable, pk=subida_id, usuario=request.user)
+    if request.method == "GET":
+        return JsonResponse(estado_reanudable(subida))
+    if request.method != "POST":
+        return HttpResponseNotAllowed(["GET", "POST"])
+    try:
+        clave = completar_reanudable(subida)
+    except ValidationError as error:
+        return JsonResponse({"error": error.messages[0]}, status=409)
+    return JsonResponse({"clave": clave})
+
+
+@csrf_exempt
+def subida_local(request, token):
+    # Equivalente local de la URL prefirmada: el token autoriza el PUT,
+    # igual que la firma en el bucket, así que no lleva CSRF ni sesión.
+    if request.method != "PUT":
+        return HttpResponseNotAllowed(["PUT"])
+    datos = leer_token_local(token)
+    if datos is None:
+        return HttpResponse(status=403)
+    if (
+        request.content_type != datos["tipo"]
+        or request.META.get("CONTENT_LENGTH") != str(datos["tamano"])
+    ):
+        return HttpResponse(status=400)
+    if default_storage.exists(datos["clave"]):
+        return HttpResponse(status=409)
+
+    nombre = default_storage.save(datos["clave"], File(request, name=datos["clave"]))
+    if nombre != datos["clave"] or default_storage.size(nombre) != datos["tamano"]:
+        default_storage.delete(nombre)
+        return HttpResponse(status=400)
+    return HttpResponse(status=201)
+
+
+@csrf_exempt
+def subida_parte_local(request, token):
+    # Equivalente local de la URL prefirmada de upload_part.
+    if request.method != "PUT":
+        return HttpResponseNotAllowed(["PUT"])
+    datos = leer_token_local(token, SAL_PARTE)
+    if datos is None:
+        return HttpResponse(status=403)
+    subida = get_object_or_404(SubidaReanudable, pk=datos["id"], completada=False)
+    numero = datos["numero"]
+    if request.META.get("CONTENT_LENGTH") != str(subida.tamano_de_parte(numero)):
+        return HttpResponse(status=400)
+    guardar_parte_local(subida, numero, File(request, name=str(numero)))
+    return HttpResponse(status=204)
+
 # -----------------------------
 # Login personalizado
 # -----------------------------
@@ -176,22 +350,19 @@ class CustomLoginView(LoginView):
 @login_required
 @login_required
 def descargar_presupuesto(request, presupuesto_id):
-    presupuesto = get_object_or_404(Presupuesto, pk=presupuesto_id)
+    # Los ids se conservan al archivar, así que el link sigue sirviendo.
+    presupuesto = (
+        Presupuesto.objects.select_related("reparacion").filter(pk=presupuesto_id).first()
+        or get_object_or_404(
+            PresupuestoArchivado.objects.select_related("reparacion"), pk=presupuesto_id
+        )
+    )
     if not request.user.is_staff and presupuesto.reparacion.usuario != request.user:
         messages.error(request, "No tenés permisos para ver este archivo.")
         return redirect("inicio")
-    archivo = presupuesto.archivo_presupuesto
-    filename = os.path.basename(archivo.name)
-    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
-    descargar = request.GET.get("download") == "1"
-    response = FileResponse(
-        archivo.open("rb"),
-        as_attachment=descargar,
-        content_type=content_type,
+    return entregar_archivo(
+        request, presupuesto.archivo_presupuesto, adjunto=request.GET.get("download") == "1"
     )
-    disposition = "attachment" if descargar else "inline"
-    response["Content-Disposition"] = f'{disposition}; filename="{filename}"'
-    return response
 
 
 def _staff_required(request, message="No tenés permisos para acceder a esta sección."):
@@ -201,43 +372,81 @@ def _staff_required(request, message="No tenés permisos para acceder a esta sec
     return True
 
 
+# Validadores del GET condicional de staff: None (respuesta completa) para
+# quien no es staff, que igual termina redirigido.
+def _validar_staff_reparaciones(request):
+    if not request.user.is_staff:
+        return None
+    return _validar(Reparacion.objects.exclude(estado="finalizado"))
+
+
+def _validar_staff_reparacion(request, reparacion_id):
+    if not request.user.is_staff:
+        return None
+    return _validar(Reparacion.objects.filter(pk=reparacion_id))
+
+
+def _validar_staff_finalizados(request):
+    if not request.user.is_staff:
+        return None
+    if _ver_archivadas(request):
+        return _validar(ReparacionArchivada.objects.all(), "archivado_en")
+    return _validar(Reparacion.objects.filter(estado="finalizado"))
+
+
 @login_required
+@limite_consultas(2)
+@lectura_en_replica
+@respuesta_condicional(_validar_staff_reparaciones)
 def staff_reparaciones(request):
     if not _staff_required(request):
         return redirect("inicio")
 
-    presupuestos_prefetch = Prefetch(
-        "presupuestos",
-        queryset=Presupuesto.objects.order_by("-fecha_creacion"),
-        to_attr="presupuestos_ordenados",
-    )
-    reparaciones = (
-        Reparacion.objects.exclude(estado="finalizado")
-        .select_related("factura_final")
-        .prefetch_related(presupuestos_prefetch)
-        .order_by("-created_at")
+    reparaciones = Reparacion.objects.exclude(estado="finalizado").select_related(
+        "usuario", "factura_final", "ultimo_presupuesto"
     )
+    pagina = paginar_reparaciones(request, reparaciones)
     return render(
         request,
         "reparaciones/staff_reparaciones.html",
-        {"reparaciones": reparaciones},
+        {"reparaciones": pagina, "pagina": pagina},
     )
 
 
 @login_required
-def staff_reparacion_detalle(request, reparacion_id):
+@limite_consultas(2)
+@lectura_en_replica
+def staff_buscar(request):
     if not _staff_required(request):
         return redirect("inicio")
 
-    presupuestos_prefetch = Prefetch(
-        "presupuestos",
-        queryset=Presupuesto.objects.order_by("-fecha_creacion"),
-        to_attr="presupuestos_ordenados",
+    texto = request.GET.get("q", "").strip()
+    pagina = None
+    if texto:
+        resultados = buscar_reparaciones(
+            Reparacion.objects.select_related(
+                "usuario", "factura_final", "ultimo_presupuesto"
+            ),
+            texto,
+        ).order_by("-relevancia", "-created_at", "-id")
+        paginator = Paginator(resultados, settings.REPARACIONES_POR_PAGINA)
+        pagina = paginator.get_page(request.GET.get("pagina"))
+    return render(
+        request,
+        "reparaciones/staff_busqueda.html",
+        {"q": texto, "pagina": pagina},
     )
+
+
+@login_required
+@limite_consultas(2)
+@respuesta_condicional(_validar_staff_reparacion)
+def staff_reparacion_detalle(request, reparacion_id):
+    if not _staff_required(request):
+        return redirect("inicio")
+
     reparacion = get_object_or_404(
-        Reparacion.objects.select_related("factura_final").prefetch_related(
-            presupuestos_prefetch
-        ),
+        Reparacion.objects.select_related("usuario", "factura_final"),
         pk=reparacion_id,
     )
     return render(
@@ -254,8 +463,12 @@ def staff_finalizar_reparacion(request, reparacion_id):
 
     reparacion = get_object_or_404(Reparacion, pk=reparacion_id)
     if request.method == "POST":
-        reparacion.estado = "finalizado"
-        reparacion.save(update_fields=["estado"])
+        cambiar_estado(
+            Reparacion.objects.filter(pk=reparacion.pk),
+            "finalizado",
+            usuario=request.user,
+            origen="staff_finalizar_reparacion",
+        )
         messages.success(
             request,
             "Trabajo finalizado. Ahora podés cargar la factura final.",
@@ -264,6 +477,7 @@ def staff_finalizar_reparacion(request, reparacion_id):
 
 
 @login_required
+@limite_subida(LIMITES_PRESUPUESTO)
 def staff_cargar_presupuesto(request, reparacion_id):
     if not _staff_required(request):
         return redirect("inicio")
@@ -288,6 +502,8 @@ def staff_cargar_presupuesto(request, reparacion_id):
 
 
 @login_required
+@limite_consultas(3)
+@respuesta_condicional(_validar_staff_reparacion)
 def staff_presupuestos(request, reparacion_id):
     if not _staff_required(request):
         return redirect("inicio")
@@ -306,6 +522,7 @@ def staff_presupuestos(request, reparacion_id):
 
 
 @login_required
+@limite_subida(LIMITES_FACTURA)
 def staff_factura_final(request, reparacion_id):
     if not _staff_required(request):
         return redirect("inicio")
@@ -332,28 +549,112 @@ def staff_factura_final(request, reparacion_id):
 
 
 @login_required
+@limite_consultas(3)
+@lectura_en_replica
+@respuesta_condicional(_validar_staff_finalizados)
 def staff_finalizados(request):
     if not _staff_required(request):
         return redirect("inicio")
 
-    presupuestos_prefetch = Prefetch(
-        "presupuestos",
-        queryset=Presupuesto.objects.order_by("-fecha_creacion"),
-        to_attr="presupuestos_ordenados",
+    archivadas = _ver_archivadas(request)
+    if archivadas:
+        reparaciones = reparaciones_archivadas()
+    else:
+        reparaciones = Reparacion.objects.filter(estado="finalizado").select_related(
+            "usuario", "factura_final", "ultimo_presupuesto"
+        )
+    pagina = paginar_reparaciones(request, reparaciones)
+    return render(
+        request,
+        "reparaciones/staff_finalizados.html",
+        {"reparaciones": pagina, "pagina": pagina, "archivadas": archivadas},
     )
-    reparaciones = (
-        Reparacion.objects.filter(estado="finalizado")
-        .select_related("factura_final")
-        .prefetch_related(presupuestos_prefetch)
-        .order_by("-created_at")
+
+
+@login_required
+@limite_consultas(3)
+@lectura_en_replica
+def staff_estadisticas(request):
+    if not _staff_required(request):
+        return redirect("inicio")
+
+    try:
+        meses = int(request.GET.get("meses", 12))
+    except ValueError:
+        meses = 12
+    meses = max(1, min(meses, 36))
+    hoy = timezone.localdate()
+    indice = hoy.year * 12 + hoy.month - meses
+    desde = hoy.replace(year=indice // 12, month=indice % 12 + 1, day=1)
+
+    # Solo lee el resumen mensual: a lo sumo unas celdas por mes, sin importar
+    # cuántas reparaciones haya en el historial.
+    resumenes = ResumenMensual.objects.filter(mes__gte=desde).order_by()
+    totales = {
+        "facturas_cantidad": Sum("facturas_cantidad"),
+        "facturas_monto": Sum("facturas_monto"),
+        "presupuestos_cantidad": Sum("presupuestos_cantidad"),
+        "presupuestos_monto": Sum("presupuestos_monto"),
+        "aprobados_cantidad": Sum("aprobados_cantidad"),
+        "aprobados_monto": Sum("aprobados_monto"),
+    }
+    return render(
+        request,
+        "reparaciones/staff_estadisticas.html",
+        {
+            "meses": meses,
+            "desde": desde,
+            "por_mes": resumenes.values("mes", "moneda")
+            .annotate(**totales)
+            .order_by("-mes", "moneda"),
+            "por_equipo": resumenes.values("tipo_equipo", "moneda")
+            .annotate(**totales)
+            .order_by("tipo_equipo", "moneda"),
+            "por_ubicacion": resumenes.values("ubicacion", "moneda")
+            .annotate(**totales)
+            .order_by("ubicacion", "moneda"),
+        },
     )
+
+
+def _duracion(segundos):
+    horas = int(segundos // 3600)
+    if horas < 24:
+        return f"{horas} h" if horas else f"{int(segundos // 60)} min"
+    return f"{horas // 24} d {horas % 24} h"
+
+
+@login_required
+@limite_consultas(1)
+@lectura_en_replica
+def staff_tiempos(request):
+    if not _staff_required(request):
+        return redirect("inicio")
+
+    try:
+        dias = int(request.GET.get("dias", 180))
+    except ValueError:
+        dias = 180
+    dias = max(1, min(dias, 3650))
+    tiempos = tiempos_por_estado(desde=timezone.now() - timedelta(days=dias))
+    for fila in tiempos:
+        fila["p50_texto"] = _duracion(fila["p50"])
+        fila["p90_texto"] = _duracion(fila["p90"])
     return render(
         request,
-        "reparaciones/staff_finalizados.html",
-        {"reparaciones": reparaciones},
+        "reparaciones/staff_tiempos.html",
+        {"tiempos": tiempos, "dias": dias},
     )
 
 
+@login_required
+def staff_pool(request):
+    if not _staff_required(request):
+        return redirect("inicio")
+
+    return JsonResponse({"pools": estadisticas_pool()})
+
+
 @login_required
 def staff_reabrir_reparacion(request, reparacion_id):
     if not request.user.is_superuser:
@@ -362,14 +663,62 @@ def staff_reabrir_reparacion(request, reparacion_id):
 
     reparacion = get_object_or_404(Reparacion, pk=reparacion_id)
     if request.method == "POST":
-        reparacion.estado = "en_proceso"
-        reparacion.save(update_fields=["estado"])
+        cambiar_estado(
+            Reparacion.objects.filter(pk=reparacion.pk),
+            "en_proceso",
+            usuario=request.user,
+            origen="staff_reabrir_reparacion",
+        )
     return redirect("staff_finalizados")
 
 
+# -----------------------------
+# Exportación ZIP (staff)
+# -----------------------------
+@login_required
+@lectura_en_replica
+def staff_exportar_zip(request):
+    """
+    ?reparacion=<id>: todo lo de una reparación.
+    ?desde=AAAA-MM-DD&hasta=AAAA-MM-DD: las facturas finales de ese período.
+    """
+    if not _staff_required(request):
+        return redirect("inicio")
+
+    reparacion_id = request.GET.get("reparacion", "")
+    if reparacion_id.isdigit():
+        reparacion = Reparacion.objects.filter(pk=reparacion_id).first() or get_object_or_404(
+            ReparacionArchivada, pk=reparacion_id
+        )
+        entradas = entradas_de_reparacion(reparacion)
+        archivo = f"reparacion_{reparacion.pk}.zip"
+    else:
+        try:
+            desde = parse_date(request.GET.get("desde", "") or "")
+            hasta = parse_date(request.GET.get("hasta", "") or "")
+        except ValueError:
+            # Bien formada pero inexistente, como 2024-02-30.
+            desde = hasta = None
+        if desde is None or hasta is None or desde > hasta:
+            messages.error(request, "Indicá un período válido para exportar.")
+            return redirect("staff_finalizados")
+        entradas = entradas_de_facturas(desde, hasta)
+        archivo = f"facturas_{desde:%Y-%m-%d}_{hasta:%Y-%m-%d}.zip"
+
+    # Las consultas ya se hicieron acá: el generador solo lee del storage.
+    response = StreamingHttpResponse(zip_en_stream(entradas), content_type="application/zip")
+    response["Content-Disposition"] = content_disposition_header(True, archivo)
+    return response
+
+
 @login_required
 def descargar_factura_final(request, reparacion_id):
-    reparacion = get_object_or_404(Reparacion, pk=reparacion_id)
+    reparacion = (
+        Reparacion.objects.select_related("factura_final").filter(pk=reparacion_id).first()
+        or get_object_or_404(
+            ReparacionArchivada.objects.select_related("factura_final"), pk=reparacion_id
+        )
+    )
     if not request.user.is_staff and reparacion.usuario != request.user:
         messages.error(request, "No tenés permisos para ver este archivo.")
         return redirect("inicio")
@@ -380,15 +729,59 @@ def descargar_factura_final(request, reparacion_id):
         return redirect("inicio")
 
     if factura.archivo_factura:
-        archivo = factura.archivo_factura
-        return FileResponse(
-            archivo.open("rb"),
-            as_attachment=True,
-            filename=os.path.basename(archivo.name),
-        )
+        return entregar_archivo(request, factura.archivo_factura, adjunto=True)
 
     if factura.link_factura:
         return redirect(factura.link_factura)
 
     messages.error(request, "No tenés permisos para ver este archivo.")
     return redirect("inicio")
+
+
+# -----------------------------
+# Media local (filesystem)
+# -----------------------------
+# Reemplaza a static(MEDIA_URL): soporta Range para los videos y PDFs, y
+# presupuestos y facturas solo los ve staff o el dueño de la reparación.
+ARCHIVOS_PROTEGIDOS = {
+    "reparaciones/presupuestos/": (
+        "archivo_presupuesto",
+        (Presupuesto, PresupuestoArchivado),
+    ),
+    "reparaciones/facturas_finales/": (
+        "archivo_factura",
+        (FacturaFinal, FacturaFinalArchivada),
+    ),
+}
+
+
+def _puede_ver_media(user, ruta):
+    # Con media deduplicada cualquier "<carpeta>/<digest>/<nombre>" lleva al
+    # blob del digest: solo se entrega un nombre que alguna fila guarda, y
+    # con los permisos de la carpeta donde lo guarda.
+    if ubicar(default_storage, ruta)[1] != ruta and not referenciados({ruta}):
+        return False
+    for carpeta, (campo, modelos) in ARCHIVOS_PROTEGIDOS.items():
+        if not ruta.startswith(carpeta):
+            continue
+        if not user.is_authenticated:
+            return False
+        return user.is_staff or any(
+            modelo.objects.filter(**{campo: ruta, "reparacion__usuario": user}).exists()
+            for modelo in modelos
+        )
+    return True
+
+
+def servir_media(request, ruta):
+    if request.method not in ("GET", "HEAD"):
+        return HttpResponseNotAllowed(["GET", "HEAD"])
+    # Los permisos se controlan sobre el nombre lógico: un blob de la media
+    # deduplicada no dice de qué fila es, así que no se entrega por su ruta.
+    ruta = posixpath.normpath(ruta)
+    if ruta.startswith(("../", "/", CARPETA_BLOBS)):
+        raise Http404("El archivo no existe.")
+    if not _puede_ver_media(request.user, ruta):
+        raise Http404("El archivo no existe.")
+    return entregar(request, default_storage, ruta, adjunto=False)
+
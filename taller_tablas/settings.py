@@ -55,6 +55,7 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "reparaciones.replica.PegarAlPrimarioMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -98,6 +99,79 @@ DATABASES = {
     )
 }
 
+# Réplica de solo lectura opcional (p. ej. postgres://.../taller o, en local,
+# sqlite:///replica.sqlite3 como copia de db.sqlite3). Sin URL no hay router
+# que la use y todo va al primario.
+DATABASE_REPLICA_URL = os.environ.get("DATABASE_REPLICA_URL", "").strip()
+REPLICA_DB = None
+if DATABASE_REPLICA_URL:
+    REPLICA_DB = "replica"
+    DATABASES[REPLICA_DB] = dj_database_url.parse(DATABASE_REPLICA_URL, conn_max_age=600)
+    # En tests la réplica es un alias del primario.
+    DATABASES[REPLICA_DB]["TEST"] = {"MIRROR": "default"}
+
+# Pool de conexiones de psycopg 3 (solo Postgres). Reemplaza las conexiones
+# persistentes: cada worker comparte hasta DB_POOL_MAX conexiones entre sus
+# threads en vez de dejar una abierta por thread sin límite.
+DB_POOL = os.environ.get("DJANGO_DB_POOL", "False").lower() in ("1", "true", "yes", "on")
+if DB_POOL:
+    for _db in DATABASES.values():
+        if _db["ENGINE"] != "django.db.backends.postgresql":
+            continue
+        _db["CONN_MAX_AGE"] = 0  # Django no admite pool con conexiones persistentes.
+        _db.setdefault("OPTIONS", {})["pool"] = {
+            "min_size": int(os.environ.get("DB_POOL_MIN", "2")),
+            "max_size": int(os.environ.get("DB_POOL_MAX", "10")),
+            # Segundos que un request espera una conexión libre antes de fallar.
+            "timeout": float(os.environ.get("DB_POOL_TIMEOUT", "10")),
+            "max_idle": float(os.environ.get("DB_POOL_MAX_IDLE", "300")),
+        }
+
+DATABASE_ROUTERS = ["reparaciones.replica.RouterReplica"]
+# Segundos que una sesión lee del primario después de escribir.
+REPLICA_PEGADO_SEGUNDOS = int(os.environ.get("REPLICA_PEGADO_SEGUNDOS", "15"))
+
+# --------------------------------------------------
+# CACHE
+# --------------------------------------------------
+# DJANGO_CACHE_BACKEND: "locmem" (por proceso, el default), "file" (compartida
+# entre workers de una máquina) o "redis" (REDIS_URL, necesita el paquete redis).
+CACHE_BACKEND = os.environ.get("DJANGO_CACHE_BACKEND", "locmem").strip().lower()
+if CACHE_BACKEND == "redis":
+    _cache_default = {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get("REDIS_URL", "redis://127.0.0.1:6379/0"),
+    }
+elif CACHE_BACKEND == "file":
+    _cache_default = {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_DIR", str(BASE_DIR / "cache")),
+    }
+else:
+    _cache_default = {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}
+CACHES = {"default": _cache_default}
+
+# Fragmento renderizado del tablero de cada cliente (ver reparaciones.tablero).
+# Tiene que durar menos que las URLs firmadas de los archivos que incluye.
+TABLERO_CACHE = "default"
+TABLERO_CACHE_SEGUNDOS = int(os.environ.get("TABLERO_CACHE_SEGUNDOS", "600"))
+
+# --------------------------------------------------
+# SESIONES
+# --------------------------------------------------
+# DJANGO_SESSIONS elige dónde vive la sesión:
+#   "db"             una consulta a django_session por request (el default de Django)
+#   "cached_db"      lee de la cache y solo va a la base si no está; escribe en ambas
+#   "signed_cookies" sin estado en el servidor: la sesión viaja firmada en la
+#                    cookie y no se puede revocar desde el servidor.
+SESSIONS_MODO = os.environ.get("DJANGO_SESSIONS", "db").strip().lower()
+SESSION_ENGINE = {
+    "db": "django.contrib.sessions.backends.db",
+    "cached_db": "django.contrib.sessions.backends.cached_db",
+    "signed_cookies": "django.contrib.sessions.backends.signed_cookies",
+}[SESSIONS_MODO]
+SESSION_CACHE_ALIAS = "default"
+
 # --------------------------------------------------
 # AUTH / PASSWORDS
 # --------------------------------------------------
@@ -157,7 +231,7 @@ else:
     # ============================
     STORAGES = {
         "default": {
-            "BACKEND": "storages.backends.s3boto3.S3Boto3Storage",
+            "BACKEND": "reparaciones.storage.R2Storage",
             "OPTIONS": {
                 "access_key": R2_ACCESS_KEY_ID,
                 "secret_key": R2_SECRET_ACCESS_KEY,
@@ -174,6 +248,101 @@ else:
     if R2_PUBLIC_HOST:
         AWS_S3_CUSTOM_DOMAIN = R2_PUBLIC_HOST
 
+# Media deduplicada: cada contenido se guarda una vez bajo su digest y se
+# cuentan referencias (reparaciones.dedup). Envuelve el storage de arriba.
+MEDIA_DEDUP = os.environ.get("MEDIA_DEDUP", "False").lower() in ("1", "true", "yes", "on")
+if MEDIA_DEDUP:
+    STORAGES["default"] = {
+        "BACKEND": "reparaciones.dedup.AlmacenDeduplicado",
+        "OPTIONS": {
+            "backend": STORAGES["default"]["BACKEND"],
+            "options": STORAGES["default"].get("OPTIONS", {}),
+        },
+    }
+
+# URLs firmadas de R2: se reutilizan hasta MEDIA_URLS_MARGEN_SEGUNDOS antes de
+# vencer (AWS_QUERYSTRING_EXPIRE, 3600 s por defecto). El margen tiene que
+# cubrir TABLERO_CACHE_SEGUNDOS, porque el tablero cacheado las incluye.
+MEDIA_URLS_CACHE = os.environ.get("MEDIA_URLS_CACHE", "True").lower() in ("1", "true", "yes", "on")
+MEDIA_URLS_MARGEN_SEGUNDOS = int(os.environ.get("MEDIA_URLS_MARGEN_SEGUNDOS", "900"))
+MEDIA_URLS_CACHE_MAX = int(os.environ.get("MEDIA_URLS_CACHE_MAX", "5000"))
+
+# --------------------------------------------------
+# SUBIDA DIRECTA AL BUCKET
+# --------------------------------------------------
+# El navegador sube fotos y videos con una URL prefirmada y el formulario
+# solo manda la clave. El bucket necesita CORS que permita PUT (o POST) y
+# Content-Type desde el dominio del sitio. R2 no acepta POST de formulario:
+# con R2 el método tiene que ser "put"; "post" sirve para S3/MinIO.
+SUBIDA_DIRECTA = os.environ.get("SUBIDA_DIRECTA", "False").lower() in ("1", "true", "yes", "on")
+SUBIDA_DIRECTA_METODO = os.environ.get("SUBIDA_DIRECTA_METODO", "put").lower()
+SUBIDA_DIRECTA_SEGUNDOS = int(os.environ.get("SUBIDA_DIRECTA_SEGUNDOS", "900"))
+SUBIDA_IMAGEN_MAX_MB = int(os.environ.get("SUBIDA_IMAGEN_MAX_MB", "25"))
+# Videos en partes reanudables. S3/R2 exigen partes de al menos 5 MB (salvo
+# la última). limpiar_subidas descarta las que no avanzan hace
+# SUBIDA_REANUDABLE_HORAS.
+SUBIDA_PARTE_MB = int(os.environ.get("SUBIDA_PARTE_MB", "8"))
+SUBIDA_REANUDABLE_HORAS = int(os.environ.get("SUBIDA_REANUDABLE_HORAS", "24"))
+
+# --------------------------------------------------
+# ENTREGA DE ARCHIVOS
+# --------------------------------------------------
+# Presupuestos y facturas: con R2 se redirige a una URL prefirmada de
+# ENTREGA_URL_SEGUNDOS. En filesystem, "x-accel" (nginx, con una location
+# internal que apunte a MEDIA_ROOT en ENTREGA_X_ACCEL_PREFIJO) o
+# "x-sendfile" (Apache mod_xsendfile) delegan el envío; "stream" lo hace Django.
+ENTREGA_ARCHIVOS = os.environ.get("ENTREGA_ARCHIVOS", "stream").lower()
+ENTREGA_X_ACCEL_PREFIJO = os.environ.get("ENTREGA_X_ACCEL_PREFIJO", "/media-protegida/")
+ENTREGA_URL_SEGUNDOS = int(os.environ.get("ENTREGA_URL_SEGUNDOS", "300"))
+
+# --------------------------------------------------
+# MEDIA HUÉRFANA
+# --------------------------------------------------
+# limpiar_media_huerfana no borra archivos más nuevos que esto: tiene que
+# cubrir lo que tarda una subida (directa o reanudable) en llegar a su fila.
+MEDIA_HUERFANOS_GRACIA_HORAS = int(os.environ.get("MEDIA_HUERFANOS_GRACIA_HORAS", "48"))
+
+# --------------------------------------------------
+# RETENCIÓN DE MEDIA
+# --------------------------------------------------
+# Reglas de aplicar_retencion (reparaciones.retencion), contando días desde
+# que la reparación se entregó o finalizó. 0 desactiva la regla.
+#   sin_video:      borra el video.
+#   solo_miniatura: deja cada foto en su variante más chica.
+MEDIA_RETENCION = [
+    {"accion": "sin_video", "dias": int(os.environ.get("MEDIA_RETENCION_VIDEO_DIAS", "90"))},
+    {
+        "accion": "solo_miniatura",
+        "dias": int(os.environ.get("MEDIA_RETENCION_MINIATURA_DIAS", "365")),
+    },
+]
+
+# --------------------------------------------------
+# TAREAS EN SEGUNDO PLANO (django.tasks)
+# --------------------------------------------------
+# Mails y post-proceso de media (reparaciones.tareas). Con
+# TAREAS_EN_SEGUNDO_PLANO van a la cola en la base y las ejecuta
+# `manage.py procesar_tareas`; si no, se ejecutan en el momento. En
+# producción conviene activarlo, y entonces procesar_tareas tiene que correr
+# como un proceso más del deploy (si no, nada sale de la cola). Los tests
+# fijan ImmediateBackend con override_settings.
+TAREAS_EN_SEGUNDO_PLANO = os.environ.get("TAREAS_EN_SEGUNDO_PLANO", "False").lower() in ("1", "true", "yes", "on")
+if TAREAS_EN_SEGUNDO_PLANO:
+    TASKS = {
+        "default": {
+            "BACKEND": "reparaciones.cola.BaseDeDatosBackend",
+            "OPTIONS": {
+                "INTENTOS": int(os.environ.get("TAREAS_INTENTOS", "5")),
+                "ESPERA_SEGUNDOS": int(os.environ.get("TAREAS_ESPERA_SEGUNDOS", "30")),
+                "TIEMPO_MAXIMO_SEGUNDOS": int(os.environ.get("TAREAS_TIEMPO_MAXIMO_SEGUNDOS", "600")),
+            },
+        }
+    }
+else:
+    TASKS = {"default": {"BACKEND": "django.tasks.backends.immediate.ImmediateBackend"}}
+# procesar_tareas --purgar borra las terminadas hace más de esto.
+TAREAS_CONSERVAR_DIAS = int(os.environ.get("TAREAS_CONSERVAR_DIAS", "7"))
+
 # --------------------------------------------------
 # AUTH REDIRECTS
 # --------------------------------------------------
@@ -181,6 +350,28 @@ LOGIN_URL = "/accounts/login/"
 LOGIN_REDIRECT_URL = "/"
 LOGOUT_REDIRECT_URL = "/accounts/login/"
 
+# --------------------------------------------------
+# PAGINACIÓN
+# --------------------------------------------------
+REPARACIONES_POR_PAGINA = int(os.environ.get("REPARACIONES_POR_PAGINA", "25"))
+REPARACIONES_POR_PAGINA_MAX = int(os.environ.get("REPARACIONES_POR_PAGINA_MAX", "100"))
+
+# --------------------------------------------------
+# ARCHIVO
+# --------------------------------------------------
+# Meses desde la finalización a partir de los cuales `archivar_reparaciones`
+# mueve una reparación a las tablas de archivo.
+ARCHIVO_MESES = int(os.environ.get("ARCHIVO_MESES", "12"))
+
+# --------------------------------------------------
+# LÍMITE DE CONSULTAS POR VISTA
+# --------------------------------------------------
+# En modo estricto, una vista que supera su @limite_consultas lanza una
+# excepción en vez de solo loguear un warning.
+LIMITE_CONSULTAS_ESTRICTO = os.environ.get(
+    "DJANGO_LIMITE_CONSULTAS_ESTRICTO", "False"
+).lower() in ("1", "true", "yes", "on")
+
 # --------------------------------------------------
 # DEFAULT
 # --------------------------------------------------
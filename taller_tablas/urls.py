@@ -1,8 +1,9 @@
+import re
+
 from django.contrib import admin
-from django.urls import path, include
+from django.urls import path, include, re_path
 from django.conf import settings
-from django.conf.urls.static import static
-from reparaciones.views import CustomLoginView
+from reparaciones.views import CustomLoginView, servir_media
 
 urlpatterns = [
     path("admin/", admin.site.urls),
@@ -18,5 +19,12 @@ urlpatterns = [
 ]
 
 # OJO: si usás esa condición con R2_PUBLIC_HOST, hacelo seguro:
-if settings.DEBUG or not getattr(settings, "R2_PUBLIC_HOST", ""):
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
+if settings.MEDIA_URL and (settings.DEBUG or not getattr(settings, "R2_PUBLIC_HOST", "")):
+    # Media local con Range y permisos (reparaciones.views.servir_media).
+    urlpatterns += [
+        re_path(
+            r"^%s(?P<ruta>.*)$" % re.escape(settings.MEDIA_URL.lstrip("/")),
+            servir_media,
+            name="servir_media",
+        ),
+    ]